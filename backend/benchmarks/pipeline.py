@@ -0,0 +1,323 @@
+# benchmarks/pipeline.py
+"""Replays recorded videos through the whole pipeline in one process and reports throughput and latency.
+
+Each video becomes a synthetic camera driven by the real ``CameraThread``;
+its frames go through the real detection batcher, OCR, validation and
+bulk-writer code, hosted by the embedded pipeline (see
+embedded_service/pipeline.py): RabbitMQ is replaced by the in-process
+``MemoryBroker`` and Postgres by an in-memory table unless ``--database``
+is given. ``--shared-memory`` passes frames the way the distributed
+services do instead of by reference. The
+detector and OCR engine can be swapped for synthetic ones when model
+weights or Tesseract are not installed; the report records which ones ran.
+
+The report has frames/s per stage, per-stage and end-to-end latency
+percentiles from the message traces, CPU time and RSS. It is saved as JSON
+so later runs can be compared against it with ``--baseline``, which exits
+with status 1 when throughput or latency regress beyond ``--tolerance``.
+
+Usage: python benchmarks/pipeline.py gate1.mp4 gate2.mp4 [--cameras 4] [--duration 60]
+           [--detector synthetic] [--ocr synthetic] [--output results/run.json] [--baseline results/base.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.metrics import QUANTILES, StageMetrics
+from common.service_loader import BACKEND_DIR, load_service
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# Latency quantile compared against a baseline
+LATENCY_QUANTILE = "p95"
+
+
+class SyntheticDetector:
+    """Stands in for the detection model: a fixed box after a fixed inference delay.
+
+    The box is visible for ``visible_seconds`` out of every ``period_seconds``
+    so that tracks end and tracked OCR publishes.
+    """
+
+    def __init__(self, seconds_per_frame: float = 0.0, period_seconds: float = 5.0, visible_seconds: float = 3.0):
+        self.seconds_per_frame = seconds_per_frame
+        self.period_seconds = period_seconds
+        self.visible_seconds = visible_seconds
+
+    def detect_batch(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        if self.seconds_per_frame:
+            time.sleep(self.seconds_per_frame * len(frames))
+        if time.time() % self.period_seconds >= self.visible_seconds:
+            return [[] for _ in frames]
+        detections = []
+        for frame in frames:
+            height, width = frame.shape[:2]
+            box = [width // 4, height // 3, width // 2, height // 3 + max(height // 12, 8)]
+            detections.append([{"box": box, "confidence": 0.9, "class": 0}])
+        return detections
+
+
+class SyntheticEnginePool:
+    """Stands in for Tesseract: returns a valid container code for every region."""
+
+    def __init__(self, text: str = "CSQU3054383", seconds_per_roi: float = 0.0):
+        self.text = text
+        self.seconds_per_roi = seconds_per_roi
+
+    def recognize_many(self, rois, psms=None) -> List[str]:
+        if self.seconds_per_roi:
+            time.sleep(self.seconds_per_roi * len(rois))
+        return [self.text for _ in rois]
+
+
+class MemoryDatabase:
+    """Stands in for ``DatabaseManager``: keeps the rows the writer inserts."""
+
+    def __init__(self):
+        self.rows: List[Tuple] = []
+        self.lock = threading.Lock()
+
+    def insert_rows(self, rows: Sequence[Tuple]) -> None:
+        with self.lock:
+            self.rows.extend(rows)
+
+    def insert_each(self, rows: Sequence[Tuple]) -> List[Tuple]:
+        self.insert_rows(rows)
+        return []
+
+    def close(self) -> None:
+        pass
+
+
+class ResourceSampler(threading.Thread):
+    """Samples the process's CPU time and resident memory once per interval."""
+
+    def __init__(self, interval: float = 0.5):
+        super().__init__(name="resource-sampler", daemon=True)
+        self.interval = interval
+        self.samples: List[Tuple[float, float, float]] = []  # (wall, cpu seconds, rss bytes)
+        self._stop = threading.Event()
+
+    @staticmethod
+    def sample() -> Tuple[float, float, float]:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return time.monotonic(), usage.ru_utime + usage.ru_stime, current_rss()
+
+    def run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.samples.append(self.sample())
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def current_rss() -> float:
+    """Resident set size in bytes, from /proc where available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Pipeline:
+    """Runs the embedded pipeline with the benchmark's cameras and stand-ins."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.metrics = StageMetrics("benchmark", window_seconds=args.warmup + args.duration + 3600,
+                                    max_samples=1000000)
+        embedded = load_service("embedded_service", "pipeline")["pipeline"]
+        if args.queue_length is None:
+            args.queue_length = embedded.config.QUEUE_LENGTH
+        detector = SyntheticDetector(args.synthetic_detect_ms / 1000.0) if args.detector == "synthetic" \
+            else embedded.create_detector(args.detector)
+        engine_pool = SyntheticEnginePool(seconds_per_roi=args.synthetic_ocr_ms / 1000.0) \
+            if args.ocr == "synthetic" else None
+        self.pipeline = embedded.EmbeddedPipeline(
+            queue_length=args.queue_length, frames_by_reference=not args.shared_memory, rate_control=False,
+            metrics=self.metrics, detector=detector, engine_pool=engine_pool, tracking=args.tracking,
+            database=None if args.database else MemoryDatabase(), writer_stats_interval=float("inf"))
+
+        videos = [os.path.abspath(video) for video in args.videos]
+        for index in range(args.cameras):
+            self.pipeline.add_camera(f"bench-{index}", videos[index % len(videos)], fps=args.fps,
+                                     zones=[{"rect": args.detection_zone}] if args.detection_zone else None)
+
+    def run(self) -> Dict[str, Any]:
+        args = self.args
+        sampler = ResourceSampler()
+        self.pipeline.start()
+        sampler.start()
+
+        print(f"Warming up for {args.warmup:.0f}s")
+        time.sleep(args.warmup)
+        start_counters, start_sample = self.pipeline.counters(), ResourceSampler.sample()
+        print(f"Measuring for {args.duration:.0f}s")
+        time.sleep(args.duration)
+        end_counters, end_sample = self.pipeline.counters(), ResourceSampler.sample()
+        # Only samples from the measured window count towards the percentiles.
+        self.metrics.window_seconds = end_sample[0] - start_sample[0]
+        percentiles = self.metrics.percentiles()
+        sampler.stop()
+
+        drained = self.pipeline.stop(args.drain_timeout)
+
+        elapsed = end_sample[0] - start_sample[0]
+        cpu_seconds = end_sample[1] - start_sample[1]
+        window = [rss for wall, _, rss in sampler.samples if start_sample[0] <= wall <= end_sample[0]]
+        return {
+            "label": args.label,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "host": {"platform": platform.platform(), "python": platform.python_version(),
+                     "cpus": os.cpu_count()},
+            "settings": {
+                "videos": [os.path.basename(video) for video in args.videos], "cameras": args.cameras,
+                "fps": args.fps, "warmup": args.warmup, "duration": args.duration,
+                "detector": args.detector, "ocr": args.ocr, "tracking": args.tracking,
+                "database": "postgres" if args.database else "memory", "queue_length": args.queue_length,
+                "frames": "shared memory" if args.shared_memory else "by reference",
+                "detection_zone": args.detection_zone,
+            },
+            "stages": {
+                stage: {"frames": end_counters[stage] - start_counters[stage],
+                        "fps": round((end_counters[stage] - start_counters[stage]) / elapsed, 2)}
+                for stage in end_counters
+            },
+            "latency": {
+                stage: {f"p{int(q * 100)}": round(1000 * value, 3) for q, value in quantiles.items()}
+                for stage, quantiles in sorted(percentiles.items())
+            },
+            "resources": {
+                "cpu_seconds": round(cpu_seconds, 3),
+                "cpu_percent": round(100 * cpu_seconds / elapsed, 1),
+                "rss_mb": round(end_sample[2] / 2 ** 20, 1),
+                "rss_max_mb": round(max(window + [end_sample[2]]) / 2 ** 20, 1),
+            },
+            "broker": dict(self.pipeline.broker.stats(), drained=drained),
+        }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    settings = report["settings"]
+    print(f"\n{report['label']}: {settings['cameras']} cameras at {settings['fps']} fps for {settings['duration']}s "
+          f"(detector {settings['detector']}, ocr {settings['ocr']}, database {settings['database']})")
+    print(f"{'stage':<18}{'frames':>10}{'fps':>10}")
+    for stage, values in report["stages"].items():
+        print(f"{stage:<18}{values['frames']:>10}{values['fps']:>10.1f}")
+    print(f"\n{'latency (ms)':<18}" + "".join(f"{f'p{int(q * 100)}':>10}" for q in QUANTILES))
+    for stage, values in report["latency"].items():
+        print(f"{stage:<18}" + "".join(f"{value:>10.1f}" for value in values.values()))
+    resources = report["resources"]
+    print(f"\nCPU {resources['cpu_seconds']:.1f}s ({resources['cpu_percent']:.0f}%), "
+          f"RSS {resources['rss_mb']:.0f} MB (max {resources['rss_max_mb']:.0f} MB)")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+            min_latency_ms: float = 1.0) -> List[str]:
+    """Prints the change of every metric against a baseline and returns the regressions."""
+    regressions = []
+    print(f"\nCompared with {baseline.get('label')} ({baseline.get('commit')}, {baseline.get('timestamp')}):")
+    if baseline.get("settings") != report["settings"]:
+        print("  warning: settings differ from the baseline")
+
+    def check(name: str, value: float, base: float, higher_is_better: bool, floor: float = 0.0) -> None:
+        if not base:
+            return
+        change = (value - base) / base
+        regressed = -change > tolerance if higher_is_better else change > tolerance and value - base > floor
+        print(f"  {name:<28}{base:>10.1f} -> {value:>10.1f}  {100 * change:+6.1f}%{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+
+    for stage, values in report["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if base and not stage.endswith("_stale"):
+            check(f"{stage} fps", values["fps"], base["fps"], True)
+    for stage, values in report["latency"].items():
+        base = baseline.get("latency", {}).get(stage)
+        if base:
+            # Sub-millisecond stages swing by large ratios between runs
+            check(f"{stage} {LATENCY_QUANTILE} ms", values[LATENCY_QUANTILE], base[LATENCY_QUANTILE], False,
+                  min_latency_ms)
+    check("cpu %", report["resources"]["cpu_percent"], baseline.get("resources", {}).get("cpu_percent", 0), False)
+    check("rss max MB", report["resources"]["rss_max_mb"], baseline.get("resources", {}).get("rss_max_mb", 0),
+          False)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("videos", nargs="+", help="video files replayed as cameras, round-robin")
+    parser.add_argument("--cameras", type=int, default=0, help="synthetic cameras (default one per video)")
+    parser.add_argument("--fps", type=float, default=20.0, help="target fps per camera, 0 for unthrottled")
+    parser.add_argument("--warmup", type=float, default=10.0, help="seconds before measuring")
+    parser.add_argument("--duration", type=float, default=60.0, help="measured seconds")
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--detector", default="synthetic",
+                        help="synthetic, or a detection backend: torch, onnx, onnx-int8")
+    parser.add_argument("--synthetic-detect-ms", type=float, default=0.0, help="synthetic inference time per frame")
+    parser.add_argument("--ocr", choices=("synthetic", "tesseract"), default="synthetic")
+    parser.add_argument("--synthetic-ocr-ms", type=float, default=0.0, help="synthetic OCR time per region")
+    parser.add_argument("--tracking", action="store_true", help="OCR per track instead of per frame")
+    parser.add_argument("--database", action="store_true",
+                        help="write to the Postgres configured in database_service/config.py")
+    parser.add_argument("--detection-zone", type=lambda v: [float(x) for x in v.split(",")],
+                        help="crop every camera to x1,y1,x2,y2 (fractions of the frame)")
+    parser.add_argument("--queue-length", type=int, help="messages between stages (default embedded config)")
+    parser.add_argument("--shared-memory", action="store_true",
+                        help="pass frames through the shared-memory frame store, as the distributed services do")
+    parser.add_argument("--label", default="pipeline")
+    parser.add_argument("--output", help="report path (default benchmarks/results/<label>-<time>.json)")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    parser.add_argument("--min-latency-ms", type=float, default=1.0,
+                        help="latency increases below this are never regressions")
+    args = parser.parse_args()
+    args.cameras = args.cameras or len(args.videos)
+    missing = [video for video in args.videos if not os.path.isfile(video)]
+    if missing:
+        raise SystemExit(f"Video files not found: {', '.join(missing)}")
+
+    # Configured before the services are imported, so their per-message INFO logs stay quiet.
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    report = Pipeline(args).run()
+    print_report(report)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.label}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.min_latency_ms)
+        if regressions:
+            raise SystemExit(f"Regressed beyond {100 * args.tolerance:.0f}%: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
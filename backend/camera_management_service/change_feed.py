@@ -0,0 +1,138 @@
+# camera_management_service/change_feed.py
+"""Camera registry change feed backed by Postgres LISTEN/NOTIFY.
+
+A trigger on ``cameras`` appends every insert, update and delete to
+``camera_changes`` and notifies the ``camera_changes`` channel with the new
+sequence number. Change inserts are serialized so sequence numbers become
+visible in order, which lets clients poll with the last seq they saw.
+``ChangeFeed`` listens on its own connection and wakes
+long-polling requests, and every API process invalidates its response
+cache on each change, including changes made by other processes.
+"""
+import logging
+import os
+import select
+import threading
+import time
+from typing import Callable, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+import config
+
+CHANNEL = "camera_changes"
+
+CREATE_CHANGE_FEED = """
+    CREATE TABLE IF NOT EXISTS camera_changes (
+        seq BIGSERIAL PRIMARY KEY,
+        camera_id INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        ts TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+
+    CREATE OR REPLACE FUNCTION notify_camera_change() RETURNS trigger AS $$
+    DECLARE
+        change_seq BIGINT;
+    BEGIN
+        -- Hold a lock until commit so sequence numbers commit in order and a
+        -- reader that has seen seq N never later finds an uncommitted N - 1.
+        PERFORM pg_advisory_xact_lock(hashtext('camera_changes'));
+        INSERT INTO camera_changes (camera_id, op)
+        VALUES (CASE TG_OP WHEN 'DELETE' THEN OLD.id ELSE NEW.id END, TG_OP)
+        RETURNING seq INTO change_seq;
+        PERFORM pg_notify('camera_changes', change_seq::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS cameras_notify ON cameras;
+    CREATE TRIGGER cameras_notify AFTER INSERT OR UPDATE OR DELETE ON cameras
+        FOR EACH ROW EXECUTE PROCEDURE notify_camera_change();
+"""
+
+
+class ChangeFeed:
+    """Tracks the latest camera change sequence number and wakes waiters on new changes."""
+
+    def __init__(self, retention_seconds: float = 86400.0):
+        self.retention_seconds = retention_seconds
+        self.latest_seq = 0
+        self.listeners: List[Callable[[int], None]] = []
+        self._condition = threading.Condition()
+        self._running = False
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+    def start(self) -> None:
+        """Starts the listener thread once per process; safe to call on every request."""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._running = True
+            threading.Thread(target=self._listen, name="camera-change-feed", daemon=True).start()
+
+    def stop(self) -> None:
+        self._running = False
+
+    def wait(self, since: int, timeout: float) -> int:
+        """Blocks until a change newer than ``since`` is known or the timeout passes."""
+        with self._condition:
+            self._condition.wait_for(lambda: self.latest_seq > since, timeout)
+            return self.latest_seq
+
+    def _advance(self, seq: int) -> None:
+        with self._condition:
+            if seq <= self.latest_seq:
+                return
+            self.latest_seq = seq
+            self._condition.notify_all()
+        for listener in self.listeners:
+            listener(seq)
+
+    def _connect(self) -> psycopg2.extensions.connection:
+        conn = psycopg2.connect(host=config.DB_HOST, database=config.DB_NAME,
+                                user=config.DB_USER, password=config.DB_PASSWORD)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+            # Changes may have happened while not listening; catch up first.
+            cur.execute("SELECT COALESCE(max(seq), 0) FROM camera_changes")
+            self._advance(cur.fetchone()[0])
+        return conn
+
+    def _prune(self, conn: psycopg2.extensions.connection) -> None:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM camera_changes WHERE ts < now() - %s * interval '1 second' "
+                        "AND seq < (SELECT max(seq) FROM camera_changes)", (self.retention_seconds,))
+
+    def _listen(self) -> None:
+        backoff = 1.0
+        conn = None
+        last_prune = 0.0
+        while self._running:
+            try:
+                if conn is None or conn.closed:
+                    conn = self._connect()
+                    logging.info(f"Listening for camera changes (latest seq {self.latest_seq})")
+                    backoff = 1.0
+                if time.time() - last_prune > 3600:
+                    self._prune(conn)
+                    last_prune = time.time()
+                if select.select([conn], [], [], 5.0) == ([], [], []):
+                    continue
+                conn.poll()
+                seqs = [int(notify.payload) for notify in conn.notifies if notify.payload.isdigit()]
+                conn.notifies.clear()
+                if seqs:
+                    self._advance(max(seqs))
+            except (psycopg2.Error, OSError) as e:
+                logging.error(f"Camera change feed connection lost: {e}; reconnecting in {backoff:.0f}s")
+                if conn is not None and not conn.closed:
+                    conn.close()
+                conn = None
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+        if conn is not None and not conn.closed:
+            conn.close()
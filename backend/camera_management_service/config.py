@@ -1,2 +1,27 @@
-# camera_stream_service/config.py
-CAMERA_URL = "rtsp://admin:P@ssw0rd@192.168.1.64:554/Streaming/channels/101"
\ No newline at end of file
+# camera_management_service/config.py
+
+DB_HOST = "localhost"
+DB_NAME = "container_ocr"
+DB_USER = "postgres"
+DB_PASSWORD = "Man782761"  # Replace with your PostgreSQL password
+
+# Pooled database connections per process
+DB_POOL_MIN = 1
+DB_POOL_MAX = 10
+
+# In-process cache of camera list and records. Writes through this process
+# invalidate it at once; the TTL bounds staleness across processes.
+CACHE_TTL_SECONDS = 30.0
+
+# HTTP serving: "waitress" (multi-threaded production server) or "flask"
+# (development server). Under gunicorn, run e.g. `gunicorn -w 4 -b 0.0.0.0:5001 main:app`.
+SERVER = "waitress"
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 5001
+# Each open long-poll on /cameras/changes holds one of these threads.
+SERVER_THREADS = 8
+
+# Camera change feed (see change_feed.py)
+LONG_POLL_SECONDS = 30.0  # longest /cameras/changes wait
+CHANGES_PAGE_SIZE = 500
+CHANGE_FEED_RETENTION_SECONDS = 86400.0  # older changes are pruned; clients then reload
@@ -0,0 +1,78 @@
+# camera_management_service/database.py
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Tuple
+
+import psycopg2
+import psycopg2.pool
+
+import config
+
+_pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> psycopg2.pool.ThreadedConnectionPool:
+    """Returns this process's connection pool, creating it on first use.
+
+    The pool is created lazily so pre-forking servers open connections in
+    each worker rather than sharing the parent's sockets.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = psycopg2.pool.ThreadedConnectionPool(
+                config.DB_POOL_MIN, config.DB_POOL_MAX,
+                host=config.DB_HOST, database=config.DB_NAME, user=config.DB_USER, password=config.DB_PASSWORD)
+            _pool_pid = os.getpid()
+            logging.info(f"Database pool ready ({config.DB_POOL_MIN}-{config.DB_POOL_MAX} connections)")
+        return _pool
+
+
+@contextmanager
+def pooled_connection() -> Iterator[psycopg2.extensions.connection]:
+    """Borrows a pooled connection; broken connections are discarded instead of returned."""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        pool.putconn(conn, close=True)
+        conn = None
+        raise
+    finally:
+        if conn is not None:
+            if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            pool.putconn(conn, close=bool(conn.closed))
+
+
+def execute_query(query: str, params: Tuple = None, fetch: bool = False, fetchall: bool = False) -> Any:
+    """Executes a database query on a pooled connection and commits it."""
+
+    try:
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                result = None
+                if fetch:
+                    result = cursor.fetchone()
+                elif fetchall:
+                    result = cursor.fetchall()
+            # Commit after fetching too, so INSERT ... RETURNING is persisted
+            conn.commit()
+            return result
+    except psycopg2.Error as e:
+        logging.error(f"Database query error: {e}, Query: {query}, Params: {params}")
+        raise  # Re-raise to indicate failure
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
@@ -2,85 +2,80 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import psycopg2
 import psycopg2.extras
+import base64
+import json
 import logging
+import os
+import sys
+from datetime import datetime, timezone
 from typing import List, Dict, Tuple, Any  # Import typing hints
 
+import config
+from change_feed import CREATE_CHANGE_FEED, ChangeFeed
+from database import close_pool, execute_query
+from response_cache import ResponseCache
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.detection_zones import parse_zones
+
 app = Flask(__name__)
 CORS(app)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Camera list and records, invalidated by every write below
+camera_cache = ResponseCache(config.CACHE_TTL_SECONDS)
 
-DB_HOST = "localhost"
-DB_NAME = "container_ocr"
-DB_USER = "postgres"
-DB_PASSWORD = "Man782761"  # Replace with your PostgreSQL password
+# Registry change notifications; also invalidates the cache on writes made by other processes
+change_feed = ChangeFeed(config.CHANGE_FEED_RETENTION_SECONDS)
+change_feed.listeners.append(lambda seq: camera_cache.invalidate())
 
 
-def get_db_connection() -> psycopg2.extensions.connection:
-    """Gets a database connection."""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        return conn
-    except psycopg2.Error as e:
-        logging.critical(f"Database connection error: {e}")
-        raise  # Re-raise the exception to fail fast
+@app.before_request
+def start_change_feed():
+    # Started lazily so every server worker process runs its own listener.
+    change_feed.start()
 
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def execute_query(query: str, params: Tuple = None, fetch: bool = False, fetchall: bool = False) -> Any:
-    """Executes a database query with error handling."""
+def zones_param(zones: Any):
+    """Stores no zones as SQL NULL."""
+    return psycopg2.extras.Json(zones) if zones else None
 
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
 
-        if fetch:
-            return cursor.fetchone()
-        elif fetchall:
-            return cursor.fetchall()
-        else:
-            conn.commit()
-    except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
-        logging.error(f"Database query error: {e}, Query: {query}, Params: {params}")
-        raise  # Re-raise to indicate failure
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+def camera_record(row) -> Dict[str, Any]:
+    return {"id": row[0], "ip_address": row[1], "location": row[2], "detection_zones": row[3]}
+
+
+# OCR results read API page sizes
+RESULTS_PAGE_SIZE = 100
+RESULTS_MAX_PAGE_SIZE = 1000
 
 
 @app.route('/cameras', methods=['POST'])
 def add_camera():
-    """Adds a new camera."""
+    """Adds a new camera, optionally with detection zones."""
 
     data = request.get_json()
     ip_address = data.get("ip_address")
     location = data.get("location")
+    zones = data.get("detection_zones")
 
     if not ip_address or not location:
         return jsonify({"error": "ip_address and location are required"}), 400
+    try:
+        parse_zones(zones)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid detection_zones: {e}"}), 400
 
-    query = "INSERT INTO cameras (ip_address, location) VALUES (%s, %s) RETURNING id, ip_address, location"
+    query = """
+        INSERT INTO cameras (ip_address, location, detection_zones) VALUES (%s, %s, %s)
+        RETURNING id, ip_address, location, detection_zones
+    """
     try:
-        new_camera = execute_query(query, (ip_address, location), fetch=True)
+        new_camera = execute_query(query, (ip_address, location, zones_param(zones)), fetch=True)
+        camera_cache.invalidate()
         logging.info(f"Camera added: {new_camera}")
-        return jsonify(
-            {"id": new_camera[0], "ip_address": new_camera[1], "location": new_camera[2]}
-        ), 201
+        return jsonify(camera_record(new_camera)), 201
     except psycopg2.Error:
         return jsonify({"error": "Failed to add camera"}), 500
 
@@ -89,11 +84,15 @@ def add_camera():
 def get_cameras():
     """Gets all cameras."""
 
-    query = "SELECT id, ip_address, location FROM cameras"
-    try:
+    query = "SELECT id, ip_address, location, detection_zones FROM cameras"
+
+    def load() -> bytes:
         cameras = execute_query(query, fetchall=True)
         logging.info("Cameras retrieved successfully")
-        return jsonify(cameras)
+        return json.dumps(cameras).encode()
+
+    try:
+        return camera_cache.respond("cameras", load)
     except psycopg2.Error:
         return jsonify({"error": "Failed to retrieve cameras"}), 500
 
@@ -102,22 +101,27 @@ def get_cameras():
 def get_camera(camera_id: int):
     """Gets a specific camera by ID."""
 
-    query = "SELECT id, ip_address, location FROM cameras WHERE id = %s"
-    try:
+    query = "SELECT id, ip_address, location, detection_zones FROM cameras WHERE id = %s"
+
+    def load() -> bytes:
         camera = execute_query(query, (camera_id,), fetch=True)
-        if camera:
-            logging.info(f"Camera {camera_id} retrieved successfully")
-            return jsonify(camera)
-        else:
-            logging.warning(f"Camera {camera_id} not found")
-            return jsonify({"message": "Camera not found"}), 404
+        if not camera:
+            raise LookupError(camera_id)
+        logging.info(f"Camera {camera_id} retrieved successfully")
+        return json.dumps(camera).encode()
+
+    try:
+        return camera_cache.respond(f"camera:{camera_id}", load)
+    except LookupError:
+        logging.warning(f"Camera {camera_id} not found")
+        return jsonify({"message": "Camera not found"}), 404
     except psycopg2.Error:
         return jsonify({"error": f"Failed to retrieve camera {camera_id}"}), 500
 
 
 @app.route('/cameras/<int:camera_id>', methods=['PUT'])
 def update_camera(camera_id: int):
-    """Updates a specific camera."""
+    """Updates a specific camera; its detection zones only change if ``detection_zones`` is given."""
 
     data = request.get_json()
     ip_address = data.get("ip_address")
@@ -127,14 +131,44 @@ def update_camera(camera_id: int):
         return jsonify({"error": "ip_address and location are required"}), 400
 
     query = "UPDATE cameras SET ip_address = %s, location = %s WHERE id = %s"
+    params: Tuple = (ip_address, location, camera_id)
+    if "detection_zones" in data:
+        try:
+            parse_zones(data["detection_zones"])
+        except ValueError as e:
+            return jsonify({"error": f"Invalid detection_zones: {e}"}), 400
+        query = "UPDATE cameras SET ip_address = %s, location = %s, detection_zones = %s WHERE id = %s"
+        params = (ip_address, location, zones_param(data["detection_zones"]), camera_id)
     try:
-        execute_query(query, (ip_address, location, camera_id))
+        execute_query(query, params)
+        camera_cache.invalidate()
         logging.info(f"Camera {camera_id} updated successfully")
         return jsonify({"message": "Camera updated successfully"})
     except psycopg2.Error:
         return jsonify({"error": f"Failed to update camera {camera_id}"}), 500
 
 
+@app.route('/cameras/<int:camera_id>/detection_zones', methods=['PUT'])
+def update_detection_zones(camera_id: int):
+    """Replaces a camera's detection zones; null or [] means the whole frame."""
+
+    zones = (request.get_json() or {}).get("detection_zones")
+    try:
+        parse_zones(zones)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid detection_zones: {e}"}), 400
+
+    query = "UPDATE cameras SET detection_zones = %s WHERE id = %s RETURNING id"
+    try:
+        if not execute_query(query, (zones_param(zones), camera_id), fetch=True):
+            return jsonify({"message": "Camera not found"}), 404
+        camera_cache.invalidate()
+        logging.info(f"Detection zones of camera {camera_id} updated")
+        return jsonify({"message": "Detection zones updated successfully"})
+    except psycopg2.Error:
+        return jsonify({"error": f"Failed to update detection zones of camera {camera_id}"}), 500
+
+
 @app.route('/cameras/<int:camera_id>', methods=['DELETE'])
 def delete_camera(camera_id: int):
     """Deletes a specific camera."""
@@ -142,6 +176,7 @@ def delete_camera(camera_id: int):
     query = "DELETE FROM cameras WHERE id = %s"
     try:
         execute_query(query, (camera_id,))
+        camera_cache.invalidate()
         logging.info(f"Camera {camera_id} deleted successfully")
         return jsonify({"message": "Camera deleted successfully"})
     except psycopg2.Error:
@@ -155,12 +190,165 @@ def reset_cameras():
     query = "DELETE FROM cameras"
     try:
         execute_query(query)
+        camera_cache.invalidate()
         logging.info("Camera list reset successfully")
         return jsonify({"message": "Camera list reset successfully"}), 200
     except psycopg2.Error:
         return jsonify({"error": "Failed to reset camera list"}), 500
 
 
+@app.route('/cameras/active', methods=['GET'])
+def get_active_cameras():
+    """Gets every active camera in one call, with the change sequence number of the snapshot."""
+
+    # One statement, so the cameras and the sequence number come from the same snapshot
+    query = """
+        SELECT COALESCE(json_agg(json_build_object('id', id, 'ip_address', ip_address, 'location', location,
+                                                   'detection_zones', detection_zones)
+                                 ORDER BY id) FILTER (WHERE active), '[]'),
+               (SELECT COALESCE(max(seq), 0) FROM camera_changes)
+        FROM cameras
+    """
+
+    def load() -> bytes:
+        cameras, seq = execute_query(query, fetch=True)
+        return json.dumps({"cameras": cameras, "seq": seq}).encode()
+
+    try:
+        return camera_cache.respond("active", load)
+    except psycopg2.Error:
+        return jsonify({"error": "Failed to retrieve active cameras"}), 500
+
+
+@app.route('/cameras/changes', methods=['GET'])
+def get_camera_changes():
+    """Long-polls for camera changes after the sequence number ``since``.
+
+    Returns as soon as there are changes, or after ``timeout`` seconds with
+    an empty list. Each change carries the camera's current record, or null
+    if it was deleted or deactivated. ``reset`` means changes since ``since``
+    were pruned and the client should reload ``/cameras/active``.
+    """
+
+    try:
+        since = int(request.args.get("since", 0))
+        timeout = min(float(request.args.get("timeout", config.LONG_POLL_SECONDS)), config.LONG_POLL_SECONDS)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    change_feed.wait(since, timeout)
+    query = """
+        SELECT ch.seq, ch.camera_id, ch.op, c.ip_address, c.location, c.detection_zones, COALESCE(c.active, FALSE)
+        FROM camera_changes ch
+        LEFT JOIN cameras c ON c.id = ch.camera_id
+        WHERE ch.seq > %s
+        ORDER BY ch.seq
+        LIMIT %s
+    """
+    try:
+        rows = execute_query(query, (since, config.CHANGES_PAGE_SIZE), fetchall=True)
+        oldest, newest = execute_query(
+            "SELECT COALESCE(min(seq), 0), COALESCE(max(seq), 0) FROM camera_changes", fetch=True)
+    except psycopg2.Error:
+        return jsonify({"error": "Failed to retrieve camera changes"}), 500
+
+    changes = []
+    for seq, camera_id, op, ip_address, location, zones, active in rows:
+        camera = camera_record((camera_id, ip_address, location, zones)) if active else None
+        changes.append({"seq": seq, "id": camera_id, "op": op, "camera": camera})
+    return jsonify({
+        "changes": changes,
+        "seq": changes[-1]["seq"] if changes else max(since, 0),
+        # Pruned past the client's position, or the client is ahead of a recreated table
+        "reset": 0 < since < oldest - 1 or since > newest,
+    })
+
+
+def parse_time(value: str) -> datetime:
+    """Parses an ISO 8601 timestamp or epoch seconds; naive times are UTC."""
+    try:
+        return datetime.fromtimestamp(float(value), timezone.utc)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        ts, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(ts), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+
+
+@app.route('/ocr/results', methods=['GET'])
+def get_ocr_results():
+    """Gets OCR results, newest first, one keyset page at a time.
+
+    Filters: camera_id, since, until, valid, container_number (a trailing
+    ``*`` matches a prefix). Pass the returned ``next_cursor`` as ``cursor``
+    to get the next page.
+    """
+
+    args = request.args
+    conditions, params = [], []
+    try:
+        limit = max(1, min(int(args.get("limit", RESULTS_PAGE_SIZE)), RESULTS_MAX_PAGE_SIZE))
+        if args.get("camera_id"):
+            conditions.append("camera_id = %s")
+            params.append(args["camera_id"])
+        if args.get("since"):
+            conditions.append("ts >= %s")
+            params.append(parse_time(args["since"]))
+        if args.get("until"):
+            conditions.append("ts < %s")
+            params.append(parse_time(args["until"]))
+        if args.get("valid"):
+            if args["valid"].lower() not in ("true", "false"):
+                raise ValueError("valid must be true or false")
+            conditions.append("valid = %s")
+            params.append(args["valid"].lower() == "true")
+        container_number = args.get("container_number", "").upper()
+        if container_number.endswith("*"):
+            prefix = container_number.rstrip("*").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("container_number LIKE %s")
+            params.append(prefix + "%")
+        elif container_number:
+            conditions.append("container_number = %s")
+            params.append(container_number)
+        if args.get("cursor"):
+            # Keyset pagination: continue strictly after the last row returned.
+            conditions.append("(ts, id) < (%s, %s)")
+            params.extend(decode_cursor(args["cursor"]))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+        SELECT id, ts, camera_id, track_id, container_number, iso_type, box, confidence, class_id, text, valid,
+               corrected, latency
+        FROM ocr_results {where}
+        ORDER BY ts DESC, id DESC
+        LIMIT %s
+    """
+    try:
+        rows = execute_query(query, tuple(params) + (limit + 1,), fetchall=True)
+    except psycopg2.Error:
+        return jsonify({"error": "Failed to retrieve OCR results"}), 500
+
+    columns = ("id", "ts", "camera_id", "track_id", "container_number", "iso_type",
+               "box", "confidence", "class_id", "text", "valid", "corrected", "latency")
+    results = [dict(zip(columns, row)) for row in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    for result in results:
+        result["ts"] = result["ts"].isoformat()
+    return jsonify({"results": results, "next_cursor": next_cursor})
+
+
 def initialize_db():
     """Initializes the database table."""
 
@@ -169,19 +357,37 @@ def initialize_db():
             id SERIAL PRIMARY KEY,
             ip_address TEXT,
             location TEXT
-        )
+        );
+        ALTER TABLE cameras ADD COLUMN IF NOT EXISTS active BOOLEAN NOT NULL DEFAULT TRUE;
+        -- Rectangles and polygons to crop frames to before detection; see common/detection_zones.py
+        ALTER TABLE cameras ADD COLUMN IF NOT EXISTS detection_zones JSONB;
     """
     try:
         execute_query(query)
-        logging.info("Cameras table created (if not exists)")
+        execute_query(CREATE_CHANGE_FEED)
+        logging.info("Cameras table and change feed created (if not exists)")
     except psycopg2.Error as e:
         logging.critical(f"Error creating cameras table: {e}")
         raise  # Re-raise to prevent app startup
 
 
+def serve() -> None:
+    """Runs the API on the configured server."""
+    if config.SERVER == "waitress":
+        from waitress import serve as waitress_serve
+
+        logging.info(f"Serving on {config.SERVER_HOST}:{config.SERVER_PORT} "
+                     f"with waitress ({config.SERVER_THREADS} threads)")
+        waitress_serve(app, host=config.SERVER_HOST, port=config.SERVER_PORT, threads=config.SERVER_THREADS)
+    else:
+        app.run(host=config.SERVER_HOST, port=config.SERVER_PORT, threaded=True)
+
+
 if __name__ == '__main__':
     try:
         initialize_db()
-        app.run(debug=True, port=5001)  # Specify the port here
+        serve()
     except psycopg2.Error:
-        print("Database initialization failed. Application cannot start.")
\ No newline at end of file
+        print("Database initialization failed. Application cannot start.")
+    finally:
+        close_pool()
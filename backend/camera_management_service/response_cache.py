@@ -0,0 +1,58 @@
+# camera_management_service/response_cache.py
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+from flask import Response, request
+
+
+class ResponseCache:
+    """In-process cache of serialized JSON responses with ETags.
+
+    Entries expire after ``ttl`` seconds and are all dropped by
+    ``invalidate``. A load that started before an invalidation is not
+    stored, so a write can never be overwritten by a stale read that was
+    already in progress.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, str, bytes]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, load: Callable[[], bytes]) -> Tuple[str, bytes]:
+        """Returns ``(etag, body)`` for a key, calling ``load`` on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+            generation = self._generation
+
+        body = load()
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (now + self.ttl, etag, body)
+        return etag, body
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def respond(self, key: str, load: Callable[[], bytes]) -> Response:
+        """Serves a cached JSON body, or 304 if the client's ETag still matches."""
+        etag, body = self.get(key, load)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        return response
@@ -0,0 +1,122 @@
+# camera_stream_service/benchmark.py
+"""Compares the OpenCV capture path with the PyAV decoder on a video file.
+
+Every mode reads the whole file (or --frames source frames) and keeps
+frames at --target-fps, as CameraThread does when it throttles. The OpenCV
+modes decode and convert every frame (``read``) or decode every frame and
+convert only the kept ones (``grab``/``retrieve``); the PyAV modes skip
+inside the decoder. Reports wall time, process CPU time (codec threads
+included) and CPU per kept frame.
+
+Usage: python benchmark.py gate.mp4 [--target-fps 20] [--threads 0,4] [--width 1280]
+"""
+import argparse
+import time
+from typing import Callable, Tuple
+
+import cv2
+import numpy as np
+
+from video_decoder import VideoDecoder
+
+
+def source_fps(video: str) -> float:
+    cap = cv2.VideoCapture(video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    cap.release()
+    return fps
+
+
+def resize(frame: np.ndarray, width: int, height: int) -> np.ndarray:
+    if not width and not height:
+        return frame
+    h, w = frame.shape[:2]
+    size = (width or round(w * height / h), height or round(h * width / w))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def run_opencv(video: str, limit: int, keep_every: int, width: int, height: int, grab: bool) -> Tuple[int, int]:
+    """Returns (frames decoded, frames kept)."""
+    cap = cv2.VideoCapture(video, cv2.CAP_FFMPEG)
+    decoded = kept = 0
+    while decoded < limit:
+        if grab:
+            if not cap.grab():
+                break
+            decoded += 1
+            if (decoded - 1) % keep_every:
+                continue
+            ret, frame = cap.retrieve()
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            decoded += 1
+            if (decoded - 1) % keep_every:
+                continue
+        resize(frame, width, height)
+        kept += 1
+    cap.release()
+    return decoded, kept
+
+
+def run_pyav(video: str, limit: int, width: int, height: int, **options) -> Tuple[int, int]:
+    decoder = VideoDecoder(video, width=width, height=height, **options)
+    if not decoder.isOpened():
+        raise SystemExit(f"PyAV could not open {video}")
+    while decoder.frames_decoded < limit:
+        ret, _ = decoder.read()
+        if not ret:
+            break
+    decoder.release()
+    return decoder.frames_decoded, decoder.frames_returned
+
+
+def measure(name: str, run: Callable[[], Tuple[int, int]]) -> None:
+    wall, cpu = time.perf_counter(), time.process_time()
+    decoded, kept = run()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    print(f"{name:<28}{decoded:>9}{kept:>7}{wall:>9.2f}{cpu:>9.2f}{decoded / wall:>11.1f}"
+          f"{1000 * cpu / max(kept, 1):>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("video", help="video file to decode")
+    parser.add_argument("--frames", type=int, default=10 ** 9, help="source frames to decode per mode")
+    parser.add_argument("--target-fps", type=float, default=20.0, help="kept frames per second of video")
+    parser.add_argument("--threads", default="0", help="comma-separated PyAV codec thread counts")
+    parser.add_argument("--thread-type", default="SLICE", help="SLICE, FRAME or AUTO")
+    parser.add_argument("--width", type=int, default=0, help="output width (0 keeps the source size)")
+    parser.add_argument("--height", type=int, default=0)
+    parser.add_argument("--skip-opencv", action="store_true")
+    args = parser.parse_args()
+
+    fps = source_fps(args.video)
+    keep_every = max(1, round(fps / args.target_fps))
+    print(f"{args.video}: {fps:.1f} fps source, keeping {args.target_fps:g} fps "
+          f"(every {keep_every}), output {args.width or 'source'}x{args.height or 'source'}")
+    print(f"{'mode':<28}{'decoded':>9}{'kept':>7}{'wall s':>9}{'cpu s':>9}{'decode fps':>11}{'cpu ms/kept':>12}")
+
+    if not args.skip_opencv:
+        measure("opencv read", lambda: run_opencv(args.video, args.frames, keep_every, args.width, args.height,
+                                                  grab=False))
+        measure("opencv grab/retrieve", lambda: run_opencv(args.video, args.frames, keep_every, args.width,
+                                                          args.height, grab=True))
+
+    for threads in (int(t) for t in args.threads.split(",")):
+        common = dict(threads=threads, thread_type=args.thread_type)
+        suffix = f" t={threads or 'auto'}"
+        measure("pyav every_nth" + suffix, lambda: run_pyav(args.video, args.frames, args.width, args.height,
+                                                            every_nth=keep_every, **common))
+        measure("pyav max_fps" + suffix, lambda: run_pyav(args.video, args.frames, args.width, args.height,
+                                                          max_fps=args.target_fps, **common))
+        measure("pyav nonref+max_fps" + suffix, lambda: run_pyav(args.video, args.frames, args.width,
+                                                                 args.height, skip="nonref",
+                                                                 max_fps=args.target_fps, **common))
+        measure("pyav keyframes" + suffix, lambda: run_pyav(args.video, args.frames, args.width, args.height,
+                                                            skip="keyframes", **common))
+
+
+if __name__ == "__main__":
+    main()
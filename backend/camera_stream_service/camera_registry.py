@@ -0,0 +1,98 @@
+# camera_stream_service/camera_registry.py
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+
+import config
+
+# Called with (camera_id, old record, new record); a None record means absent or inactive
+ChangeHandler = Callable[[str, Optional[Dict], Optional[Dict]], None]
+
+
+class CameraRegistry:
+    """Local snapshot of the active cameras, kept current from the management API's change feed.
+
+    At startup the whole registry is loaded with one ``/cameras/active``
+    call. A background thread then long-polls ``/cameras/changes`` and
+    reports each add, URL change and removal to ``on_change``.
+    """
+
+    def __init__(self, api_url: str, on_change: ChangeHandler):
+        self.api_url = api_url.rstrip("/")
+        self.on_change = on_change
+        self.cameras: Dict[str, Dict] = {}
+        self.seq = 0
+        self._lock = threading.Lock()
+        self._running = False
+
+    def get(self, camera_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self.cameras.get(str(camera_id))
+
+    def url(self, camera_id: str) -> Optional[str]:
+        camera = self.get(camera_id)
+        return camera.get("ip_address") if camera else None
+
+    def start(self) -> None:
+        self._running = True
+        threading.Thread(target=self._run, name="camera-registry", daemon=True).start()
+
+    def stop(self) -> None:
+        self._running = False
+
+    def load(self) -> None:
+        """Replaces the snapshot with the management API's active cameras."""
+        response = requests.get(f"{self.api_url}/active", timeout=config.REGISTRY_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        cameras = {str(camera["id"]): camera for camera in data["cameras"]}
+        with self._lock:
+            previous, self.cameras, self.seq = self.cameras, cameras, data["seq"]
+        logging.info(f"Loaded {len(cameras)} active cameras (change seq {self.seq})")
+        for camera_id in previous.keys() | cameras.keys():
+            self._apply(camera_id, previous.get(camera_id), cameras.get(camera_id))
+
+    def poll(self) -> None:
+        """Waits for the next batch of changes and applies it."""
+        response = requests.get(
+            f"{self.api_url}/changes", params={"since": self.seq, "timeout": config.REGISTRY_LONG_POLL_SECONDS},
+            timeout=config.REGISTRY_LONG_POLL_SECONDS + config.REGISTRY_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        if data.get("reset"):
+            logging.warning("Camera change feed was reset; reloading the registry")
+            self.load()
+            return
+        for change in data["changes"]:
+            camera_id = str(change["id"])
+            with self._lock:
+                old = self.cameras.get(camera_id)
+                if change["camera"] is None:
+                    self.cameras.pop(camera_id, None)
+                else:
+                    self.cameras[camera_id] = change["camera"]
+            self._apply(camera_id, old, change["camera"])
+        self.seq = data["seq"]
+
+    def _apply(self, camera_id: str, old: Optional[Dict], new: Optional[Dict]) -> None:
+        if old == new:
+            return
+        try:
+            self.on_change(camera_id, old, new)
+        except Exception as e:
+            logging.error(f"Error applying change to camera {camera_id}: {e}")
+
+    def _run(self) -> None:
+        loaded = False
+        while self._running:
+            try:
+                if not loaded:
+                    self.load()
+                    loaded = True
+                self.poll()
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                logging.error(f"Camera registry update failed: {e}; retrying in {config.REGISTRY_RETRY_SECONDS}s")
+                time.sleep(config.REGISTRY_RETRY_SECONDS)
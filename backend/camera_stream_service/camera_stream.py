@@ -0,0 +1,269 @@
+# camera_stream_service/camera_stream.py
+import cv2
+import numpy as np
+import pika
+import threading
+import time
+import logging
+import os
+import requests
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import config
+import message_queue
+from latest_frame import LatestFrameReader
+from motion_gate import create_motion_gate
+from rate_controller import BackpressureController
+from video_decoder import VideoDecoder
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import models
+from common.detection_zones import Zone, crop_box, parse_zones
+from common.frame_store import FrameStore
+from common.message_queue_client import MessageQueueClient
+
+# Receives (camera_id, jpeg_bytes) for every preview frame
+PreviewSink = Callable[[str, bytes], None]
+
+
+class CameraThread(threading.Thread):
+    def __init__(self, camera_id: str, rate_controller: Optional[BackpressureController] = None,
+                 preview_sink: Optional[PreviewSink] = None, rtsp_url: Optional[str] = None,
+                 frame_store: Optional[FrameStore] = None):
+        super().__init__(daemon=True)
+        self.camera_id = camera_id
+        self.rate_controller = rate_controller
+        self.preview_sink = preview_sink
+        # Set by the ingest worker while the camera has websocket viewers
+        self.preview_enabled = False
+        self.last_preview_time = 0.0
+        self.running = True
+        # A VideoDecoder when config.DECODER is "pyav"; unused with LATEST_FRAME_CAPTURE
+        self.cap: Optional[cv2.VideoCapture] = None
+        self.reader: Optional[LatestFrameReader] = None
+        self.last_frame_time: float = time.time()
+        self.frame_interval: float = 0.05  # Target interval (20fps)
+        # Shared by every camera in the process
+        self.message_queue: Optional[MessageQueueClient] = None
+        # Normally handed over from the stream service's camera registry
+        self.rtsp_url: Optional[str] = rtsp_url
+        # A LocalFrameStore when every stage runs in this process
+        self.frame_store = frame_store or FrameStore(camera_id, slots=config.FRAME_STORE_SLOTS)
+        self.motion_gate = create_motion_gate(camera_id)
+        # Published frames are cropped to these (see set_detection_zones)
+        self.detection_zones: List[Zone] = []
+        self._crop: Optional[Tuple[Tuple[int, int], Optional[Tuple[int, int, int, int]]]] = None
+        # The broker discards frames that wait longer than the staleness budget.
+        self.publish_properties = pika.BasicProperties(
+            expiration=str(int(config.STALENESS_BUDGET_SECONDS * 1000)))
+        # Counters read by the ingest worker for per-camera fps and CPU reports
+        self.frames_read = 0
+        self.frames_published = 0
+        self.frames_dropped = 0
+        # Read-to-publish seconds per published frame, collected by the ingest worker
+        self.capture_latencies: List[float] = []
+        # This thread's CPU plus the latest-frame reader's drain threads, where the decoding happens
+        self.cpu_seconds = 0.0
+
+    def fetch_camera_url(self) -> bool:
+        """Fetches the RTSP URL from the camera management API."""
+        try:
+            response = requests.get(f"{config.CAMERA_MANAGEMENT_API_URL}/{self.camera_id}")
+            response.raise_for_status()
+            camera_data = response.json()
+            # The record is served as an [id, ip_address, location, detection_zones] row
+            if isinstance(camera_data, dict):
+                self.rtsp_url = camera_data.get("ip_address")
+                self.set_detection_zones(camera_data.get("detection_zones"))
+            else:
+                self.rtsp_url = camera_data[1]
+                self.set_detection_zones(camera_data[3] if len(camera_data) > 3 else None)
+            if not self.rtsp_url:
+                logging.error(f"Camera URL not found for camera {self.camera_id}")
+                return False
+            logging.info(f"Fetched camera URL: {self.rtsp_url} for camera {self.camera_id}")
+            return True
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error fetching camera URL for {self.camera_id}: {e}")
+            return False
+
+    def connect_to_rabbitmq(self) -> None:
+        """Attaches to the process's shared RabbitMQ client, which reconnects on its own."""
+        self.message_queue = message_queue.connect()
+
+    def create_capture(self):
+        """Opens the camera's stream with the configured decoder; returns None if it cannot be opened."""
+        if config.DECODER == "pyav":
+            cap = VideoDecoder(self.rtsp_url, open_timeout=config.CAPTURE_OPEN_TIMEOUT_SECONDS,
+                               read_timeout=config.CAPTURE_READ_TIMEOUT_SECONDS, **config.PYAV_DECODER)
+        else:
+            os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = "rtsp_transport;tcp"
+            cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG, [
+                cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(config.CAPTURE_OPEN_TIMEOUT_SECONDS * 1000),
+                cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(config.CAPTURE_READ_TIMEOUT_SECONDS * 1000)])
+        if not cap.isOpened():
+            logging.error(f"Error: Could not open video stream from {self.rtsp_url}")
+            cap.release()
+            return None
+        return cap
+
+    def open_video_capture(self) -> bool:
+        """Opens the video capture."""
+        if not self.rtsp_url:
+            logging.error(f"RTSP URL is not available for camera {self.camera_id}")
+            return False
+        if config.LATEST_FRAME_CAPTURE:
+            # Files are paced to their frame rate unless the camera runs unthrottled.
+            self.reader = LatestFrameReader(self.camera_id, self.create_capture,
+                                            is_file=os.path.isfile(self.rtsp_url),
+                                            pace_files=self.frame_interval > 0)
+            self.reader.start()
+            return True
+        self.cap = self.create_capture()
+        return self.cap is not None
+
+    def set_detection_zones(self, zones) -> None:
+        """Sets the camera's detection zones from its record; None or [] publishes whole frames."""
+        try:
+            self.detection_zones = parse_zones(zones)
+        except ValueError as e:
+            logging.error(f"Ignoring invalid detection zones of camera {self.camera_id}: {e}")
+            self.detection_zones = []
+        self._crop = None
+
+    def crop_to_zones(self, frame: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int, float]]:
+        """Cuts the bounding box of the detection zones out of a frame and downscales it if configured.
+
+        Returns the frame to publish and its ``(x, y, scale)`` relative to the camera frame.
+        """
+        height, width = frame.shape[:2]
+        crop = self._crop
+        if crop is None or crop[0] != (width, height):
+            crop = self._crop = ((width, height), crop_box(self.detection_zones, width, height))
+        box = crop[1]
+        if box is None:
+            return frame, (0, 0, 1.0)
+        x1, y1, x2, y2 = box
+        frame = frame[y1:y2, x1:x2]
+        scale = 1.0
+        if 0 < config.DETECTION_ZONE_MAX_WIDTH < x2 - x1:
+            scale = config.DETECTION_ZONE_MAX_WIDTH / (x2 - x1)
+            frame = cv2.resize(frame, (config.DETECTION_ZONE_MAX_WIDTH, max(1, round((y2 - y1) * scale))),
+                               interpolation=cv2.INTER_AREA)
+        return frame, (x1, y1, scale)
+
+    def read_latest(self) -> Optional[Tuple[np.ndarray, float]]:
+        """Waits until the next frame is due, then takes the newest one from the reader."""
+        due = self.last_frame_time + self.frame_interval
+        now = time.time()
+        if due > now:
+            time.sleep(due - now)
+        # Keep a cadence of due times, so waiting for the next frame does not lower the rate.
+        self.last_frame_time = due if now - due < self.frame_interval else now
+        ret, frame, grabbed_at = self.reader.read(timeout=1.0)
+        if not ret:
+            return None
+        return frame, grabbed_at
+
+    def read_buffered(self) -> Optional[Tuple[np.ndarray, float]]:
+        """Reads the next buffered frame, then waits until it is due."""
+        ret, frame = self.cap.read()
+        if not ret or frame is None:
+            if self.frames_read and os.path.isfile(self.rtsp_url):
+                # Recorded clips (replays, benchmarks) start over at the end.
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                return None
+            logging.warning(
+                f"No frame received or frame is None from {self.rtsp_url}")
+            time.sleep(0.1)
+            return None
+        if config.DECODER_FOLLOWS_RATE and isinstance(self.cap, VideoDecoder):
+            # Frames above the target rate are then never converted at all.
+            self.cap.max_fps = 1.0 / self.frame_interval if self.frame_interval > 0 else 0.0
+
+        current_time = time.time()
+        time_elapsed = current_time - self.last_frame_time
+        time_to_wait = max(0, self.frame_interval - time_elapsed)
+        time.sleep(time_to_wait)
+        self.last_frame_time = current_time + time_to_wait
+        return frame, current_time
+
+    def run(self) -> None:
+        """Main thread loop."""
+        if not self.rtsp_url and not self.fetch_camera_url():
+            return
+
+        if not self.open_video_capture():
+            return
+
+        self.connect_to_rabbitmq()
+
+        try:
+            while self.running:
+                if self.rate_controller is not None:
+                    self.frame_interval = self.rate_controller.interval_for(self.camera_id)
+
+                captured = self.read_latest() if self.reader is not None else self.read_buffered()
+                if captured is None:
+                    continue
+                frame, current_time = captured
+                self.frames_read += 1
+
+                zone_frame, crop = self.crop_to_zones(frame) if self.detection_zones else (frame, (0, 0, 1.0))
+                if self.motion_gate is None or self.motion_gate.should_publish(zone_frame, current_time):
+                    frame_seq = self.frame_store.put(zone_frame, current_time)
+                    self.frames_published += 1
+                    height, width = zone_frame.shape[:2]
+                    published = time.time()
+                    message = models.frame_ref(self.camera_id, frame_seq, current_time, width, height,
+                                               trace=((models.PUBLISHED, published),), crop=crop)
+                    self.capture_latencies.append(published - current_time)
+                    # Never blocks: while the broker is unreachable and the
+                    # outbox is full, frames are dropped instead.
+                    if not self.message_queue.publish('', 'video_frames', message,
+                                                      self.publish_properties, block=False):
+                        self.frames_dropped += 1
+
+                if (self.preview_sink is not None and self.preview_enabled
+                        and current_time - self.last_preview_time >= 1.0 / config.PREVIEW_MAX_FPS):
+                    self.emit_preview(frame)
+                    self.last_preview_time = current_time
+
+                self.cpu_seconds = time.thread_time()
+                if self.reader is not None:
+                    self.cpu_seconds += self.reader.cpu_seconds
+
+        except Exception as e:
+            logging.exception(f"An unexpected error occurred in CameraThread: {e}")
+        finally:
+            self.cleanup()
+
+    def capture_stats(self) -> Dict[str, Any]:
+        """Drop, staleness and reconnect counters of the latest-frame reader, if in use."""
+        return self.reader.stats() if self.reader is not None else {}
+
+    def emit_preview(self, frame) -> None:
+        """Encodes one downscaled preview JPEG and hands it to the preview sink."""
+        height, width = frame.shape[:2]
+        if width > config.PREVIEW_WIDTH:
+            preview_height = height * config.PREVIEW_WIDTH // width
+            frame = cv2.resize(frame, (config.PREVIEW_WIDTH, preview_height), interpolation=cv2.INTER_AREA)
+        ret_enc, img_encoded = cv2.imencode(
+            '.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, config.PREVIEW_JPEG_QUALITY])
+        if ret_enc:
+            self.preview_sink(self.camera_id, img_encoded.tobytes())
+        else:
+            logging.error(f"Error: Failed to encode preview frame from {self.rtsp_url}")
+
+    def cleanup(self) -> None:
+        """Cleans up resources."""
+        if self.reader is not None:
+            self.reader.stop()
+        if self.cap and self.cap.isOpened():
+            self.cap.release()
+        self.frame_store.close()
+
+    def stop(self) -> None:
+        """Stops the thread."""
+        self.running = False
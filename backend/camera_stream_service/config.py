@@ -1,2 +1,105 @@
 # camera_stream_service/config.py
-CAMERA_URL = "rtsp://admin:P@ssw0rd@192.168.1.64:554/Streaming/channels/101"
\ No newline at end of file
+CAMERA_URL = "rtsp://admin:P@ssw0rd@192.168.1.64:554/Streaming/channels/101"
+
+# Capture backend: "opencv" (cv2.VideoCapture, decodes every frame) or "pyav"
+# (video_decoder.VideoDecoder, skips frames inside the decoder).
+DECODER = "opencv"
+# VideoDecoder settings; see video_decoder.py for the meaning of each one.
+PYAV_DECODER = {
+    "skip": "none",  # "none", "nonref" (drop B-frames) or "keyframes"
+    "every_nth": 1,
+    "max_fps": 0.0,  # 0 converts every decoded frame
+    "threads": 0,  # codec threads; 0 lets FFmpeg choose
+    "thread_type": "SLICE",  # "FRAME" and "AUTO" decode faster but add a frame of latency per thread
+    "width": 0,  # output size; 0 keeps the stream's (one side keeps the aspect ratio)
+    "height": 0,
+    "pixel_format": "bgr24",
+}
+# With the PyAV decoder, only convert frames at the camera's current target
+# rate (set by the backpressure controller); the rest are decoded and dropped.
+DECODER_FOLLOWS_RATE = True
+
+# Latest-frame capture (see latest_frame.py): a drain thread grabs every
+# frame as it arrives and the camera thread takes the newest one when it is
+# due, instead of reading whatever is next in FFmpeg's buffer.
+LATEST_FRAME_CAPTURE = True
+CAPTURE_STALL_SECONDS = 5.0  # reconnect when no frame arrives for this long
+CAPTURE_RECONNECT_BACKOFF = 1.0  # first reconnect delay, doubled per consecutive failure
+CAPTURE_RECONNECT_MAX_BACKOFF = 30.0
+# FFmpeg timeouts, so a dead camera makes open/grab fail instead of blocking
+CAPTURE_OPEN_TIMEOUT_SECONDS = 10.0
+CAPTURE_READ_TIMEOUT_SECONDS = 5.0
+
+# Frames of cameras with detection zones (set per camera through the
+# management API) are cropped to the zones' bounding box before publishing.
+# Crops wider than this many pixels are downscaled; 0 keeps full resolution,
+# which OCR reads best. Detection downscales to its model input anyway.
+DETECTION_ZONE_MAX_WIDTH = 0
+
+# Number of decoded frames kept per camera in the shared-memory frame store.
+# Detection and OCR must pick a frame up before it is overwritten.
+FRAME_STORE_SLOTS = 32
+
+# Motion gate: only frames with scene changes (plus a keepalive) are published
+# to video_frames. See motion_gate.MotionGate for the meaning of each setting.
+MOTION_GATE_DEFAULTS = {
+    "enabled": True,
+    "width": 160,
+    "blur": 5,
+    "learning_rate": 0.05,
+    "pixel_threshold": 25,
+    "area_threshold": 0.01,
+    "hold_seconds": 1.0,
+    "keepalive_seconds": 5.0,
+}
+
+# Per-camera overrides keyed by camera id, e.g. {"3": {"area_threshold": 0.03}}
+MOTION_GATE_CAMERAS = {}
+
+# Backpressure: each camera's publish rate moves between these bounds
+# depending on the video_frames backlog and the lag reported by detection.
+RATE_MIN_FPS = 2.0
+RATE_MAX_FPS = 20.0
+RATE_LIMITS = {}  # per-camera overrides, e.g. {"3": {"min_fps": 1.0, "max_fps": 10.0}}
+RATE_BACKLOG_HIGH = 50  # queued frames
+RATE_BACKLOG_LOW = 10
+RATE_LAG_HIGH = 1.0  # seconds between capture and detection
+RATE_LAG_LOW = 0.3
+RATE_DECREASE_FACTOR = 0.7
+RATE_INCREASE_STEP = 0.1
+RATE_POLL_INTERVAL = 0.5
+RATE_FEEDBACK_TIMEOUT = 5.0
+
+# Frames not picked up from video_frames within this budget are dropped by
+# the broker instead of being processed late.
+STALENESS_BUDGET_SECONDS = 2.0
+
+# Camera Management API URL (Ensure this is correct)
+CAMERA_MANAGEMENT_API_URL = "http://127.0.0.1:5001/cameras"
+
+# Camera registry (see camera_registry.py): loaded once at startup, then kept
+# current by long-polling the management API's change feed.
+REGISTRY_LONG_POLL_SECONDS = 25.0  # below the API's LONG_POLL_SECONDS
+REGISTRY_REQUEST_TIMEOUT = 5.0
+REGISTRY_RETRY_SECONDS = 5.0
+# Capture every active camera, starting and stopping streams as the registry changes
+AUTOSTART_CAMERAS = True
+
+# Ingest worker processes; 0 means one per CPU core.
+INGEST_WORKERS = 0
+INGEST_STATS_INTERVAL = 5.0  # seconds between per-camera fps/CPU reports
+INGEST_WATCHDOG_INTERVAL = 2.0
+INGEST_RESTART_BACKOFF = 2.0  # first restart delay for a failed capture, doubled per failure
+INGEST_RESTART_MAX_BACKOFF = 60.0
+INGEST_EVENT_QUEUE_SIZE = 256
+
+# Previews are only encoded for cameras with websocket viewers, at this size
+# and quality, and sent as binary attachments.
+PREVIEW_WIDTH = 640
+PREVIEW_JPEG_QUALITY = 60
+PREVIEW_MAX_FPS = 10.0
+# A client gets its next frame when it acks the previous one, or after this many seconds.
+PREVIEW_ACK_TIMEOUT = 2.0
+
+# Per-stage latency percentiles in Prometheus format on http://localhost:<port>/metrics
+METRICS_PORT = 9101
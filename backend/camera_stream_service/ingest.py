@@ -0,0 +1,298 @@
+# camera_stream_service/ingest.py
+"""Supervised multi-process camera ingest.
+
+Cameras are spread over a pool of worker processes, each running one
+``CameraThread`` per camera. Decode, gating and publishing therefore scale
+across cores instead of sharing the GIL with the Socket.IO server. The
+supervisor restarts crashed workers and re-assigns their cameras, and
+workers restart capture threads that die on their own.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Set
+
+import config
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.metrics import StageMetrics
+
+# Commands sent from the supervisor to a worker: (command, camera_id, argument)
+START, STOP, PREVIEW_ON, PREVIEW_OFF, SHUTDOWN = "start", "stop", "preview_on", "preview_off", "shutdown"
+
+# Messages sent from workers to the supervisor
+STATS, PREVIEW = "stats", "preview"
+
+
+def _worker_main(index: int, commands: multiprocessing.Queue, events: multiprocessing.Queue) -> None:
+    """Entry point of an ingest worker process."""
+    logging.basicConfig(level=logging.INFO,
+                        format=f'%(asctime)s - %(levelname)s - [ingest-{index}] %(message)s')
+    # Imported here so the spawned process only loads capture code.
+    from camera_stream import CameraThread
+    from rate_controller import BackpressureController
+
+    rate_controller = BackpressureController()
+    rate_controller.start()
+    threads: Dict[str, CameraThread] = {}
+    restart_at: Dict[str, float] = {}
+    failures: Dict[str, int] = {}
+    last: Dict[str, tuple] = {}
+    last_report = time.time()
+    last_process_cpu = time.process_time()
+
+    def preview_sink(camera_id: str, jpeg: bytes) -> None:
+        try:
+            events.put_nowait((PREVIEW, camera_id, jpeg))
+        except queue.Full:
+            pass  # The supervisor is behind; previews are disposable.
+
+    previews: Set[str] = set()
+    urls: Dict[str, Optional[str]] = {}
+    zones: Dict[str, Optional[list]] = {}
+
+    def start(camera_id: str) -> None:
+        thread = CameraThread(camera_id, rate_controller, preview_sink, urls.get(camera_id))
+        thread.set_detection_zones(zones.get(camera_id))
+        thread.preview_enabled = camera_id in previews
+        thread.start()
+        threads[camera_id] = thread
+        last[camera_id] = (0, 0, 0.0)
+
+    while True:
+        try:
+            command, camera_id, argument = commands.get(timeout=config.INGEST_STATS_INTERVAL / 2)
+            if command in (PREVIEW_ON, PREVIEW_OFF):
+                if command == PREVIEW_ON:
+                    previews.add(camera_id)
+                else:
+                    previews.discard(camera_id)
+                if camera_id in threads:
+                    threads[camera_id].preview_enabled = command == PREVIEW_ON
+            elif command == START and camera_id not in threads:
+                failures.pop(camera_id, None)
+                urls[camera_id], zones[camera_id] = argument
+                start(camera_id)
+            elif command == STOP and camera_id in threads:
+                thread = threads.pop(camera_id)
+                thread.stop()
+                # Let it release its frame store before the camera can be started again.
+                thread.join(timeout=5)
+                restart_at.pop(camera_id, None)
+                urls.pop(camera_id, None)
+                zones.pop(camera_id, None)
+            elif command == SHUTDOWN:
+                break
+        except queue.Empty:
+            pass
+
+        now = time.time()
+        for camera_id, thread in list(threads.items()):
+            if thread.is_alive():
+                continue
+            # The capture thread exited without being stopped: restart with backoff.
+            if camera_id not in restart_at:
+                failures[camera_id] = failures.get(camera_id, 0) + 1
+                delay = min(config.INGEST_RESTART_MAX_BACKOFF,
+                            config.INGEST_RESTART_BACKOFF * 2 ** (failures[camera_id] - 1))
+                restart_at[camera_id] = now + delay
+                logging.warning(f"Capture for camera {camera_id} stopped; restarting in {delay:.0f}s")
+            elif now >= restart_at[camera_id]:
+                del restart_at[camera_id]
+                start(camera_id)
+
+        elapsed = now - last_report
+        if elapsed >= config.INGEST_STATS_INTERVAL:
+            process_cpu = time.process_time()
+            stats = {
+                "worker": index,
+                "pid": os.getpid(),
+                "cpu_percent": 100.0 * (process_cpu - last_process_cpu) / elapsed,
+                "cameras": {},
+                "capture_latencies": [],
+            }
+            for camera_id, thread in threads.items():
+                read, published, cpu = last[camera_id]
+                if thread.frames_read < read:
+                    read, published, cpu = 0, 0, 0.0  # the thread was restarted
+                stats["cameras"][camera_id] = {
+                    "alive": thread.is_alive(),
+                    "fps": (thread.frames_read - read) / elapsed,
+                    "published_fps": (thread.frames_published - published) / elapsed,
+                    "cpu_percent": 100.0 * (thread.cpu_seconds - cpu) / elapsed,
+                    "restarts": failures.get(camera_id, 0),
+                    "dropped": thread.frames_dropped,
+                    "capture": thread.capture_stats(),
+                }
+                last[camera_id] = (thread.frames_read, thread.frames_published, thread.cpu_seconds)
+                latencies, thread.capture_latencies = thread.capture_latencies, []
+                stats["capture_latencies"].extend(latencies)
+            events.put((STATS, index, stats))
+            last_report, last_process_cpu = now, process_cpu
+
+    for thread in threads.values():
+        thread.stop()
+    for thread in threads.values():
+        thread.join(timeout=5)
+    rate_controller.stop()
+
+
+class _Worker:
+    def __init__(self, index: int, context, events: multiprocessing.Queue):
+        self.index = index
+        self.commands = context.Queue()
+        self.cameras: Set[str] = set()
+        self.process = context.Process(target=_worker_main, args=(index, self.commands, events),
+                                       name=f"ingest-{index}", daemon=True)
+        self.process.start()
+
+
+class IngestSupervisor:
+    """Assigns cameras to worker processes and keeps the workers alive."""
+
+    def __init__(self, num_workers: Optional[int] = None, on_preview=None):
+        self.num_workers = num_workers or config.INGEST_WORKERS or os.cpu_count() or 1
+        self.on_preview = on_preview
+        self._context = multiprocessing.get_context("spawn")
+        self._events = self._context.Queue(maxsize=config.INGEST_EVENT_QUEUE_SIZE)
+        self._workers = [_Worker(i, self._context, self._events) for i in range(self.num_workers)]
+        self._assignments: Dict[str, _Worker] = {}
+        self._stats: Dict[int, Dict] = {}
+        self._previews: Set[str] = set()
+        self._urls: Dict[str, Optional[str]] = {}
+        self._zones: Dict[str, Optional[list]] = {}
+        self._lock = threading.Lock()
+        self._running = True
+        self.metrics = StageMetrics("camera_stream")
+        threading.Thread(target=self._watch_workers, daemon=True).start()
+        threading.Thread(target=self._read_events, daemon=True).start()
+        logging.info(f"Ingest supervisor started with {self.num_workers} worker processes")
+
+    def start_stream(self, camera_id: str, url: Optional[str] = None, zones: Optional[list] = None) -> bool:
+        """Starts capturing a camera. Returns False if it is already running.
+
+        Without a URL the capture thread looks the camera up itself. ``zones``
+        are the camera's detection zones (see common/detection_zones.py).
+        """
+        camera_id = str(camera_id)
+        with self._lock:
+            if camera_id in self._assignments:
+                return False
+            worker = min(self._workers, key=lambda w: len(w.cameras))
+            worker.cameras.add(camera_id)
+            self._assignments[camera_id] = worker
+            self._urls[camera_id] = url
+            self._zones[camera_id] = zones
+            worker.commands.put((START, camera_id, (url, zones)))
+            if camera_id in self._previews:
+                worker.commands.put((PREVIEW_ON, camera_id, None))
+        logging.info(f"Camera {camera_id} assigned to ingest worker {worker.index}")
+        return True
+
+    def stop_stream(self, camera_id: str) -> bool:
+        """Stops capturing a camera. Returns False if it was not running."""
+        camera_id = str(camera_id)
+        with self._lock:
+            worker = self._assignments.pop(camera_id, None)
+            if worker is None:
+                return False
+            self._urls.pop(camera_id, None)
+            self._zones.pop(camera_id, None)
+            worker.cameras.discard(camera_id)
+            worker.commands.put((STOP, camera_id, None))
+        logging.info(f"Camera {camera_id} stopped on ingest worker {worker.index}")
+        return True
+
+    def update_stream(self, camera_id: str, url: str, zones: Optional[list] = None) -> bool:
+        """Restarts a running camera's capture on a new URL or with new detection zones.
+
+        Returns False if it is not running. A restart also resizes the
+        camera's frame store for the new crop.
+        """
+        camera_id = str(camera_id)
+        with self._lock:
+            worker = self._assignments.get(camera_id)
+            if worker is None:
+                return False
+            self._urls[camera_id] = url
+            self._zones[camera_id] = zones
+            # The worker joins the old capture thread before starting the new one.
+            worker.commands.put((STOP, camera_id, None))
+            worker.commands.put((START, camera_id, (url, zones)))
+        logging.info(f"Camera {camera_id} restarting on ingest worker {worker.index}")
+        return True
+
+    def set_preview(self, camera_id: str, enabled: bool) -> None:
+        """Turns preview encoding for a camera on or off in its worker."""
+        camera_id = str(camera_id)
+        with self._lock:
+            if enabled:
+                self._previews.add(camera_id)
+            else:
+                self._previews.discard(camera_id)
+            worker = self._assignments.get(camera_id)
+            if worker is not None:
+                worker.commands.put((PREVIEW_ON if enabled else PREVIEW_OFF, camera_id, None))
+
+    def cameras(self) -> Set[str]:
+        with self._lock:
+            return set(self._assignments)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Returns the latest per-camera fps and CPU figures, keyed by camera id."""
+        with self._lock:
+            assigned = dict(self._assignments)
+            worker_stats = dict(self._stats)
+        result = {}
+        for camera_id, worker in assigned.items():
+            stats = worker_stats.get(worker.index, {})
+            camera = dict(stats.get("cameras", {}).get(camera_id, {}))
+            camera.update(worker=worker.index, worker_cpu_percent=stats.get("cpu_percent"))
+            result[camera_id] = camera
+        return result
+
+    def _read_events(self) -> None:
+        while self._running:
+            try:
+                event = self._events.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if event[0] == PREVIEW and self.on_preview is not None:
+                self.on_preview(event[1], event[2])
+            elif event[0] == STATS:
+                self.metrics.observe_many(("capture", seconds) for seconds in event[2].pop("capture_latencies", ()))
+                with self._lock:
+                    self._stats[event[1]] = event[2]
+
+    def _watch_workers(self) -> None:
+        while self._running:
+            time.sleep(config.INGEST_WATCHDOG_INTERVAL)
+            with self._lock:
+                for i, worker in enumerate(self._workers):
+                    if worker.process.is_alive() or not self._running:
+                        continue
+                    logging.error(f"Ingest worker {worker.index} died (exit code "
+                                  f"{worker.process.exitcode}); restarting with {len(worker.cameras)} cameras")
+                    replacement = _Worker(worker.index, self._context, self._events)
+                    replacement.cameras = worker.cameras
+                    for camera_id in worker.cameras:
+                        self._assignments[camera_id] = replacement
+                        replacement.commands.put((START, camera_id, (self._urls.get(camera_id),
+                                                                     self._zones.get(camera_id))))
+                        if camera_id in self._previews:
+                            replacement.commands.put((PREVIEW_ON, camera_id, None))
+                    self._workers[i] = replacement
+
+    def shutdown(self) -> None:
+        """Stops every camera and worker process."""
+        self._running = False
+        for worker in self._workers:
+            worker.commands.put((SHUTDOWN, None, None))
+        for worker in self._workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
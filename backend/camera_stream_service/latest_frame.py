@@ -0,0 +1,257 @@
+# camera_stream_service/latest_frame.py
+"""Latest-frame capture: drain the stream continuously, hand off the newest frame.
+
+``cv2.VideoCapture`` buffers every frame the camera sends. A consumer that
+reads one frame, then sleeps to hold its target rate, falls further and
+further behind the buffer and ends up processing frames that are seconds
+old. ``LatestFrameReader`` runs a drain thread that ``grab()``s every frame
+as it arrives. Frames are only ``retrieve()``d (color-converted and copied
+out) when the consumer has asked for one, so the skipped ones cost a decode
+and nothing else.
+
+A watchdog reconnects the stream when no frame arrives for
+``stall_seconds``, including while the drain thread is blocked inside
+FFmpeg, which is abandoned and left to release its capture once it returns.
+Reconnects back off exponentially. Local video files are paced to their
+frame rate and start over at the end, so they behave like live cameras;
+unpaced files are read only as fast as frames are asked for.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import config
+
+# Returns an opened capture (cv2.VideoCapture or VideoDecoder), or None
+CaptureFactory = Callable[[], Optional[Any]]
+
+
+class LatestFrameReader:
+    """Keeps only the newest frame of a stream and hands it off on demand."""
+
+    def __init__(self, camera_id: str, open_capture: CaptureFactory, is_file: bool = False,
+                 pace_files: bool = True, stall_seconds: float = config.CAPTURE_STALL_SECONDS,
+                 reconnect_backoff: float = config.CAPTURE_RECONNECT_BACKOFF,
+                 reconnect_max_backoff: float = config.CAPTURE_RECONNECT_MAX_BACKOFF):
+        self.camera_id = camera_id
+        self.open_capture = open_capture
+        self.is_file = is_file
+        self.pace_files = pace_files
+        self.stall_seconds = stall_seconds
+        self.reconnect_backoff = reconnect_backoff
+        self.reconnect_max_backoff = reconnect_max_backoff
+
+        self.running = False
+        self._stopped = threading.Event()
+        self._cond = threading.Condition()
+        # Each connection attempt is a generation with its own drain thread;
+        # a thread whose generation is no longer current exits.
+        self._generation = 0
+        self._connected = False
+        self._opened_before = False
+        self._failures = 0
+        self._last_grab = time.monotonic()
+        self._wanted = False
+        self._frame: Optional[np.ndarray] = None
+        self._frame_time = 0.0
+        self._seq = 0
+
+        # Counters
+        self.frames_grabbed = 0
+        self.frames_skipped = 0  # grabbed but never handed off
+        self.frames_delivered = 0
+        self.read_timeouts = 0
+        self.stalls = 0
+        self.reconnects = 0
+        self.open_failures = 0
+        self.staleness_total = 0.0  # seconds from grab to hand-off, summed over delivered frames
+        self.staleness_max = 0.0
+        self.cpu_seconds = 0.0  # drain-thread CPU (grab and decode), summed over connections
+
+    def start(self) -> None:
+        self.running = True
+        with self._cond:
+            self._start_session()
+        threading.Thread(target=self._watchdog, name=f"capture-watchdog-{self.camera_id}", daemon=True).start()
+
+    def stop(self) -> None:
+        self.running = False
+        self._stopped.set()
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+
+    def read(self, timeout: float = 1.0) -> Tuple[bool, Optional[np.ndarray], float]:
+        """Waits for the next frame to arrive and returns ``(True, frame, grab time)``.
+
+        Returns ``(False, None, 0.0)`` if none arrives within ``timeout`` seconds,
+        e.g. while the stream is reconnecting.
+        """
+        with self._cond:
+            seq = self._seq
+            self._wanted = True
+            self._cond.notify_all()
+            if not self._cond.wait_for(lambda: self._seq != seq or not self.running, timeout) \
+                    or self._seq == seq:
+                self._wanted = False
+                self.read_timeouts += 1
+                return False, None, 0.0
+            frame, frame_time, self._frame = self._frame, self._frame_time, None
+            staleness = time.time() - frame_time
+            self.frames_delivered += 1
+            self.staleness_total += staleness
+            self.staleness_max = max(self.staleness_max, staleness)
+            return True, frame, frame_time
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-camera capture counters, as reported by the ingest workers."""
+        with self._cond:
+            return {
+                "grabbed": self.frames_grabbed,
+                "skipped": self.frames_skipped,
+                "delivered": self.frames_delivered,
+                "read_timeouts": self.read_timeouts,
+                "stalls": self.stalls,
+                "reconnects": self.reconnects,
+                "open_failures": self.open_failures,
+                "connected": self._connected,
+                "staleness_mean": self.staleness_total / self.frames_delivered if self.frames_delivered else 0.0,
+                "staleness_max": self.staleness_max,
+                "cpu_seconds": self.cpu_seconds,
+                # Seconds since the stream last produced a frame
+                "frame_age": time.monotonic() - self._last_grab,
+            }
+
+    # Drain thread
+
+    def _start_session(self) -> None:
+        """Starts a drain thread for a new connection. Called with the lock held."""
+        self._generation += 1
+        self._connected = False
+        threading.Thread(target=self._drain, args=(self._generation,),
+                         name=f"capture-{self.camera_id}-{self._generation}", daemon=True).start()
+
+    def _current(self, generation: int) -> bool:
+        return self.running and generation == self._generation
+
+    def _stall(self, generation: int, reason: str) -> None:
+        """Abandons the current connection and reconnects. Called with the lock held."""
+        if not self._current(generation):
+            return
+        self.stalls += 1
+        self._failures += 1
+        logging.warning(f"Camera {self.camera_id}: {reason}; reconnecting")
+        self._start_session()
+
+    def _backoff(self) -> float:
+        if not self._failures:
+            return 0.0
+        return min(self.reconnect_max_backoff, self.reconnect_backoff * 2 ** (self._failures - 1))
+
+    def _open(self, generation: int) -> Optional[Any]:
+        """Opens the stream, retrying with backoff until it opens or the generation ends."""
+        while self._current(generation):
+            delay = self._backoff()
+            if delay and self._stopped.wait(delay):
+                return None
+            if not self._current(generation):
+                return None
+            cap = self.open_capture()
+            if cap is not None:
+                with self._cond:
+                    if self._opened_before:
+                        self.reconnects += 1
+                    self._opened_before = True
+                    self._connected = True
+                    self._last_grab = time.monotonic()
+                return cap
+            with self._cond:
+                self.open_failures += 1
+                self._failures += 1
+            logging.warning(f"Camera {self.camera_id}: could not open the stream; "
+                            f"retrying in {self._backoff():.0f}s")
+        return None
+
+    def _drain(self, generation: int) -> None:
+        cap = self._open(generation)
+        if cap is None:
+            return
+        cpu = time.thread_time()
+        try:
+            interval = 0.0
+            if self.is_file and self.pace_files:
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                interval = 1.0 / fps if fps and fps > 0 else 0.0
+            grabbed = 0
+            next_due = time.monotonic()
+            # An unpaced file has no buffer to fall behind: only decode what is asked for.
+            on_demand = self.is_file and not interval
+            while self._current(generation):
+                if on_demand:
+                    with self._cond:
+                        self._cond.wait_for(lambda: self._wanted or not self._current(generation), 1.0)
+                        if not self._wanted:
+                            self._last_grab = time.monotonic()  # idle, not stalled
+                            continue
+                if interval:
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_due = max(next_due, time.monotonic() - interval) + interval
+                ok = cap.grab()
+                if not self._current(generation):
+                    break
+                if not ok:
+                    if self.is_file and grabbed:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # start the clip over
+                        continue
+                    with self._cond:
+                        if time.monotonic() - self._last_grab > self.stall_seconds:
+                            self._stall(generation, f"no frame for {self.stall_seconds:.0f}s")
+                            break
+                    time.sleep(0.05)
+                    continue
+                grabbed += 1
+                grabbed_at = time.time()
+                now_cpu = time.thread_time()
+                with self._cond:
+                    self.cpu_seconds += now_cpu - cpu
+                    cpu = now_cpu
+                    self.frames_grabbed += 1
+                    self._last_grab = time.monotonic()
+                    self._failures = 0
+                    wanted = self._wanted
+                    if not wanted:
+                        self.frames_skipped += 1
+                if not wanted:
+                    continue
+                ret, frame = cap.retrieve()
+                with self._cond:
+                    if ret and frame is not None:
+                        self._frame, self._frame_time = frame, grabbed_at
+                        self._seq += 1
+                        self._wanted = False
+                        self._cond.notify_all()
+                    else:
+                        self.frames_skipped += 1
+        except Exception as e:
+            logging.exception(f"Camera {self.camera_id}: capture failed: {e}")
+            with self._cond:
+                self._stall(generation, "capture error")
+        finally:
+            cap.release()
+            with self._cond:
+                self.cpu_seconds += time.thread_time() - cpu
+                if generation == self._generation:
+                    self._connected = False
+
+    def _watchdog(self) -> None:
+        """Reconnects streams whose drain thread is stuck inside FFmpeg."""
+        while not self._stopped.wait(self.stall_seconds / 2):
+            with self._cond:
+                if self._connected and time.monotonic() - self._last_grab > self.stall_seconds:
+                    self._stall(self._generation, f"stream stalled for {self.stall_seconds:.0f}s")
@@ -0,0 +1,14 @@
+# camera_stream_service/message_queue.py
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.message_queue_client import MessageQueueClient, get_client
+
+
+def connect() -> MessageQueueClient:
+    """Returns this process's broker client with the stream service's queues declared."""
+    client = get_client()
+    client.declare_queue('video_frames')
+    client.declare_exchange('pipeline_feedback', exchange_type='fanout')
+    return client
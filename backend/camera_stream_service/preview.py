@@ -0,0 +1,112 @@
+# camera_stream_service/preview.py
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+import socketio
+
+import config
+
+
+def preview_room(camera_id: str) -> str:
+    return f"camera:{camera_id}"
+
+
+class _Viewer:
+    def __init__(self):
+        self.in_flight_since: Optional[float] = None
+        self.sent_seq = 0
+
+
+class PreviewHub:
+    """Delivers preview frames only to clients watching a camera.
+
+    Clients join a camera's room with ``watch``. The ingest workers only
+    encode previews for cameras with at least one viewer, and each encoded
+    JPEG is sent as a binary attachment to every viewer. A viewer gets at
+    most one frame in flight: the next frame goes out when the client acks
+    the previous one, so slow clients skip frames instead of queueing them.
+    """
+
+    def __init__(self, sio: socketio.Server, set_preview: Callable[[str, bool], None]):
+        self.sio = sio
+        self.set_preview = set_preview
+        self.viewers: Dict[str, Dict[str, _Viewer]] = {}
+        self.latest: Dict[str, Tuple[int, bytes]] = {}
+        self.sent = 0
+        self.skipped = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def watch(self, sid: str, camera_id: str) -> None:
+        camera_id = str(camera_id)
+        with self._lock:
+            viewers = self.viewers.setdefault(camera_id, {})
+            first = not viewers
+            viewers.setdefault(sid, _Viewer())
+        self.sio.enter_room(sid, preview_room(camera_id))
+        if first:
+            logging.info(f"Camera {camera_id} has viewers; enabling preview")
+            self.set_preview(camera_id, True)
+
+    def unwatch(self, sid: str, camera_id: str) -> None:
+        camera_id = str(camera_id)
+        with self._lock:
+            viewers = self.viewers.get(camera_id, {})
+            if viewers.pop(sid, None) is None:
+                return
+            last = not viewers
+            if last:
+                self.viewers.pop(camera_id, None)
+                self.latest.pop(camera_id, None)
+        self.sio.leave_room(sid, preview_room(camera_id))
+        if last:
+            logging.info(f"Camera {camera_id} has no viewers; disabling preview")
+            self.set_preview(camera_id, False)
+
+    def disconnect(self, sid: str) -> None:
+        with self._lock:
+            watched = [camera_id for camera_id, viewers in self.viewers.items() if sid in viewers]
+        for camera_id in watched:
+            self.unwatch(sid, camera_id)
+
+    def watched_cameras(self) -> Set[str]:
+        with self._lock:
+            return set(self.viewers)
+
+    def publish(self, camera_id: str, jpeg: bytes) -> None:
+        """Takes a new preview frame and sends it to every viewer ready for one."""
+        with self._lock:
+            if camera_id not in self.viewers:
+                return
+            self._seq += 1
+            self.latest[camera_id] = (self._seq, jpeg)
+            sids = list(self.viewers[camera_id])
+        for sid in sids:
+            self._send(sid, camera_id)
+
+    def _send(self, sid: str, camera_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            viewer = self.viewers.get(camera_id, {}).get(sid)
+            latest = self.latest.get(camera_id)
+            if viewer is None or latest is None or latest[0] == viewer.sent_seq:
+                return
+            # Clients that never ack still get a frame per ack timeout.
+            if (viewer.in_flight_since is not None
+                    and now - viewer.in_flight_since < config.PREVIEW_ACK_TIMEOUT):
+                self.skipped += 1
+                return
+            seq, jpeg = latest
+            viewer.in_flight_since = now
+            viewer.sent_seq = seq
+            self.sent += 1
+
+        def on_ack(*args) -> None:
+            with self._lock:
+                viewer.in_flight_since = None
+            self._send(sid, camera_id)
+
+        self.sio.emit('video_feed', {'camera_id': camera_id, 'frame': jpeg},
+                      to=sid, callback=on_ack)
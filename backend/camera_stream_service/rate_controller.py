@@ -0,0 +1,98 @@
+# camera_stream_service/rate_controller.py
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import config
+import message_queue
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.message_queue_client import Consumer
+
+
+class BackpressureController(threading.Thread):
+    """Scales every camera's publish rate with the downstream backlog.
+
+    The controller polls the depth of ``video_frames`` and listens on the
+    ``pipeline_feedback`` fanout exchange, where detection reports how old
+    the frames it processes are. While the backlog or the lag is above its
+    high-water mark the shared rate scale is cut multiplicatively; once both
+    are low again it is raised additively (AIMD). Each camera publishes at
+    ``min_fps + scale * (max_fps - min_fps)`` of its own bounds.
+    """
+
+    def __init__(self, queue: str = 'video_frames'):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.scale = 1.0
+        self.backlog = 0
+        self.lag = 0.0
+        self.last_feedback_time = 0.0
+        self.running = True
+        self.feedback: Optional[Consumer] = None
+        self._lock = threading.Lock()
+
+    def bounds_for(self, camera_id: str) -> Tuple[float, float]:
+        """Returns the (min_fps, max_fps) bounds configured for a camera."""
+        limits = config.RATE_LIMITS.get(str(camera_id), {})
+        return (limits.get("min_fps", config.RATE_MIN_FPS),
+                limits.get("max_fps", config.RATE_MAX_FPS))
+
+    def interval_for(self, camera_id: str) -> float:
+        """Returns the current publish interval in seconds for a camera."""
+        min_fps, max_fps = self.bounds_for(camera_id)
+        with self._lock:
+            fps = min_fps + self.scale * (max_fps - min_fps)
+        return 1.0 / max(fps, 0.1)
+
+    def on_feedback(self, ch, method, properties, body) -> None:
+        try:
+            feedback = json.loads(body)
+            with self._lock:
+                self.lag = float(feedback["lag"])
+                self.last_feedback_time = time.time()
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring malformed pipeline feedback: {e}")
+
+    def adjust(self) -> None:
+        """Applies one AIMD step from the latest backlog and lag readings."""
+        with self._lock:
+            # Lag reports go stale when detection is idle or gone.
+            lag = self.lag if time.time() - self.last_feedback_time < config.RATE_FEEDBACK_TIMEOUT else 0.0
+            previous = self.scale
+            if self.backlog > config.RATE_BACKLOG_HIGH or lag > config.RATE_LAG_HIGH:
+                self.scale = max(0.0, self.scale * config.RATE_DECREASE_FACTOR)
+            elif self.backlog < config.RATE_BACKLOG_LOW and lag < config.RATE_LAG_LOW:
+                self.scale = min(1.0, self.scale + config.RATE_INCREASE_STEP)
+            if abs(self.scale - previous) > 1e-6:
+                logging.info(f"Publish rate scale {previous:.2f} -> {self.scale:.2f} "
+                             f"(backlog {self.backlog}, lag {lag:.2f}s)")
+
+    def run(self) -> None:
+        client = message_queue.connect()
+        self.feedback = client.consumer('', exchange='pipeline_feedback', exclusive=True, auto_ack=True)
+
+        def poll():
+            backlog = client.queue_depth(self.queue)
+            if backlog is not None:
+                self.backlog = backlog
+            self.adjust()
+            self.feedback.call_later(config.RATE_POLL_INTERVAL, poll)
+
+        self.feedback.call_later(config.RATE_POLL_INTERVAL, poll)
+        if self.running:
+            self.feedback.consume(self.on_feedback)
+
+    def stop(self) -> None:
+        """Stops the controller thread."""
+        self.running = False
+        if self.feedback is not None:
+            self.feedback.stop()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"scale": self.scale, "backlog": self.backlog, "lag": self.lag}
@@ -0,0 +1,194 @@
+# camera_stream_service/video_decoder.py
+"""PyAV decoder that skips frames inside the decoder instead of after it.
+
+``cv2.VideoCapture`` decodes and color-converts every frame of a stream,
+and ``CameraThread`` then throttles to its target rate and discards most of
+them. ``VideoDecoder`` cuts that work at three levels:
+
+* ``skip="keyframes"`` asks the codec to decode only keyframes and
+  ``skip="nonref"`` to drop frames nothing else references (B-frames),
+  so those frames are never decoded at all.
+* ``every_nth`` and ``max_fps`` select frames by index and presentation
+  time; frames that are not selected are decoded (later frames reference
+  them) but never scaled, converted or copied into numpy.
+* Selected frames are converted straight to the caller's pixel format and
+  size in one ``sws_scale`` pass.
+
+Decoding uses the codec's frame and/or slice threads. The class mirrors the
+parts of ``cv2.VideoCapture`` that capture uses (``isOpened``, ``read``,
+``grab``/``retrieve``, ``get(CAP_PROP_FPS)``, ``set(CAP_PROP_POS_FRAMES, 0)``,
+``release``), so either can back a camera. Local files work the same way
+as RTSP URLs, which is how ``benchmark.py`` compares the two paths offline.
+"""
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+SKIP_MODES = {"none": "DEFAULT", "nonref": "NONREF", "keyframes": "NONKEY"}
+
+
+class VideoDecoder:
+    """Reads frames from an RTSP URL or a video file with decode-level frame skipping."""
+
+    def __init__(self, source: str, skip: str = "none", every_nth: int = 1, max_fps: float = 0.0,
+                 threads: int = 0, thread_type: str = "AUTO", width: int = 0, height: int = 0,
+                 pixel_format: str = "bgr24", realtime: bool = False, rtsp_transport: str = "tcp",
+                 open_timeout: float = 10.0, read_timeout: float = 5.0):
+        if skip not in SKIP_MODES:
+            raise ValueError(f"Unknown skip mode {skip!r}, expected one of {', '.join(SKIP_MODES)}")
+        self.source = source
+        self.skip = skip
+        self.every_nth = max(1, every_nth)
+        # Settable at any time, e.g. from the camera's current target rate
+        self.max_fps = max_fps
+        self.threads = threads
+        self.thread_type = thread_type
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        # Files are read as fast as possible unless paced to their timestamps
+        self.realtime = realtime
+        self.is_file = os.path.isfile(source)
+        self.rtsp_transport = rtsp_transport
+        self.open_timeout = open_timeout
+        self.read_timeout = read_timeout
+
+        self.container = None
+        self.stream = None
+        self._frames = None
+        self._frame = None  # grabbed, not yet retrieved
+        self._index = 0
+        self._last_selected: Optional[float] = None
+        self._started: Optional[Tuple[float, float]] = None  # (wall clock, stream time) of the first frame
+        self.frames_decoded = 0
+        self.frames_returned = 0
+        self.open()
+
+    def open(self) -> bool:
+        import av
+
+        options: Dict[str, str] = {}
+        if not self.is_file:
+            options = {"rtsp_transport": self.rtsp_transport, "fflags": "nobuffer", "flags": "low_delay"}
+        try:
+            self.container = av.open(self.source, options=options, timeout=(self.open_timeout, self.read_timeout))
+        except (av.error.FFmpegError, OSError) as e:
+            logging.error(f"Could not open {self.source} with PyAV: {e}")
+            self.container = None
+            return False
+
+        self.stream = self.container.streams.video[0]
+        codec = self.stream.codec_context
+        codec.thread_type = self.thread_type
+        codec.thread_count = self.threads
+        codec.skip_frame = SKIP_MODES[self.skip]
+        self._restart()
+        logging.info(f"Opened {self.source} with PyAV ({codec.name} {codec.width}x{codec.height}, "
+                     f"skip {self.skip}, every {self.every_nth}, {self.threads or 'auto'} {self.thread_type} threads)")
+        return True
+
+    def _restart(self) -> None:
+        self._frames = self.container.decode(self.stream)
+        self._index = 0
+        self._last_selected = None
+        self._started = None
+
+    def isOpened(self) -> bool:
+        return self.container is not None
+
+    def _selected(self, frame) -> bool:
+        self._index += 1
+        if (self._index - 1) % self.every_nth:
+            return False
+        if self.max_fps > 0 and frame.time is not None:
+            # A little slack so a 20 fps target keeps every frame of a 20 fps stream
+            if self._last_selected is not None and frame.time - self._last_selected < 0.9 / self.max_fps:
+                return False
+            self._last_selected = frame.time
+        return True
+
+    def _pace(self, frame) -> None:
+        if frame.time is None:
+            return
+        if self._started is None:
+            self._started = (time.monotonic(), frame.time)
+            return
+        delay = (frame.time - self._started[1]) - (time.monotonic() - self._started[0])
+        if delay > 0:
+            time.sleep(delay)
+
+    def grab(self) -> bool:
+        """Decodes up to the next selected frame without converting it; False at the end or on errors."""
+        self._frame = None
+        if self._frames is None:
+            return False
+        import av
+
+        try:
+            for frame in self._frames:
+                self.frames_decoded += 1
+                if not self._selected(frame):
+                    continue
+                if self.realtime and self.is_file:
+                    self._pace(frame)
+                self._frame = frame
+                return True
+        except (av.error.FFmpegError, OSError) as e:
+            logging.error(f"PyAV decode error on {self.source}: {e}")
+        return False
+
+    def retrieve(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """Converts the grabbed frame to the output format and size."""
+        frame, self._frame = self._frame, None
+        if frame is None:
+            return False, None
+        if self.width or self.height:
+            width, height = self._output_size(frame.width, frame.height)
+            array = frame.reformat(width=width, height=height, format=self.pixel_format).to_ndarray()
+        else:
+            array = frame.to_ndarray(format=self.pixel_format)
+        self.frames_returned += 1
+        return True, array
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """Returns the next selected frame as ``(True, array)``, or ``(False, None)`` at the end or on errors."""
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def _output_size(self, width: int, height: int) -> Tuple[int, int]:
+        """Fills in a missing output dimension from the source aspect ratio (kept even for YUV formats)."""
+        if self.width and self.height:
+            return self.width, self.height
+        if self.width:
+            return self.width, max(2, round(height * self.width / width / 2) * 2)
+        return max(2, round(width * self.height / height / 2) * 2), self.height
+
+    def get(self, prop_id: int) -> float:
+        """Supports ``CAP_PROP_FPS``, the stream's average frame rate (0 when unknown)."""
+        if prop_id != cv2.CAP_PROP_FPS or self.stream is None or not self.stream.average_rate:
+            return 0.0
+        return float(self.stream.average_rate)
+
+    def set(self, prop_id: int, value: float) -> bool:
+        """Supports rewinding files with ``CAP_PROP_POS_FRAMES`` 0, as CameraThread does at the end of a clip."""
+        if prop_id != cv2.CAP_PROP_POS_FRAMES or value != 0 or self.container is None:
+            return False
+        self.container.seek(0)
+        self._restart()
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {"decoded": self.frames_decoded, "returned": self.frames_returned}
+
+    def release(self) -> None:
+        if self.container is not None:
+            self.container.close()
+        self.container = None
+        self.stream = None
+        self._frames = None
+        self._frame = None
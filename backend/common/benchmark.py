@@ -0,0 +1,77 @@
+# common/benchmark.py
+"""Compares the binary message envelope with the previous JSON messages.
+
+Reports encode and decode time and message size for frame references,
+detections, OCR results and inline frames.
+
+Usage: python benchmark.py [--iterations 20000] [--detections 10]
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.models import (decode, decode_detections, decode_image, decode_results, detections_message, frame_ref,
+                           image_message, results_message)
+
+
+def timed(function, iterations: int) -> float:
+    """Returns microseconds per call."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return 1e6 * (time.perf_counter() - start) / iterations
+
+
+def compare(name: str, iterations: int, json_encode, json_decode, envelope_encode, envelope_decode) -> None:
+    json_body, envelope_body = json_encode(), envelope_encode()
+    print(f"{name:<12} json {len(json_body):>9} B  enc {timed(json_encode, iterations):8.2f} us  "
+          f"dec {timed(lambda: json_decode(json_body), iterations):8.2f} us")
+    print(f"{'':<12} env  {len(envelope_body):>9} B  enc {timed(envelope_encode, iterations):8.2f} us  "
+          f"dec {timed(lambda: envelope_decode(envelope_body), iterations):8.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--detections", type=int, default=10, help="detections per frame")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    camera_id, frame_seq, ts = "3", 1760000000123, time.time()
+    ref = {"camera_id": camera_id, "frame_seq": frame_seq, "ts": ts}
+    detections = [{"box": [int(v) for v in rng.integers(0, 1000, 4)], "confidence": float(rng.random()),
+                   "class": int(rng.integers(0, 4))} for _ in range(args.detections)]
+    results = [{"camera_id": camera_id, "track_id": i, "frame_seq": frame_seq, "box": d["box"],
+                "confidence": d["confidence"], "class": d["class"], "text": "MSCU1234565", "reads": ["MSCU1234565"],
+                "first_seen": ts - 2, "last_seen": ts, "frames": 12} for i, d in enumerate(detections)]
+    header = decode(frame_ref(camera_id, frame_seq, ts))
+    frame = rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+
+    compare("frame ref", args.iterations,
+            lambda: json.dumps(ref).encode(), json.loads,
+            lambda: frame_ref(camera_id, frame_seq, ts, args.width, args.height), decode)
+    compare("detections", args.iterations,
+            lambda: json.dumps(dict(ref, detections=detections)).encode(), json.loads,
+            lambda: detections_message(header, detections),
+            lambda body: decode_detections(decode(body)))
+    compare("ocr results", args.iterations,
+            lambda: json.dumps(results).encode(), json.loads,
+            lambda: results_message(camera_id, frame_seq, ts, results),
+            lambda body: decode_results(decode(body)))
+    compare("raw frame", max(1, args.iterations // 1000),
+            lambda: json.dumps(dict(ref, image=base64.b64encode(frame.tobytes()).decode())).encode(),
+            lambda body: np.frombuffer(base64.b64decode(json.loads(body)["image"]), np.uint8),
+            lambda: image_message(camera_id, frame_seq, ts, frame),
+            lambda body: decode_image(decode(body)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# common/detection_zones.py
+"""Per-camera detection zones: the parts of the frame where containers appear.
+
+A camera's zones are stored with its record in the ``cameras`` table as a
+JSON list. Each zone is a rectangle or a polygon in fractions of the frame
+size, so zones stay valid when a camera's resolution changes:
+
+    [{"rect": [0.1, 0.4, 0.9, 1.0]},
+     {"polygon": [[0.0, 0.5], [0.6, 0.3], [0.7, 0.9], [0.0, 1.0]]}]
+
+The stream service crops every frame to the bounding box of all zones
+before publishing it, so detection and OCR only see those pixels. The
+offset and scale of the crop travel in the message envelope
+(``models.to_full_frame``), so published boxes stay in full-frame pixels.
+"""
+import math
+from typing import Any, List, Optional, Sequence, Tuple
+
+Zone = List[Tuple[float, float]]  # polygon vertices, fractions of the frame
+
+
+def parse_zones(value: Any) -> List[Zone]:
+    """Validates a camera's ``detection_zones`` value; raises ValueError if it is malformed.
+
+    Returns each zone as its polygon (rectangles as four corners); no zones
+    (None or an empty list) means the whole frame.
+    """
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError("detection_zones must be a list of zones")
+    zones = []
+    for zone in value:
+        if not isinstance(zone, dict) or len(zone) != 1 or not ({"rect", "polygon"} & zone.keys()):
+            raise ValueError(f"zone {zone!r} must be {{\"rect\": [x1, y1, x2, y2]}} or "
+                             f"{{\"polygon\": [[x, y], ...]}}")
+        if "rect" in zone:
+            x1, y1, x2, y2 = _coordinates(zone["rect"], 4)
+            if x2 <= x1 or y2 <= y1:
+                raise ValueError(f"rect {zone['rect']!r} is empty")
+            zones.append([(x1, y1), (x2, y1), (x2, y2), (x1, y2)])
+        else:
+            points = zone["polygon"]
+            if not isinstance(points, list) or len(points) < 3:
+                raise ValueError("a polygon needs at least three points")
+            zones.append([tuple(_coordinates(point, 2)) for point in points])
+    return zones
+
+
+def _coordinates(values: Any, count: int) -> List[float]:
+    if not isinstance(values, (list, tuple)) or len(values) != count:
+        raise ValueError(f"expected {count} coordinates, got {values!r}")
+    try:
+        coordinates = [float(v) for v in values]
+    except (TypeError, ValueError):
+        raise ValueError(f"coordinates must be numbers, got {values!r}")
+    if not all(0.0 <= v <= 1.0 for v in coordinates):
+        raise ValueError(f"coordinates are fractions of the frame between 0 and 1, got {values!r}")
+    return coordinates
+
+
+def crop_box(zones: Sequence[Zone], width: int, height: int) -> Optional[Tuple[int, int, int, int]]:
+    """Pixel bounds ``(x1, y1, x2, y2)`` covering every zone of a frame, or None for the whole frame."""
+    if not zones:
+        return None
+    xs = [x for zone in zones for x, _ in zone]
+    ys = [y for zone in zones for _, y in zone]
+    x1, y1 = math.floor(min(xs) * width), math.floor(min(ys) * height)
+    x2, y2 = min(width, math.ceil(max(xs) * width)), min(height, math.ceil(max(ys) * height))
+    if (x1, y1, x2, y2) == (0, 0, width, height) or x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return x1, y1, x2, y2
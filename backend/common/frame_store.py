@@ -0,0 +1,269 @@
+# common/frame_store.py
+"""Per-host shared-memory ring buffer of decoded frames.
+
+The capture thread writes each decoded frame once into a ring owned by its
+camera. Messages on RabbitMQ only carry a ``(camera_id, frame_seq)``
+reference, and detection and OCR read the exact same pixels back zero-copy.
+
+When every stage runs in one process (the embedded pipeline),
+``LocalFrameStore`` and ``LocalFrameStoreReader`` offer the same interface
+over a ring of references to the captured arrays, so frames are not even
+copied once.
+"""
+import logging
+import re
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_MAGIC = 0x4F435246  # "OCRF"
+_STORE_HEADER = struct.Struct('<IIQQ')  # magic, slots, slot_bytes, latest_seq
+_SLOT_HEADER = struct.Struct('<QdIII')  # seq, capture ts, height, width, channels
+_STORE_HEADER_SIZE = 64
+_SLOT_HEADER_SIZE = 64
+_LATEST_SEQ_OFFSET = 16
+
+DEFAULT_SLOTS = 32
+
+# Segments created by writers in this process
+_owned_segments = set()
+
+
+def store_name(camera_id: str) -> str:
+    """Returns the shared-memory segment name used for a camera."""
+    return "ocrp_frames_" + re.sub(r'[^A-Za-z0-9_]', '_', str(camera_id))
+
+
+def _slot_offset(slots: int, slot_bytes: int, frame_seq: int) -> int:
+    return _STORE_HEADER_SIZE + (frame_seq % slots) * (_SLOT_HEADER_SIZE + slot_bytes)
+
+
+class FrameStore:
+    """Writer side of a camera's frame ring. Only one writer per camera."""
+
+    def __init__(self, camera_id: str, slots: int = DEFAULT_SLOTS):
+        self.camera_id = str(camera_id)
+        self.slots = slots
+        self.slot_bytes = 0
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        # Start from wall-clock milliseconds so sequence numbers keep growing
+        # across restarts and stale references never match a new frame.
+        self._seq = int(time.time() * 1000)
+
+    def _create(self, slot_bytes: int) -> None:
+        name = store_name(self.camera_id)
+        size = _STORE_HEADER_SIZE + self.slots * (_SLOT_HEADER_SIZE + slot_bytes)
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            logging.warning(f"Removed stale frame store {name}")
+        except FileNotFoundError:
+            pass
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _owned_segments.add(name)
+        self.slot_bytes = slot_bytes
+        _STORE_HEADER.pack_into(self._shm.buf, 0, _MAGIC, self.slots, slot_bytes, 0)
+        logging.info(f"Created frame store {name}: {self.slots} slots x {slot_bytes} bytes")
+
+    def put(self, frame: np.ndarray, ts: Optional[float] = None) -> int:
+        """Copies a frame into the ring and returns its sequence number."""
+        if frame.dtype != np.uint8:
+            raise ValueError(f"Frame store only holds uint8 frames, got {frame.dtype}")
+        if self._shm is None:
+            self._create(frame.nbytes)
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(
+                f"Frame of {frame.nbytes} bytes does not fit frame store slot of {self.slot_bytes} bytes")
+
+        self._seq += 1
+        seq = self._seq
+        buf = self._shm.buf
+        offset = _slot_offset(self.slots, self.slot_bytes, seq)
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 0
+
+        # Invalidate the slot first so readers never see half-written pixels.
+        struct.pack_into('<Q', buf, offset, 0)
+        np.ndarray(frame.shape, np.uint8, buffer=buf, offset=offset + _SLOT_HEADER_SIZE)[...] = frame
+        _SLOT_HEADER.pack_into(buf, offset, 0, time.time() if ts is None else ts, height, width, channels)
+        struct.pack_into('<Q', buf, offset, seq)
+        struct.pack_into('<Q', buf, _LATEST_SEQ_OFFSET, seq)
+        return seq
+
+    def close(self) -> None:
+        """Releases and removes the shared-memory segment."""
+        if self._shm is None:
+            return
+        _owned_segments.discard(self._shm.name)
+        try:
+            self._shm.close()
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+        self._shm = None
+
+
+class FrameStoreReader:
+    """Reader side: attaches lazily to each camera's ring and reads frames by reference."""
+
+    def __init__(self):
+        self._stores: Dict[str, shared_memory.SharedMemory] = {}
+
+    def _attach(self, camera_id: str) -> Optional[shared_memory.SharedMemory]:
+        name = store_name(camera_id)
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return None
+        # Attaching registers the segment with this process's resource tracker,
+        # which would unlink it on exit; ownership stays with the writer.
+        if name not in _owned_segments:
+            try:
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        magic = _STORE_HEADER.unpack_from(shm.buf, 0)[0]
+        if magic != _MAGIC:
+            logging.error(f"Shared memory segment {name} is not a frame store")
+            shm.close()
+            return None
+        self._stores[str(camera_id)] = shm
+        return shm
+
+    def _detach(self, camera_id: str) -> None:
+        shm = self._stores.pop(str(camera_id), None)
+        if shm is not None:
+            try:
+                shm.close()
+            except BufferError:
+                # Zero-copy views are still alive; the mapping goes away with them.
+                pass
+
+    def _lookup(self, shm: shared_memory.SharedMemory, frame_seq: int) -> Optional[np.ndarray]:
+        _, slots, slot_bytes, _ = _STORE_HEADER.unpack_from(shm.buf, 0)
+        offset = _slot_offset(slots, slot_bytes, frame_seq)
+        seq, _, height, width, channels = _SLOT_HEADER.unpack_from(shm.buf, offset)
+        if seq != frame_seq:
+            return None
+        shape = (height, width, channels) if channels else (height, width)
+        return np.ndarray(shape, np.uint8, buffer=shm.buf, offset=offset + _SLOT_HEADER_SIZE)
+
+    def get(self, camera_id: str, frame_seq: int, copy: bool = False) -> Optional[np.ndarray]:
+        """Returns the frame for a reference, or None if it was overwritten.
+
+        Without ``copy`` the array is a view into shared memory; call
+        ``is_current`` after using it to make sure the slot was not reused.
+        """
+        camera_id = str(camera_id)
+        shm = self._stores.get(camera_id) or self._attach(camera_id)
+        if shm is None:
+            return None
+        frame = self._lookup(shm, frame_seq)
+        if frame is None:
+            if frame_seq <= struct.unpack_from('<Q', shm.buf, _LATEST_SEQ_OFFSET)[0]:
+                return None
+            # A reference newer than anything in this mapping means the writer
+            # was restarted with a fresh segment.
+            self._detach(camera_id)
+            shm = self._attach(camera_id)
+            if shm is None:
+                return None
+            frame = self._lookup(shm, frame_seq)
+            if frame is None:
+                return None
+        if copy:
+            frame = frame.copy()
+            if not self.is_current(camera_id, frame_seq):
+                return None
+        return frame
+
+    def is_current(self, camera_id: str, frame_seq: int) -> bool:
+        """Checks that the slot for a reference still holds that frame."""
+        shm = self._stores.get(str(camera_id))
+        if shm is None:
+            return False
+        _, slots, slot_bytes, _ = _STORE_HEADER.unpack_from(shm.buf, 0)
+        return struct.unpack_from('<Q', shm.buf, _slot_offset(slots, slot_bytes, frame_seq))[0] == frame_seq
+
+    def latest_seq(self, camera_id: str) -> Optional[int]:
+        """Returns the most recently written sequence number for a camera."""
+        camera_id = str(camera_id)
+        shm = self._stores.get(camera_id) or self._attach(camera_id)
+        if shm is None:
+            return None
+        return struct.unpack_from('<Q', shm.buf, _LATEST_SEQ_OFFSET)[0] or None
+
+    def close(self) -> None:
+        """Detaches from every store."""
+        for camera_id in list(self._stores):
+            self._detach(camera_id)
+
+
+class _LocalRing:
+    def __init__(self, slots: int):
+        self.slots: List[Optional[Tuple[int, np.ndarray]]] = [None] * slots
+        self.latest_seq = 0
+
+
+# Rings of the LocalFrameStores in this process, by camera id
+_local_rings: Dict[str, _LocalRing] = {}
+
+
+class LocalFrameStore:
+    """In-process writer: keeps a reference to each frame instead of copying it.
+
+    Frames must not be modified after ``put``; the capture loop hands over
+    the array returned by each read and never writes to it again.
+    """
+
+    def __init__(self, camera_id: str, slots: int = DEFAULT_SLOTS, release_delay: float = 5.0):
+        self.camera_id = str(camera_id)
+        self.slots = slots
+        self.release_delay = release_delay
+        self._seq = int(time.time() * 1000)
+        self._ring = _local_rings[self.camera_id] = _LocalRing(slots)
+
+    def put(self, frame: np.ndarray, ts: Optional[float] = None) -> int:
+        self._seq += 1
+        self._ring.slots[self._seq % self.slots] = (self._seq, frame)
+        self._ring.latest_seq = self._seq
+        return self._seq
+
+    def close(self) -> None:
+        """Releases the ring after ``release_delay``, so frames still queued downstream can be read."""
+        timer = threading.Timer(self.release_delay, self._release)
+        timer.daemon = True
+        timer.start()
+
+    def _release(self) -> None:
+        if _local_rings.get(self.camera_id) is self._ring:
+            del _local_rings[self.camera_id]
+
+
+class LocalFrameStoreReader:
+    """Reader side of ``LocalFrameStore``, with the interface of ``FrameStoreReader``."""
+
+    def get(self, camera_id: str, frame_seq: int, copy: bool = False) -> Optional[np.ndarray]:
+        ring = _local_rings.get(str(camera_id))
+        entry = ring.slots[frame_seq % len(ring.slots)] if ring is not None else None
+        if entry is None or entry[0] != frame_seq:
+            return None
+        return entry[1].copy() if copy else entry[1]
+
+    def is_current(self, camera_id: str, frame_seq: int) -> bool:
+        # A slot only drops its reference; frames already handed out stay valid.
+        return True
+
+    def latest_seq(self, camera_id: str) -> Optional[int]:
+        ring = _local_rings.get(str(camera_id))
+        if ring is None:
+            return None
+        return ring.latest_seq or None
+
+    def close(self) -> None:
+        pass
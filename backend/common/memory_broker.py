@@ -0,0 +1,221 @@
+# common/memory_broker.py
+"""In-process stand-in for the shared RabbitMQ client.
+
+``MemoryBroker`` implements the surface of ``MessageQueueClient`` that the
+services use: declaring queues and fanout exchanges, consumers with
+prefetch, acks and nacks, per-message TTL from ``properties.expiration``,
+``queue_depth`` and non-blocking ``publish``. Install it with
+``message_queue_client.set_client`` and every service's
+``message_queue.connect()`` returns it, so the stages run unchanged in one
+process without a broker. Messages are never copied or serialized again;
+bodies are handed to consumers as published.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import pika.spec
+
+from common.message_queue_client import DEFAULT_PREFETCH, Consumer
+
+# (body, properties, enqueue time, routing key)
+Message = Tuple[Any, Any, float, str]
+
+
+class MemoryConsumer(Consumer):
+    """A ``Consumer`` whose deliveries come from a ``MemoryBroker`` queue."""
+
+    def __init__(self, broker: "MemoryBroker", queue: str, prefetch: int,
+                 exchange: Optional[str] = None, exclusive: bool = False, auto_ack: bool = False):
+        super().__init__(broker, queue, prefetch, exchange, exclusive, auto_ack)
+        self._generation = 0
+        self._delivery_tags = itertools.count(1)
+        # Delivered and not yet settled, by delivery tag
+        self._unacked: "OrderedDict[int, Message]" = OrderedDict()
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False) -> None:
+        self.client._settle(self, delivery_tag, multiple, requeue=None)
+
+    def basic_nack(self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True) -> None:
+        self.client._settle(self, delivery_tag, multiple, requeue=requeue)
+
+
+class MemoryBroker:
+    """Bounded-prefetch queues and fanout exchanges held in this process."""
+
+    def __init__(self, max_queue_length: int = 0):
+        # 0 means unbounded, like a RabbitMQ queue without a length limit
+        self.max_queue_length = max_queue_length
+        self.ready = threading.Event()
+        self.ready.set()
+        self._lock = threading.Condition()
+        self._queues: Dict[str, Deque[Message]] = {}
+        self._consumers: Dict[str, List[MemoryConsumer]] = {}
+        self._bindings: Dict[str, List[str]] = {}
+        self._anonymous = itertools.count(1)
+        self.published = 0
+        self.delivered = 0
+        self.acked = 0
+        self.expired = 0
+        self.dropped = 0
+        # Deliveries acked (or auto-acked) per queue
+        self.consumed: Dict[str, int] = {}
+
+    # Topology
+
+    def declare_queue(self, queue: str, **options) -> None:
+        with self._lock:
+            self._queues.setdefault(queue, deque())
+            self._consumers.setdefault(queue, [])
+
+    def declare_exchange(self, exchange: str, exchange_type: str = "direct", **options) -> None:
+        if exchange_type != "fanout":
+            raise ValueError(f"Only fanout exchanges are supported in memory, got {exchange_type!r}")
+        with self._lock:
+            self._bindings.setdefault(exchange, [])
+
+    def consumer(self, queue: str, prefetch: int = DEFAULT_PREFETCH, exchange: Optional[str] = None,
+                 exclusive: bool = False, auto_ack: bool = False) -> MemoryConsumer:
+        return MemoryConsumer(self, queue, prefetch, exchange, exclusive, auto_ack)
+
+    def start_consumer(self, consumer: MemoryConsumer) -> None:
+        with self._lock:
+            if consumer.exchange is not None:
+                # Fanout subscriptions get their own queue, like a server-named one.
+                queue = consumer.queue or f"amq.gen-{next(self._anonymous)}"
+                consumer.queue = queue
+                self._bindings.setdefault(consumer.exchange, []).append(queue)
+            self._queues.setdefault(consumer.queue, deque())
+            consumers = self._consumers.setdefault(consumer.queue, [])
+            if consumer not in consumers:
+                consumers.append(consumer)
+            self._dispatch(consumer.queue)
+        logging.debug(f"Consuming from {consumer.queue} in memory (prefetch {consumer.prefetch})")
+
+    def queue_depth(self, queue: str, timeout: float = 5.0) -> Optional[int]:
+        with self._lock:
+            messages = self._queues.get(queue)
+            return None if messages is None else len(messages)
+
+    # Publishing
+
+    def publish(self, exchange: str, routing_key: str, body, properties=None,
+                block: bool = True, timeout: Optional[float] = None) -> bool:
+        """Routes a message to its queue or, for a fanout exchange, to every bound queue.
+
+        Unroutable messages are discarded, as RabbitMQ does. With a queue
+        length limit, ``block=False`` drops the message when the queue is
+        full and ``block=True`` waits for room.
+        """
+        message = (body, properties, time.monotonic(), routing_key)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            queues = self._bindings.get(exchange, []) if exchange else [routing_key]
+            for queue in queues:
+                messages = self._queues.get(queue)
+                if messages is None:
+                    continue
+                while self.max_queue_length and len(messages) >= self.max_queue_length:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if not block or (remaining is not None and remaining <= 0):
+                        self.dropped += 1
+                        return False
+                    self._lock.wait(remaining)
+                messages.append(message)
+                self.published += 1
+                self._dispatch(queue)
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        return True
+
+    def wait_idle(self, timeout: float = 30.0, queues: Optional[List[str]] = None) -> bool:
+        """Waits until the given queues (default all) are empty and every delivery is settled."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while not self._idle(queues):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._lock.wait(min(remaining, 0.1))
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "published": self.published, "delivered": self.delivered, "acked": self.acked,
+                "expired": self.expired, "dropped": self.dropped, "consumed": dict(self.consumed),
+                "queues": {queue: len(messages) for queue, messages in self._queues.items()},
+                "unacked": {queue: sum(len(c._unacked) for c in consumers)
+                            for queue, consumers in self._consumers.items()},
+            }
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            consumers = [c for queue_consumers in self._consumers.values() for c in queue_consumers]
+        for consumer in consumers:
+            consumer.stop()
+
+    def call_threadsafe(self, callback) -> bool:
+        callback()
+        return True
+
+    # Delivery, under the lock
+
+    def _idle(self, queues: Optional[List[str]]) -> bool:
+        names = self._queues if queues is None else queues
+        return all(not self._queues.get(queue) and
+                   not any(c._unacked for c in self._consumers.get(queue, ())) for queue in names)
+
+    def _dispatch(self, queue: str) -> None:
+        """Hands ready messages to consumers with prefetch credit, round-robin."""
+        messages = self._queues[queue]
+        consumers = [c for c in self._consumers.get(queue, ()) if c._consuming]
+        while messages and consumers:
+            delivered = False
+            for consumer in consumers:
+                if not messages:
+                    break
+                if not consumer.auto_ack and consumer.prefetch and len(consumer._unacked) >= consumer.prefetch:
+                    continue
+                message = messages.popleft()
+                body, properties, enqueued, routing_key = message
+                expiration = getattr(properties, "expiration", None)
+                if expiration is not None and time.monotonic() - enqueued > int(expiration) / 1000.0:
+                    self.expired += 1
+                    delivered = True
+                    continue
+                tag = next(consumer._delivery_tags)
+                if consumer.auto_ack:
+                    self.consumed[queue] = self.consumed.get(queue, 0) + 1
+                else:
+                    consumer._unacked[tag] = message
+                self.delivered += 1
+                method = pika.spec.Basic.Deliver(consumer_tag=queue, delivery_tag=tag, exchange="",
+                                                 routing_key=routing_key)
+                consumer._deliveries.put((consumer._generation, method, properties, body))
+                delivered = True
+            if not delivered:
+                break
+        self._lock.notify_all()
+
+    def _settle(self, consumer: MemoryConsumer, delivery_tag: int, multiple: bool,
+                requeue: Optional[bool]) -> None:
+        """Acks (``requeue=None``) or nacks deliveries and refills the consumer's prefetch."""
+        with self._lock:
+            if multiple:
+                settled = []
+                while consumer._unacked and next(iter(consumer._unacked)) <= delivery_tag:
+                    settled.append(consumer._unacked.popitem(last=False)[1])
+            else:
+                message = consumer._unacked.pop(delivery_tag, None)
+                settled = [] if message is None else [message]
+            if requeue is None:
+                self.acked += len(settled)
+                self.consumed[consumer.queue] = self.consumed.get(consumer.queue, 0) + len(settled)
+            elif requeue:
+                self._queues[consumer.queue].extendleft(reversed(settled))
+            self._dispatch(consumer.queue)
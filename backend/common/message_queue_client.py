@@ -0,0 +1,543 @@
+# common/message_queue_client.py
+"""Shared RabbitMQ client: one connection per process, used from any thread.
+
+The connection is a ``pika.SelectConnection`` driven by a dedicated I/O
+thread. No other thread touches pika objects directly:
+
+* ``publish`` only appends to a bounded outbox and wakes the I/O thread,
+  which publishes in batches on a confirm-mode channel and tracks broker
+  confirms asynchronously (acks usually arrive with ``multiple=True``), so
+  capture loops never wait on the network.
+* Each ``Consumer`` has its own channel and prefetch. Its deliveries are
+  dispatched on whichever thread calls ``Consumer.consume``, together with
+  the timers scheduled through ``call_later``; acks are handed back to the
+  I/O thread.
+* Lost connections are re-established with exponential backoff. Declared
+  queues, exchanges and bindings are replayed, consumers are restarted and
+  publishes that were never confirmed are sent again (at-least-once). A
+  message the broker nacks is sent again up to ``MAX_NACK_RESENDS`` times,
+  then dropped and counted.
+"""
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from queue import Empty, Full, Queue
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pika
+import pika.spec
+
+DEFAULT_HOST = os.environ.get("RABBITMQ_HOST", "localhost")
+DEFAULT_PREFETCH = 100
+OUTBOX_SIZE = 10000  # messages waiting for the I/O thread
+MAX_UNCONFIRMED = 1000  # published messages awaiting a broker confirm
+PUBLISH_BATCH = 500  # messages published per I/O loop turn
+MAX_NACK_RESENDS = 3  # times a message nacked by the broker is sent again
+RETRY_BACKOFF_SECONDS = 1.0
+RETRY_MAX_BACKOFF_SECONDS = 30.0
+STATS_INTERVAL_SECONDS = 60.0
+
+# (exchange, routing_key, body, properties, enqueue time, times nacked)
+Message = Tuple[str, str, bytes, Optional[pika.BasicProperties], float, int]
+# Runs on the I/O thread; calls the given function once it has completed.
+Operation = Callable[[Callable[[], None]], None]
+
+
+class Consumer:
+    """One queue subscription with its own channel, prefetch and dispatch thread.
+
+    ``consume`` runs the dispatch loop in the calling thread and passes the
+    consumer itself as the ``ch`` argument of the callback, so handlers can
+    keep calling ``ch.basic_ack`` and ``ch.basic_publish``. ``call_later``
+    and ``remove_timeout`` mirror pika's connection timers; the timers run
+    on the dispatch thread between deliveries.
+    """
+
+    def __init__(self, client: "MessageQueueClient", queue: str, prefetch: int,
+                 exchange: Optional[str] = None, exclusive: bool = False, auto_ack: bool = False):
+        self.client = client
+        self.queue = queue
+        self.prefetch = prefetch
+        self.exchange = exchange
+        self.exclusive = exclusive
+        self.auto_ack = auto_ack
+        self._deliveries: Queue = Queue()
+        self._timers: List[list] = []
+        self._timer_seq = itertools.count()
+        self._timer_lock = threading.Lock()
+        self._consuming = False
+        # Connection generation the channel belongs to (I/O thread) and of
+        # the delivery being handled (dispatch thread). Delivery tags are
+        # only meaningful on the channel that issued them.
+        self._channel = None
+        self._generation = -1
+        self._dispatch_generation = -1
+
+    def consume(self, callback: Callable[[Any, Any, Any, bytes], None]) -> None:
+        """Dispatches deliveries and timers in the calling thread until ``stop``."""
+        self._consuming = True
+        self.client.start_consumer(self)
+        while self._consuming:
+            timeout = self._run_due_timers()
+            try:
+                item = self._deliveries.get(timeout=timeout)
+            except Empty:
+                continue
+            if item is None:
+                continue
+            generation, method, properties, body = item
+            if generation != self._generation:
+                continue  # the broker redelivers it on the new channel
+            self._dispatch_generation = generation
+            callback(self, method, properties, body)
+
+    def stop(self) -> None:
+        """Ends the dispatch loop; safe to call from any thread."""
+        self._consuming = False
+        self._deliveries.put(None)
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> list:
+        """Schedules ``callback`` on the dispatch thread; returns a handle for ``remove_timeout``."""
+        timer = [time.monotonic() + delay, next(self._timer_seq), callback]
+        with self._timer_lock:
+            heapq.heappush(self._timers, timer)
+        self._deliveries.put(None)
+        return timer
+
+    def remove_timeout(self, timer: list) -> None:
+        timer[2] = None
+
+    def _run_due_timers(self) -> float:
+        """Runs expired timers and returns the time until the next one."""
+        while True:
+            with self._timer_lock:
+                if not self._timers:
+                    return 1.0
+                wait = self._timers[0][0] - time.monotonic()
+                if wait > 0:
+                    return min(wait, 1.0)
+                callback = heapq.heappop(self._timers)[2]
+            if callback is not None:
+                callback()
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False) -> None:
+        generation = self._dispatch_generation
+        self.client.call_threadsafe(lambda: self._settle(
+            generation, lambda ch: ch.basic_ack(delivery_tag=delivery_tag, multiple=multiple)))
+
+    def basic_nack(self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True) -> None:
+        generation = self._dispatch_generation
+        self.client.call_threadsafe(lambda: self._settle(
+            generation, lambda ch: ch.basic_nack(delivery_tag=delivery_tag, multiple=multiple, requeue=requeue)))
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties=None) -> None:
+        self.client.publish(exchange, routing_key, body, properties)
+
+    def _settle(self, generation: int, settle: Callable[[Any], None]) -> None:
+        # Deliveries from a previous connection were requeued by the broker.
+        if generation == self._generation and self._channel is not None and self._channel.is_open:
+            settle(self._channel)
+
+    def _start(self, generation: int, done: Callable[[], None]) -> None:
+        """Opens the channel, sets prefetch and starts consuming (I/O thread)."""
+        if self._generation == generation:
+            done()
+            return
+
+        def on_channel(channel):
+            self._channel = channel
+            channel.add_on_close_callback(self.client._on_channel_closed)
+            channel.basic_qos(prefetch_count=self.prefetch, callback=lambda _: declare(channel))
+
+        def declare(channel):
+            if self.exchange is None:
+                subscribe(channel, self.queue)
+            else:
+                # Fanout subscriptions get their own server-named queue per connection.
+                channel.queue_declare(queue=self.queue, exclusive=self.exclusive,
+                                      callback=lambda frame: bind(channel, frame.method.queue))
+
+        def bind(channel, queue):
+            channel.queue_bind(queue=queue, exchange=self.exchange, callback=lambda _: subscribe(channel, queue))
+
+        def subscribe(channel, queue):
+            self._generation = generation
+            channel.basic_consume(
+                queue=queue, auto_ack=self.auto_ack,
+                on_message_callback=lambda ch, method, properties, body: self._deliveries.put(
+                    (generation, method, properties, body)))
+            logging.info(f"Consuming from {queue} (prefetch {self.prefetch})")
+            done()
+
+        self.client._connection.channel(on_open_callback=on_channel)
+
+
+class MessageQueueClient:
+    """Process-wide RabbitMQ connection shared by every thread; see the module docstring."""
+
+    def __init__(self, host: str = DEFAULT_HOST, outbox_size: int = OUTBOX_SIZE,
+                 max_unconfirmed: int = MAX_UNCONFIRMED, publish_batch: int = PUBLISH_BATCH,
+                 retry_backoff: float = RETRY_BACKOFF_SECONDS,
+                 max_retry_backoff: float = RETRY_MAX_BACKOFF_SECONDS,
+                 stats_interval: float = STATS_INTERVAL_SECONDS):
+        self.parameters = pika.ConnectionParameters(host)
+        self.max_unconfirmed = max_unconfirmed
+        self.publish_batch = publish_batch
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.stats_interval = stats_interval
+        self.ready = threading.Event()
+
+        self._outbox: Queue = Queue(maxsize=outbox_size)
+        self._lock = threading.Lock()
+        self._drain_scheduled = False
+        self._topology: List[Operation] = []
+        self._consumers: List[Consumer] = []
+        self._running = True
+        self._stopped = threading.Event()
+
+        # Owned by the I/O thread
+        self._connection: Optional[pika.SelectConnection] = None
+        self._channel = None
+        self._generation = 0
+        self._delivery_tag = 0
+        self._unconfirmed: "OrderedDict[int, Message]" = OrderedDict()
+        self._resend: deque = deque()
+        self._operations: deque = deque()
+        self._operation_running = False
+
+        self.published = 0
+        self.confirmed = 0
+        self.nacked = 0
+        self.dropped = 0
+        self.nack_dropped = 0  # given up on after MAX_NACK_RESENDS resends
+        self.reconnects = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._latency_count = 0
+
+        self._thread = threading.Thread(target=self._run, name="mq-io", daemon=True)
+        self._thread.start()
+
+    # Topology
+
+    def declare_queue(self, queue: str, **options) -> None:
+        """Declares a queue now and after every reconnect."""
+        self._add_topology(lambda done: self._channel.queue_declare(
+            queue=queue, callback=lambda _: done(), **options))
+
+    def declare_exchange(self, exchange: str, exchange_type: str = "direct", **options) -> None:
+        """Declares an exchange now and after every reconnect."""
+        self._add_topology(lambda done: self._channel.exchange_declare(
+            exchange=exchange, exchange_type=exchange_type, callback=lambda _: done(), **options))
+
+    def _add_topology(self, operation: Operation) -> None:
+        # Under the lock, so it is either in _on_ready's copy or scheduled after it.
+        with self._lock:
+            self._topology.append(operation)
+            self.call_threadsafe(lambda: self._enqueue(operation))
+
+    def consumer(self, queue: str, prefetch: int = DEFAULT_PREFETCH, exchange: Optional[str] = None,
+                 exclusive: bool = False, auto_ack: bool = False) -> Consumer:
+        """Creates a subscription; deliveries start once its ``consume`` is called.
+
+        With ``exchange`` set, ``queue`` (usually ``''``) is declared per
+        connection and bound to that exchange.
+        """
+        return Consumer(self, queue, prefetch, exchange, exclusive, auto_ack)
+
+    def start_consumer(self, consumer: Consumer) -> None:
+        with self._lock:
+            if consumer not in self._consumers:
+                self._consumers.append(consumer)
+            self.call_threadsafe(lambda: self._enqueue(
+                lambda done: consumer._start(self._generation, done)))
+
+    def queue_depth(self, queue: str, timeout: float = 5.0) -> Optional[int]:
+        """Returns the number of ready messages in a declared queue, or None if unavailable.
+
+        The passive declare runs on a channel of its own, so a queue that
+        does not exist (the broker closes the channel with a 404) only makes
+        this return None instead of resetting the shared connection.
+        """
+        future: Future = Future()
+
+        def on_open(channel):
+            channel.add_on_close_callback(lambda _, reason: future.done() or future.set_result(None))
+            channel.queue_declare(queue=queue, passive=True, callback=lambda frame: on_declare(channel, frame))
+
+        def on_declare(channel, frame):
+            future.set_result(frame.method.message_count)
+            channel.close()
+
+        def open_channel():
+            try:
+                self._connection.channel(on_open_callback=on_open)
+            except Exception:
+                future.set_result(None)  # the connection is closing
+
+        if not self.call_threadsafe(open_channel):
+            return None
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            return None
+
+    # Publishing
+
+    def publish(self, exchange: str, routing_key: str, body, properties: Optional[pika.BasicProperties] = None,
+                block: bool = True, timeout: Optional[float] = None) -> bool:
+        """Queues a message for publishing and returns immediately.
+
+        With ``block=False`` a full outbox drops the message and returns
+        False instead of waiting; capture loops use this so a broker outage
+        costs frames, not capture latency.
+        """
+        message = (exchange, routing_key, body, properties, time.monotonic(), 0)
+        try:
+            self._outbox.put(message, block, timeout)
+        except Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            if self._drain_scheduled:
+                return True
+            self._drain_scheduled = True
+        if not self.call_threadsafe(self._drain):
+            # Not connected; the outbox is drained once the channel is ready.
+            with self._lock:
+                self._drain_scheduled = False
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Waits until every queued message has been confirmed by the broker."""
+        deadline = time.monotonic() + timeout
+        while self._outbox.qsize() or self._unconfirmed or self._resend:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            count = self._latency_count
+            return {
+                "published": self.published, "confirmed": self.confirmed, "nacked": self.nacked,
+                "dropped": self.dropped, "nack_dropped": self.nack_dropped, "reconnects": self.reconnects,
+                "outbox": self._outbox.qsize(), "unconfirmed": len(self._unconfirmed),
+                "confirm_latency_avg_ms": 1000 * self._latency_total / count if count else 0.0,
+                "confirm_latency_max_ms": 1000 * self._latency_max,
+            }
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flushes pending publishes and closes the connection."""
+        self.flush(timeout)
+        self._running = False
+        self._stopped.set()
+        with self._lock:
+            consumers = list(self._consumers)
+        for consumer in consumers:
+            consumer.stop()
+        self.call_threadsafe(self._close_connection)
+        self._thread.join(timeout)
+
+    # I/O thread
+
+    def call_threadsafe(self, callback: Callable[[], None]) -> bool:
+        """Runs ``callback`` on the I/O thread; returns False while disconnected."""
+        connection = self._connection
+        if connection is None or not self.ready.is_set():
+            return False
+        try:
+            connection.ioloop.add_callback_threadsafe(callback)
+            return True
+        except Exception:
+            return False
+
+    def _run(self) -> None:
+        backoff = self.retry_backoff
+        while self._running:
+            self._connection = pika.SelectConnection(
+                self.parameters, on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_error,
+                on_close_callback=self._on_connection_closed)
+            self._connection.ioloop.start()
+            if self._channel is not None:
+                backoff = self.retry_backoff
+            self._on_disconnected()
+            if not self._running:
+                break
+            logging.warning(f"RabbitMQ connection lost; reconnecting in {backoff:.1f}s")
+            self._stopped.wait(backoff)
+            backoff = min(backoff * 2, self.max_retry_backoff)
+            self.reconnects += 1
+
+    def _on_connection_open(self, connection) -> None:
+        logging.info(f"Connected to RabbitMQ on {self.parameters.host} (pid {os.getpid()})")
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_error(self, connection, error) -> None:
+        logging.error(f"Could not connect to RabbitMQ: {error}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason) -> None:
+        if self._running:
+            logging.error(f"RabbitMQ connection closed: {reason}")
+        connection.ioloop.stop()
+
+    def _on_channel_closed(self, channel, reason) -> None:
+        # Any channel error (for example a failed declaration) resets the
+        # whole connection so that topology and consumers start cleanly.
+        if self._running:
+            logging.error(f"RabbitMQ channel {channel.channel_number} closed: {reason}")
+        self._close_connection()
+
+    def _close_connection(self) -> None:
+        if self._connection is not None and not (self._connection.is_closing or self._connection.is_closed):
+            self._connection.close()
+
+    def _on_channel_open(self, channel) -> None:
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.confirm_delivery(ack_nack_callback=self._on_confirm, callback=lambda _: self._on_ready(channel))
+
+    def _on_ready(self, channel) -> None:
+        self._channel = channel
+        self._generation += 1
+        with self._lock:
+            operations = list(self._topology)
+            consumers = list(self._consumers)
+            # Set with the copy taken, so topology and consumers added from now
+            # on are scheduled by their own call_threadsafe.
+            self.ready.set()
+        generation = self._generation
+        for consumer in consumers:
+            operations.append(lambda done, consumer=consumer: consumer._start(generation, done))
+        for operation in operations:
+            self._enqueue(operation)
+        self._drain()
+        self._connection.ioloop.call_later(self.stats_interval, self._log_stats)
+
+    def _on_disconnected(self) -> None:
+        self.ready.clear()
+        self._channel = None
+        self._operations.clear()
+        self._operation_running = False
+        self._delivery_tag = 0
+        # Unconfirmed messages may or may not have reached the broker; send
+        # them again ahead of anything still waiting in the outbox.
+        self._resend.extendleft(reversed(list(self._unconfirmed.values())))
+        self._unconfirmed.clear()
+        with self._lock:
+            self._drain_scheduled = False
+
+    def _enqueue(self, operation: Operation) -> None:
+        """Runs topology and consumer setup one step at a time, in call order."""
+        self._operations.append(operation)
+        if not self._operation_running:
+            self._next_operation()
+
+    def _next_operation(self) -> None:
+        if not self._operations or self._channel is None:
+            self._operation_running = False
+            return
+        self._operation_running = True
+        self._operations.popleft()(self._next_operation)
+
+    def _drain(self) -> None:
+        """Publishes a batch from the outbox, bounded by the unconfirmed window."""
+        with self._lock:
+            self._drain_scheduled = False
+        channel = self._channel
+        if channel is None or not channel.is_open:
+            return
+        sent = 0
+        while sent < self.publish_batch and len(self._unconfirmed) < self.max_unconfirmed:
+            if self._resend:
+                message = self._resend.popleft()
+            else:
+                try:
+                    message = self._outbox.get_nowait()
+                except Empty:
+                    break
+            channel.basic_publish(message[0], message[1], message[2], message[3])
+            self._delivery_tag += 1
+            self._unconfirmed[self._delivery_tag] = message
+            sent += 1
+        self.published += sent
+        if sent == self.publish_batch and len(self._unconfirmed) < self.max_unconfirmed:
+            # Let the loop service sockets and confirms before the next batch.
+            self._connection.ioloop.call_later(0, self._drain)
+
+    def _on_confirm(self, frame) -> None:
+        method = frame.method
+        nacked = isinstance(method, pika.spec.Basic.Nack)
+        if method.multiple:
+            while self._unconfirmed and next(iter(self._unconfirmed)) <= method.delivery_tag:
+                self._settle(self._unconfirmed.popitem(last=False)[1], nacked)
+        elif method.delivery_tag in self._unconfirmed:
+            self._settle(self._unconfirmed.pop(method.delivery_tag), nacked)
+        self._drain()
+
+    def _settle(self, message: Message, nacked: bool) -> None:
+        if nacked:
+            self.nacked += 1
+            if message[5] < MAX_NACK_RESENDS:
+                self._resend.append(message[:5] + (message[5] + 1,))
+                return
+            with self._lock:
+                self.nack_dropped += 1
+            logging.warning(f"Dropping a message to {message[0] or message[1]!r}: "
+                            f"nacked by the broker {message[5] + 1} times")
+            return
+        latency = time.monotonic() - message[4]
+        with self._lock:
+            self.confirmed += 1
+            self._latency_total += latency
+            self._latency_count += 1
+            self._latency_max = max(self._latency_max, latency)
+
+    def _log_stats(self) -> None:
+        if self._channel is None:
+            return
+        stats = self.stats()
+        logging.info(f"RabbitMQ publisher: {stats['confirmed']} confirmed, {stats['dropped']} dropped, "
+                     f"{stats['nacked']} nacked ({stats['nack_dropped']} dropped), "
+                     f"confirm latency avg {stats['confirm_latency_avg_ms']:.1f} ms "
+                     f"/ max {stats['confirm_latency_max_ms']:.1f} ms, {stats['outbox']} queued")
+        with self._lock:
+            self._latency_total = self._latency_max = 0.0
+            self._latency_count = 0
+        self._connection.ioloop.call_later(self.stats_interval, self._log_stats)
+
+
+_client: Optional[MessageQueueClient] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_client(**settings) -> MessageQueueClient:
+    """Returns this process's shared client, creating it on first use.
+
+    A forked child gets a new client; the parent's connection and I/O
+    thread do not survive the fork.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = MessageQueueClient(**settings)
+            _client_pid = os.getpid()
+        return _client
+
+
+def set_client(client) -> None:
+    """Makes ``get_client`` return ``client`` in this process, e.g. an in-memory broker."""
+    global _client, _client_pid
+    with _client_lock:
+        _client = client
+        _client_pid = os.getpid()
@@ -0,0 +1,104 @@
+# common/metrics.py
+"""Rolling per-stage latency percentiles served in Prometheus text format.
+
+Every service records the stage durations it measures with
+``StageMetrics.observe`` and serves them on ``http://<host>:<port>/metrics``
+as a ``summary``: p50/p95/p99 over the last ``window_seconds`` plus
+cumulative ``_sum`` and ``_count``.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class StageMetrics:
+    """Latency samples per pipeline stage, kept for a rolling time window."""
+
+    def __init__(self, service: str, window_seconds: float = 60.0, max_samples: int = 10000):
+        self.service = service
+        self.window_seconds = window_seconds
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._totals: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.max_samples)
+            samples.append((now, seconds))
+            count, total = self._totals.get(stage, (0, 0.0))
+            self._totals[stage] = (count + 1, total + seconds)
+
+    def observe_many(self, spans: Iterable[Tuple[str, float]]) -> None:
+        for stage, seconds in spans:
+            self.observe(stage, seconds)
+
+    def percentiles(self) -> Dict[str, Dict[float, float]]:
+        """Returns the window's quantiles per stage, dropping expired samples."""
+        cutoff = time.monotonic() - self.window_seconds
+        result = {}
+        with self._lock:
+            for stage, samples in self._samples.items():
+                while samples and samples[0][0] < cutoff:
+                    samples.popleft()
+                if samples:
+                    values = np.fromiter((value for _, value in samples), dtype=np.float64, count=len(samples))
+                    result[stage] = dict(zip(QUANTILES, np.quantile(values, QUANTILES).tolist()))
+        return result
+
+    def render(self) -> str:
+        """Formats every stage as a Prometheus summary."""
+        percentiles = self.percentiles()
+        with self._lock:
+            totals = dict(self._totals)
+        lines = [
+            f"# HELP pipeline_stage_seconds Stage latency, quantiles over the last {self.window_seconds:.0f}s",
+            "# TYPE pipeline_stage_seconds summary",
+        ]
+        for stage in sorted(totals):
+            labels = f'service="{self.service}",stage="{stage}"'
+            for quantile, value in percentiles.get(stage, {}).items():
+                lines.append(f'pipeline_stage_seconds{{{labels},quantile="{quantile}"}} {value:.6f}')
+            count, total = totals[stage]
+            lines.append(f"pipeline_stage_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"pipeline_stage_seconds_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+        """Serves ``/metrics`` from a daemon thread; returns None if the port is taken."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            logging.error(f"Could not serve metrics on port {port}: {e}")
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        logging.info(f"Serving {self.service} stage metrics on http://{host}:{port}/metrics")
+        return server
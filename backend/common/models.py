@@ -0,0 +1,222 @@
+# common/models.py
+"""Versioned binary envelope carried by every message between pipeline stages.
+
+Each message is a fixed little-endian header, the camera id and the payload:
+
+    magic "OE" | version u8 | payload type u8 | frame_seq u64 | capture ts f64
+    | width u16 | height u16 | crop x u16 | crop y u16 | crop scale f32
+    | camera id length u8 | trace length u8 | payload length u32
+    | camera id (UTF-8) | trace | payload
+
+Frames cropped to the camera's detection zones are ``width`` x ``height``
+pixels cut from the camera frame at ``(crop x, crop y)`` and then scaled by
+``crop scale``; ``to_full_frame`` maps boxes back to camera-frame pixels.
+
+The trace is a list of ``(stamp, wall-clock time)`` pairs that each stage
+appends to as the frame passes through it; ``latency_breakdown`` turns it
+into per-stage durations.
+
+``decode`` returns the payload as a ``memoryview`` into the received body,
+so image and detection payloads are read without copying. Result payloads
+hold free-form fields (text, candidates, track data) and stay JSON inside
+the envelope.
+"""
+import json
+import struct
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+MAGIC = b"OE"
+VERSION = 3
+HEADER = struct.Struct('<2sBBQdHHHHfBBI')
+TRACE_ENTRY = struct.Struct('<Bd')
+
+# Payload types
+FRAME_REF = 0  # no payload; the frame is in the camera's shared-memory FrameStore
+IMAGE_JPEG = 1  # JPEG-encoded frame
+IMAGE_RAW = 2  # raw uint8 pixels, height x width x channels
+DETECTIONS = 3  # packed DETECTION_DTYPE records
+RESULTS = 4  # UTF-8 JSON list of OCR or validated results
+
+# Trace stamps, in pipeline order. Each one ends the span named in SPANS,
+# which starts at the previous stamp (or at capture for the first one).
+PUBLISHED = 1  # frame stored and its reference handed to the broker client
+DETECTION_START = 2  # the frame's batch started inference
+DETECTION_END = 3
+OCR_RECEIVED = 4
+OCR_START = 5  # recognition started; after OCR_RECEIVED by the tracking dwell
+OCR_END = 6
+VALIDATION_START = 7
+VALIDATION_END = 8
+DATABASE_RECEIVED = 9
+DATABASE_WRITE = 10  # the batch holding the row started its INSERT
+SPANS = {
+    PUBLISHED: "capture",
+    DETECTION_START: "detection_queue",
+    DETECTION_END: "detection",
+    OCR_RECEIVED: "ocr_queue",
+    OCR_START: "tracking",
+    OCR_END: "ocr",
+    VALIDATION_START: "validation_queue",
+    VALIDATION_END: "validation",
+    DATABASE_RECEIVED: "database_queue",
+    DATABASE_WRITE: "database_batch",
+}
+
+Trace = Tuple[Tuple[int, float], ...]
+
+# One detection: xyxy box in camera-frame pixels, confidence and class id
+DETECTION_DTYPE = np.dtype([('box', '<i4', (4,)), ('confidence', '<f4'), ('class', '<u2')])
+
+
+class Envelope(NamedTuple):
+    payload_type: int
+    camera_id: str
+    frame_seq: int
+    ts: float
+    width: int = 0
+    height: int = 0
+    payload: Union[bytes, memoryview] = b""
+    trace: Trace = ()
+    # Offset and scale of a frame cropped to the camera's detection zones
+    crop_x: int = 0
+    crop_y: int = 0
+    crop_scale: float = 1.0
+
+
+def encode(envelope: Envelope) -> bytes:
+    camera_id = envelope.camera_id.encode("utf-8")
+    if len(camera_id) > 255:
+        raise ValueError(f"Camera id too long for the envelope: {envelope.camera_id!r}")
+    trace = envelope.trace[-255:]
+    header = HEADER.pack(MAGIC, VERSION, envelope.payload_type, envelope.frame_seq, envelope.ts,
+                         envelope.width, envelope.height, envelope.crop_x, envelope.crop_y, envelope.crop_scale,
+                         len(camera_id), len(trace), len(envelope.payload))
+    return b"".join((header, camera_id, *(TRACE_ENTRY.pack(*entry) for entry in trace), envelope.payload))
+
+
+def decode(body: bytes) -> Envelope:
+    """Parses a message body; raises ValueError if it is not a supported envelope."""
+    if len(body) < HEADER.size:
+        raise ValueError(f"Message of {len(body)} bytes is shorter than the envelope header")
+    (magic, version, payload_type, frame_seq, ts, width, height, crop_x, crop_y, crop_scale,
+     id_length, trace_length, payload_length) = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError("Message is not an envelope")
+    if version != VERSION:
+        raise ValueError(f"Unsupported envelope version {version}")
+    trace_start = HEADER.size + id_length
+    start = trace_start + trace_length * TRACE_ENTRY.size
+    if len(body) != start + payload_length:
+        raise ValueError(f"Envelope payload is {len(body) - start} bytes, header says {payload_length}")
+    view = memoryview(body)
+    camera_id = str(view[HEADER.size:trace_start], "utf-8")
+    trace = tuple(TRACE_ENTRY.iter_unpack(view[trace_start:start]))
+    return Envelope(payload_type, camera_id, frame_seq, ts, width, height, view[start:], trace,
+                    crop_x, crop_y, crop_scale)
+
+
+def stamp(envelope: Envelope, *stamps: int, at: Optional[float] = None) -> Envelope:
+    """Returns the envelope with the given trace stamps appended at ``at`` (default now)."""
+    at = time.time() if at is None else at
+    return envelope._replace(trace=envelope.trace + tuple((s, at) for s in stamps))
+
+
+def trace_spans(ts: float, trace: Trace) -> List[Tuple[str, float]]:
+    """Returns ``(span name, seconds)`` for each stamp of a trace."""
+    spans = []
+    previous = ts
+    for stamp_id, at in trace:
+        spans.append((SPANS.get(stamp_id, str(stamp_id)), at - previous))
+        previous = at
+    return spans
+
+
+def latency_breakdown(ts: float, trace: Trace, now: Optional[float] = None) -> Dict[str, float]:
+    """Per-stage seconds of a trace, plus ``total`` from capture to ``now`` (default the last stamp)."""
+    breakdown = {name: round(seconds, 6) for name, seconds in trace_spans(ts, trace)}
+    end = now if now is not None else (trace[-1][1] if trace else ts)
+    breakdown["total"] = round(end - ts, 6)
+    return breakdown
+
+
+def frame_ref(camera_id: str, frame_seq: int, ts: float, width: int = 0, height: int = 0,
+              trace: Trace = (), crop: Tuple[int, int, float] = (0, 0, 1.0)) -> bytes:
+    """Encodes a reference to a frame held in the camera's FrameStore.
+
+    ``crop`` is the ``(x, y, scale)`` of a frame cropped to detection zones.
+    """
+    crop_x, crop_y, crop_scale = crop
+    return encode(Envelope(FRAME_REF, str(camera_id), frame_seq, ts, width, height, trace=trace,
+                           crop_x=crop_x, crop_y=crop_y, crop_scale=crop_scale))
+
+
+def is_cropped(envelope: Envelope) -> bool:
+    return envelope.crop_x != 0 or envelope.crop_y != 0 or envelope.crop_scale != 1.0
+
+
+def to_full_frame(envelope: Envelope, box: List[int]) -> List[int]:
+    """Maps an xyxy box from the (cropped) frame of a message to camera-frame pixels."""
+    x1, y1, x2, y2 = box
+    scale = envelope.crop_scale
+    return [envelope.crop_x + round(x1 / scale), envelope.crop_y + round(y1 / scale),
+            envelope.crop_x + round(x2 / scale), envelope.crop_y + round(y2 / scale)]
+
+
+def to_cropped_frame(envelope: Envelope, box: List[int]) -> List[int]:
+    """Maps an xyxy box in camera-frame pixels into the (cropped) frame of a message."""
+    x1, y1, x2, y2 = box
+    scale = envelope.crop_scale
+    return [round((x1 - envelope.crop_x) * scale), round((y1 - envelope.crop_y) * scale),
+            round((x2 - envelope.crop_x) * scale), round((y2 - envelope.crop_y) * scale)]
+
+
+def image_message(camera_id: str, frame_seq: int, ts: float, frame: np.ndarray) -> bytes:
+    """Encodes a frame's raw pixels."""
+    height, width = frame.shape[:2]
+    return encode(Envelope(IMAGE_RAW, str(camera_id), frame_seq, ts, width, height,
+                           np.ascontiguousarray(frame, dtype=np.uint8).data.cast("B")))
+
+
+def decode_image(envelope: Envelope) -> np.ndarray:
+    """Returns the frame of an image envelope; raw pixels are a read-only view of the body."""
+    data = np.frombuffer(envelope.payload, dtype=np.uint8)
+    if envelope.payload_type == IMAGE_RAW:
+        return data.reshape(envelope.height, envelope.width, -1)
+    if envelope.payload_type == IMAGE_JPEG:
+        import cv2
+        return cv2.imdecode(data, cv2.IMREAD_COLOR)
+    raise ValueError(f"Envelope payload type {envelope.payload_type} is not an image")
+
+
+def pack_detections(detections: List[Dict[str, Any]]) -> bytes:
+    return np.array([(d["box"], d["confidence"], d["class"]) for d in detections], dtype=DETECTION_DTYPE).tobytes()
+
+
+def detections_message(envelope: Envelope, detections: List[Dict[str, Any]]) -> bytes:
+    """Encodes a frame's detections under the header of the frame reference."""
+    return encode(envelope._replace(payload_type=DETECTIONS, payload=pack_detections(detections)))
+
+
+def decode_detections(envelope: Envelope) -> List[Dict[str, Any]]:
+    if envelope.payload_type != DETECTIONS:
+        raise ValueError(f"Envelope payload type {envelope.payload_type} is not detections")
+    records = np.frombuffer(envelope.payload, dtype=DETECTION_DTYPE)
+    return [{"box": box, "confidence": confidence, "class": class_id}
+            for box, confidence, class_id in zip(records['box'].tolist(), records['confidence'].tolist(),
+                                                 records['class'].tolist())]
+
+
+def results_message(camera_id: str, frame_seq: int, ts: float, results: List[Dict[str, Any]],
+                    trace: Trace = ()) -> bytes:
+    """Encodes a list of OCR or validated results for one camera."""
+    return encode(Envelope(RESULTS, str(camera_id), frame_seq, ts,
+                           payload=json.dumps(results).encode("utf-8"), trace=trace))
+
+
+def decode_results(envelope: Envelope) -> List[Dict[str, Any]]:
+    if envelope.payload_type != RESULTS:
+        raise ValueError(f"Envelope payload type {envelope.payload_type} is not results")
+    return json.loads(bytes(envelope.payload))
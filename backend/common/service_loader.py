@@ -0,0 +1,47 @@
+# common/service_loader.py
+"""Imports modules of several services into one process.
+
+Every service runs as a script from its own directory and imports its
+siblings by bare name (``import config``, ``import message_queue``), so
+the services' modules clash in ``sys.modules``. ``load_service`` imports a
+service's modules with only that service's directory in scope and takes
+its sibling modules out of ``sys.modules`` again afterwards. The loaded
+modules keep references to their own ``config`` and helpers.
+"""
+import importlib
+import os
+import sys
+import threading
+from types import ModuleType
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Reentrant: a service module may load other services while it is imported
+_lock = threading.RLock()
+
+
+def service_dir(service: str) -> str:
+    return os.path.join(BACKEND_DIR, service)
+
+
+def _local_names(directory: str) -> List[str]:
+    return [name[:-3] for name in os.listdir(directory) if name.endswith(".py")]
+
+
+def load_service(service: str, *modules: str) -> Dict[str, ModuleType]:
+    """Imports ``modules`` of ``service`` (e.g. ``"ocr_service", "main"``) and returns them by name."""
+    directory = service_dir(service)
+    if not os.path.isdir(directory):
+        raise ValueError(f"No service directory {directory}")
+    local = _local_names(directory)
+    with _lock:
+        saved = {name: sys.modules.pop(name) for name in local if name in sys.modules}
+        sys.path.insert(0, directory)
+        try:
+            return {name: importlib.import_module(name) for name in modules}
+        finally:
+            sys.path.remove(directory)
+            for name in local:
+                sys.modules.pop(name, None)
+            sys.modules.update(saved)
@@ -0,0 +1,30 @@
+# database_service/config.py
+
+DB_HOST = "localhost"
+DB_NAME = "container_ocr"
+DB_USER = "postgres"
+DB_PASSWORD = "Man782761"  # Replace with your PostgreSQL password
+
+# Bulk writer: a batch is written and committed when it reaches
+# WRITE_BATCH_ROWS rows or its oldest row has waited WRITE_BATCH_MAX_WAIT_MS.
+WRITE_BATCH_ROWS = 500
+WRITE_BATCH_MAX_WAIT_MS = 200
+# Rows per INSERT statement sent by execute_values
+INSERT_PAGE_SIZE = 500
+# Unacked deliveries held by the writer; must cover at least one full batch
+PREFETCH_COUNT = 1000
+
+# Retry backoff while the database is unreachable; deliveries stay unacked meanwhile
+RETRY_BACKOFF_SECONDS = 1.0
+RETRY_MAX_BACKOFF_SECONDS = 30.0
+
+# How often writer metrics are logged
+STATS_INTERVAL_SECONDS = 30.0
+# Per-stage latency percentiles in Prometheus format on http://localhost:<port>/metrics
+METRICS_PORT = 9105
+
+# ocr_results is partitioned by month. Partitions are created ahead of time
+# and whole months older than RETENTION_MONTHS are dropped (0 keeps everything).
+PARTITION_MONTHS_AHEAD = 2
+RETENTION_MONTHS = 12
+PARTITION_MAINTENANCE_SECONDS = 3600
@@ -0,0 +1,164 @@
+# database_service/data_pipeline.py
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+
+from database_manager import DatabaseManager, result_row
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.message_queue_client import Consumer
+from common.metrics import StageMetrics
+from common.models import DATABASE_RECEIVED, decode, decode_results, latency_breakdown, stamp, trace_spans
+
+
+class WriterStats:
+    """Flush size, latency and failure counters of the bulk writer."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.started = time.time()
+        self.flushes = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.failures = 0
+        self.rejected = 0
+
+    def record(self, rows: int, seconds: float) -> None:
+        self.flushes += 1
+        self.rows += rows
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def report(self) -> str:
+        elapsed = max(time.time() - self.started, 1e-9)
+        flushes = max(self.flushes, 1)
+        return (f"{self.rows / elapsed:.1f} rows/s, {self.flushes} flushes, "
+                f"{self.rows / flushes:.1f} rows/flush, latency avg {1000 * self.seconds / flushes:.1f} ms "
+                f"max {1000 * self.max_seconds:.1f} ms, {self.failures} failed flushes, "
+                f"{self.rejected} rejected rows")
+
+
+class BulkWriter:
+    """Buffers validated results and writes them to Postgres in batches.
+
+    Deliveries are acknowledged, with ``multiple=True``, only after the batch
+    holding their rows has been committed, so every result is stored at least
+    once. If the database is unreachable, the batch stays unacknowledged and
+    is retried with backoff. Prefetch bounds how much piles up meanwhile.
+    """
+
+    def __init__(self, consumer: Consumer, db: DatabaseManager, batch_rows: int, max_wait_ms: int,
+                 retry_backoff: float = 1.0, max_retry_backoff: float = 30.0, stats_interval: float = 30.0,
+                 metrics: Optional[StageMetrics] = None):
+        self.consumer = consumer
+        self.metrics = metrics
+        self.db = db
+        self.batch_rows = batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.stats_interval = stats_interval
+        self.rows: List[Tuple] = []
+        # Latency breakdown of each message in the batch (shared by its rows)
+        # with its capture and receive times; completed when the batch is written.
+        self.latencies: List[Tuple[Dict[str, float], float, float]] = []
+        self.last_tag: Optional[int] = None
+        self.deadline_timer = None
+        self.retry_timer = None
+        self.backoff = retry_backoff
+        self.stats = WriterStats()
+
+    def on_message(self, ch, method, properties, body) -> None:
+        """Buffers the rows of one delivery and flushes when the batch is full."""
+        try:
+            message = stamp(decode(body), DATABASE_RECEIVED)
+            results = decode_results(message)
+            latency = latency_breakdown(message.ts, message.trace)
+            for result in results:
+                # Fill in what older producers left out from the envelope header.
+                result.setdefault("camera_id", message.camera_id)
+                result.setdefault("ts", message.ts)
+            self.rows.extend(result_row(result, latency) for result in results)
+            self.latencies.append((latency, message.ts, message.trace[-1][1]))
+            if self.metrics is not None:
+                self.metrics.observe_many(trace_spans(message.ts, message.trace)[-1:])
+        except (ValueError, KeyError, TypeError) as e:
+            # Acked together with the batch so it is not redelivered forever
+            logging.error(f"Dropping malformed validated results: {e}")
+        self.last_tag = method.delivery_tag
+
+        if self.retry_timer is not None:
+            return
+        if len(self.rows) >= self.batch_rows:
+            self.flush()
+        elif self.deadline_timer is None:
+            self.deadline_timer = self.consumer.call_later(self.max_wait, self.on_deadline)
+
+    def on_deadline(self) -> None:
+        self.deadline_timer = None
+        self.flush()
+
+    def on_retry(self) -> None:
+        self.retry_timer = None
+        self.flush()
+
+    def write(self, rows: List[Tuple]) -> None:
+        try:
+            self.db.insert_rows(rows)
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            # A bad row fails the whole statement; isolate it and keep the rest.
+            # Anything else (connection, schema) is left to flush to retry.
+            self.stats.failures += 1
+            logging.error(f"Batch of {len(rows)} rows failed ({e}); writing rows individually")
+            self.stats.rejected += len(self.db.insert_each(rows))
+
+    def flush(self) -> None:
+        """Writes the buffered rows in one transaction and acks their deliveries."""
+        if self.deadline_timer is not None:
+            self.consumer.remove_timeout(self.deadline_timer)
+            self.deadline_timer = None
+        if self.last_tag is None:
+            return
+
+        rows = self.rows
+        write_start = time.time()
+        for latency, ts, received in self.latencies:
+            # The rows carry their breakdown up to the start of this write;
+            # the commit itself is only in the database_commit metric.
+            latency["database_batch"] = round(write_start - received, 6)
+            latency["total"] = round(write_start - ts, 6)
+        start = time.perf_counter()
+        try:
+            if rows:
+                self.write(rows)
+        except psycopg2.Error as e:
+            self.stats.failures += 1
+            logging.error(f"Database unavailable, retrying {len(rows)} rows in {self.backoff:.1f}s: {e}")
+            self.retry_timer = self.consumer.call_later(self.backoff, self.on_retry)
+            self.backoff = min(self.backoff * 2, self.max_retry_backoff)
+            return
+
+        seconds = time.perf_counter() - start
+        self.stats.record(len(rows), seconds)
+        self.consumer.basic_ack(delivery_tag=self.last_tag, multiple=True)
+        if self.metrics is not None:
+            for latency, _, _ in self.latencies:
+                self.metrics.observe("database_batch", latency["database_batch"])
+                self.metrics.observe("database_commit", seconds)
+                self.metrics.observe("total", latency["total"] + seconds)
+        self.rows = []
+        self.latencies = []
+        self.last_tag = None
+        self.backoff = self.retry_backoff
+        logging.debug(f"Stored {len(rows)} results.")
+
+        if time.time() - self.stats.started >= self.stats_interval:
+            logging.info(f"Bulk writer: {self.stats.report()}")
+            self.stats.reset()
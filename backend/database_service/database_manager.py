@@ -0,0 +1,208 @@
+# database_service/database_manager.py
+import json
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psycopg2
+import psycopg2.extras
+
+INSERT_RESULTS = """
+    INSERT INTO ocr_results (ts, camera_id, track_id, container_number, iso_type,
+                             box, confidence, class_id, text, valid, corrected, latency)
+    VALUES %s
+"""
+
+# ocr_results is range-partitioned by month on ts. Indexes created on the
+# parent are created on every partition as well. Rows outside the monthly
+# partitions (skewed camera clocks, late replays) land in the default
+# partition; rows the database rejects are kept in ocr_results_rejected.
+CREATE_RESULTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS ocr_results (
+        id BIGSERIAL,
+        ts TIMESTAMPTZ NOT NULL DEFAULT now(),
+        camera_id TEXT,
+        track_id BIGINT,
+        container_number TEXT,
+        iso_type TEXT,
+        box JSONB,
+        confidence FLOAT,
+        class_id INTEGER,
+        text TEXT,
+        valid BOOLEAN,
+        latency JSONB,
+        corrected BOOLEAN,
+        PRIMARY KEY (ts, id)
+    ) PARTITION BY RANGE (ts);
+    ALTER TABLE ocr_results ADD COLUMN IF NOT EXISTS latency JSONB;
+    ALTER TABLE ocr_results ADD COLUMN IF NOT EXISTS corrected BOOLEAN;
+    CREATE INDEX IF NOT EXISTS ocr_results_camera_ts ON ocr_results (camera_id, ts DESC, id DESC);
+    CREATE INDEX IF NOT EXISTS ocr_results_container_ts ON ocr_results (container_number, ts DESC, id DESC);
+    CREATE TABLE IF NOT EXISTS ocr_results_default PARTITION OF ocr_results DEFAULT;
+    CREATE TABLE IF NOT EXISTS ocr_results_rejected (
+        id BIGSERIAL PRIMARY KEY,
+        rejected_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        error TEXT,
+        row_data TEXT
+    );
+"""
+
+
+def result_row(result: Dict[str, Any], latency: Optional[Dict[str, float]] = None) -> Tuple:
+    """Maps one validated result message and its per-stage latency to an ocr_results row."""
+    # Tracked results carry the time the container was last seen; older
+    # per-frame results fall back to their frame time, then to now.
+    seen = result.get("last_seen") or result.get("ts")
+    ts = datetime.fromtimestamp(seen, timezone.utc) if seen else datetime.now(timezone.utc)
+    return (ts, result.get("camera_id"), result.get("track_id"), result.get("container_number"),
+            result.get("iso_type"), json.dumps(result["box"]), result["confidence"], result["class"],
+            result["text"], result["valid"], result.get("corrected"),
+            psycopg2.extras.Json(latency) if latency is not None else None)
+
+
+def month_start(day: date, offset: int = 0) -> date:
+    """First day of the month ``offset`` months after the month of ``day``."""
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+PARTITION_NAME = re.compile(r'ocr_results_y(\d{4})m(\d{2})')
+
+
+def partition_name(month: date) -> str:
+    return f"ocr_results_y{month.year:04d}m{month.month:02d}"
+
+
+class DatabaseManager:
+    """Owns the writer's Postgres connection and its multi-row inserts."""
+
+    def __init__(self, host: str, database: str, user: str, password: str, page_size: int = 500):
+        self.params = {"host": host, "database": database, "user": user, "password": password}
+        self.page_size = page_size
+        self.conn = None
+
+    def connect(self) -> None:
+        """Opens the connection if it is missing or was closed by an error."""
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(**self.params)
+            logging.info(f"Connected to database {self.params['database']} on {self.params['host']}")
+
+    def ensure_schema(self) -> None:
+        """Creates the partitioned ocr_results table, moving a pre-partitioning table aside."""
+        self.connect()
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT c.relkind FROM pg_class c
+                WHERE c.oid = to_regclass('ocr_results')
+            """)
+            row = cur.fetchone()
+            if row is not None and row[0] != 'p':
+                cur.execute("ALTER TABLE ocr_results RENAME TO ocr_results_legacy")
+                logging.warning("Renamed unpartitioned ocr_results table to ocr_results_legacy")
+            cur.execute(CREATE_RESULTS_TABLE)
+        self.conn.commit()
+
+    def ensure_partitions(self, today: date, months_back: int = 1, months_ahead: int = 2) -> None:
+        """Creates the monthly partitions around ``today`` that do not exist yet."""
+        self.connect()
+        with self.conn.cursor() as cur:
+            for offset in range(-months_back, months_ahead + 1):
+                start = month_start(today, offset)
+                cur.execute("SELECT to_regclass(%s)", (partition_name(start),))
+                if cur.fetchone()[0] is None:
+                    self._create_partition(cur, start)
+        self.conn.commit()
+
+    def _create_partition(self, cur, start: date) -> None:
+        """Creates the partition of one month, moving its rows out of the default partition.
+
+        Postgres refuses to create a partition while the default partition
+        holds rows in its range.
+        """
+        end = month_start(start, 1)
+        cur.execute("CREATE TEMP TABLE ocr_results_moved (LIKE ocr_results)")
+        cur.execute("""
+            WITH moved AS (DELETE FROM ocr_results_default WHERE ts >= %s AND ts < %s RETURNING *)
+            INSERT INTO ocr_results_moved SELECT * FROM moved
+        """, (start, end))
+        moved = cur.rowcount
+        cur.execute(f"CREATE TABLE {partition_name(start)} PARTITION OF ocr_results "
+                    f"FOR VALUES FROM (%s) TO (%s)", (start, end))
+        cur.execute("INSERT INTO ocr_results SELECT * FROM ocr_results_moved")
+        cur.execute("DROP TABLE ocr_results_moved")
+        if moved:
+            logging.info(f"Moved {moved} rows from ocr_results_default to {partition_name(start)}")
+
+    def drop_partitions_before(self, cutoff: date) -> List[str]:
+        """Drops whole monthly partitions that end on or before ``cutoff``, and older default-partition rows."""
+        self.connect()
+        dropped = []
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT c.relname FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'ocr_results'::regclass
+            """)
+            for (name,) in cur.fetchall():
+                match = PARTITION_NAME.fullmatch(name)
+                if match and month_start(date(int(match[1]), int(match[2]), 1), 1) <= cutoff:
+                    cur.execute(f"DROP TABLE {name}")
+                    dropped.append(name)
+            cur.execute("DELETE FROM ocr_results_default WHERE ts < %s", (cutoff,))
+        self.conn.commit()
+        if dropped:
+            logging.info(f"Dropped expired ocr_results partitions: {', '.join(dropped)}")
+        return dropped
+
+    def insert_rows(self, rows: Sequence[Tuple]) -> None:
+        """Writes rows with multi-row INSERTs in a single transaction.
+
+        Raises on failure after rolling back, so the caller can keep the
+        batch unacknowledged.
+        """
+        self.connect()
+        try:
+            with self.conn.cursor() as cur:
+                psycopg2.extras.execute_values(cur, INSERT_RESULTS, rows, page_size=self.page_size)
+            self.conn.commit()
+        except psycopg2.Error:
+            if not self.conn.closed:
+                self.conn.rollback()
+            raise
+
+    def insert_each(self, rows: Sequence[Tuple]) -> List[Tuple]:
+        """Writes rows one at a time in a single transaction and returns the rows that were rejected.
+
+        Each row runs under its own savepoint, so a row that fails on its own
+        data (DataError, IntegrityError) is rolled back alone and kept in
+        ocr_results_rejected with its error instead. Any other error
+        rolls back the whole transaction and is raised, so a retry of the
+        batch does not store the rows before it a second time.
+        """
+        self.connect()
+        rejected = []
+        try:
+            with self.conn.cursor() as cur:
+                for row in rows:
+                    cur.execute("SAVEPOINT insert_row")
+                    try:
+                        psycopg2.extras.execute_values(cur, INSERT_RESULTS, [row])
+                    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                        cur.execute("ROLLBACK TO SAVEPOINT insert_row")
+                        logging.error(f"Rejected row {row}: {e}")
+                        cur.execute("INSERT INTO ocr_results_rejected (error, row_data) VALUES (%s, %s)",
+                                    (str(e).strip(), repr(row)))
+                        rejected.append(row)
+                    else:
+                        cur.execute("RELEASE SAVEPOINT insert_row")
+            self.conn.commit()
+        except psycopg2.Error:
+            if not self.conn.closed:
+                self.conn.rollback()
+            raise
+        return rejected
+
+    def close(self) -> None:
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
@@ -1,71 +1,71 @@
 # database_service/main.py
-import pika
-import json
-import psycopg2
-import psycopg2.extras
+import logging
+import os
+import sys
+from datetime import date
+
+import config
+import message_queue
+from data_pipeline import BulkWriter
+from database_manager import DatabaseManager, month_start
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.message_queue_client import Consumer
+from common.metrics import StageMetrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def maintain_partitions(db: DatabaseManager) -> None:
+    """Creates upcoming monthly partitions and drops the ones past retention."""
+    today = date.today()
+    db.ensure_partitions(today, months_ahead=config.PARTITION_MONTHS_AHEAD)
+    if config.RETENTION_MONTHS:
+        db.drop_partitions_before(month_start(today, -config.RETENTION_MONTHS))
+
+
+def schedule_maintenance(consumer: Consumer, db: DatabaseManager) -> None:
+    """Repeats partition maintenance on the consumer's dispatch thread."""
+    def on_maintenance():
+        try:
+            maintain_partitions(db)
+        except Exception as e:
+            logging.error(f"Partition maintenance failed: {e}")
+        consumer.call_later(config.PARTITION_MAINTENANCE_SECONDS, on_maintenance)
+
+    consumer.call_later(config.PARTITION_MAINTENANCE_SECONDS, on_maintenance)
+
 
 def main():
-    print("Database Service started.")
+    logging.info("Database Service started.")
 
+    db = DatabaseManager(config.DB_HOST, config.DB_NAME, config.DB_USER, config.DB_PASSWORD,
+                         page_size=config.INSERT_PAGE_SIZE)
     try:
-        # PostgreSQL connection
-        conn = psycopg2.connect(
-            host="localhost",
-            database="container_ocr",
-            user="postgres",
-            password="Man782761" # Replace with your password
-        )
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-
-        # Create table if not exists
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS ocr_results (
-                id SERIAL PRIMARY KEY,
-                box JSONB,
-                confidence FLOAT,
-                class_id INTEGER,
-                text TEXT,
-                valid BOOLEAN
-            )
-        """)
-        conn.commit()
-
-        # RabbitMQ connection
-        connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
-        channel = connection.channel()
-        channel.queue_declare(queue='validated_results')
-
-        def callback(ch, method, properties, body):
-            try:
-                # Decode validated results
-                validated_results = json.loads(body)
-
-                for result in validated_results:
-                    # Insert results into database
-                    cur.execute("""
-                        INSERT INTO ocr_results (box, confidence, class_id, text, valid)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (json.dumps(result["box"]), result["confidence"], result["class"], result["text"], result["valid"]))
-
-                conn.commit()
-                print("Results stored in database.")
-
-            except Exception as e:
-                print(f"Error storing results: {e}")
-                conn.rollback()
-
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-
-        channel.basic_consume(queue='validated_results', on_message_callback=callback)
-
-        print('Waiting for validated results. To exit press CTRL+C')
-        channel.start_consuming()
+        # Create the partitioned table and its current partitions
+        db.ensure_schema()
+        maintain_partitions(db)
+
+        metrics = StageMetrics("database")
+        metrics.serve(config.METRICS_PORT)
+
+        # Shared RabbitMQ client
+        consumer = message_queue.connect().consumer('validated_results', prefetch=config.PREFETCH_COUNT)
+        writer = BulkWriter(consumer, db, config.WRITE_BATCH_ROWS, config.WRITE_BATCH_MAX_WAIT_MS,
+                            config.RETRY_BACKOFF_SECONDS, config.RETRY_MAX_BACKOFF_SECONDS,
+                            config.STATS_INTERVAL_SECONDS, metrics)
+
+        schedule_maintenance(consumer, db)
+
+        logging.info(f"Waiting for validated results (batches of {config.WRITE_BATCH_ROWS} rows, "
+                     f"max wait {config.WRITE_BATCH_MAX_WAIT_MS} ms). To exit press CTRL+C")
+        consumer.consume(writer.on_message)
 
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logging.exception(f"An error occurred: {e}")
     finally:
-        if 'conn' in locals() and conn:
-            conn.close()
+        db.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,13 @@
+# database_service/message_queue.py
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.message_queue_client import MessageQueueClient, get_client
+
+
+def connect() -> MessageQueueClient:
+    """Returns this process's broker client with the database service's queue declared."""
+    client = get_client()
+    client.declare_queue('validated_results')
+    return client
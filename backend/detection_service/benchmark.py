@@ -0,0 +1,133 @@
+# detection_service/benchmark.py
+"""Measures detector latency and throughput per backend and batch size.
+
+With ``--workers`` it instead runs every workers x threads combination as
+parallel processes set up like workers.py (CPU slices, thread limits,
+warm-up) and reports aggregate frames/s, to find the best split for a host.
+
+Usage: python benchmark.py [--video gate.mp4] [--backends torch,onnx] [--batch-sizes 1,2,4,8,16]
+       python benchmark.py --workers 1,2,4 --threads 0,1,2
+"""
+import argparse
+import multiprocessing
+import queue
+import time
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+import config
+from detector import Detector, create_detector
+from workers import configure_process, cpu_slices, warm_up
+
+
+def load_frames(video_path: str, count: int, width: int, height: int) -> List[np.ndarray]:
+    """Reads sample frames from a video, or generates noise frames without one."""
+    if not video_path:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit(f"Could not read frames from {video_path}")
+    return frames
+
+
+def run(detector: Detector, frames: List[np.ndarray], batch_size: int, total: int) -> float:
+    """Runs ``total`` frames through the detector and returns the elapsed seconds."""
+    processed = 0
+    start = time.perf_counter()
+    while processed < total:
+        batch = [frames[(processed + i) % len(frames)] for i in range(batch_size)]
+        detector.detect_batch(batch)
+        processed += batch_size
+    return time.perf_counter() - start
+
+
+def _sweep_worker(cpus: List[int], threads: int, backend: str, args: Tuple, batch_size: int, total: int,
+                  barrier, results) -> None:
+    threads = configure_process(cpus, threads)
+    detector = create_detector(backend, config, threads=threads)
+    frames = load_frames(*args)
+    warm_up(detector, batch_size, config.WARMUP_BATCHES, frames[0].shape[1], frames[0].shape[0])
+    barrier.wait()
+    results.put(run(detector, frames, batch_size, total))
+
+
+def sweep(backend: str, workers: int, threads: int, args: argparse.Namespace, batch_size: int) -> float:
+    """Runs ``args.frames`` frames in each of ``workers`` processes at once; returns aggregate frames/s."""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    total = -(-args.frames // batch_size) * batch_size
+    processes = [
+        context.Process(target=_sweep_worker, daemon=True, args=(
+            cpus, threads, backend, (args.video, args.frames, args.width, args.height), batch_size, total,
+            barrier, results))
+        for cpus in cpu_slices(workers)
+    ]
+    for process in processes:
+        process.start()
+    elapsed = []
+    while len(elapsed) < workers:
+        try:
+            elapsed.append(results.get(timeout=1.0))
+        except queue.Empty:
+            if any(process.exitcode for process in processes):
+                for process in processes:
+                    process.terminate()
+                raise SystemExit(f"A {backend} worker failed; see its traceback above")
+    for process in processes:
+        process.join()
+    return workers * total / max(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default=config.DETECTOR_BACKEND,
+                        help="comma-separated list of torch, onnx, onnx-int8")
+    parser.add_argument("--video", default="", help="video file to sample frames from")
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16")
+    parser.add_argument("--frames", type=int, default=64, help="frames per batch size")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--workers", help="comma-separated worker process counts to sweep")
+    parser.add_argument("--threads", default="0",
+                        help="comma-separated intra-op threads per worker for --workers (0: CPUs of its slice)")
+    args = parser.parse_args()
+
+    if args.workers:
+        # A single --batch-sizes value sets the batch; otherwise the service's BATCH_SIZE is used.
+        batch_size = int(args.batch_sizes) if "," not in args.batch_sizes else config.BATCH_SIZE
+        print(f"{'backend':>10} {'workers':>8} {'threads':>8} {'frames/s':>10} (batch {batch_size})")
+        for backend in args.backends.split(","):
+            for workers in (int(w) for w in args.workers.split(",")):
+                for threads in (int(t) for t in args.threads.split(",")):
+                    fps = sweep(backend, workers, threads, args, batch_size)
+                    print(f"{backend:>10} {workers:>8} {threads or 'slice':>8} {fps:>10.1f}")
+        return
+
+    frames = load_frames(args.video, args.frames, args.width, args.height)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    print(f"{'backend':>10} {'batch':>6} {'frames/s':>10} {'ms/frame':>10} {'ms/batch':>10}")
+    for backend in args.backends.split(","):
+        detector = create_detector(backend, config)
+        detector.detect_batch(frames[:1])  # warm-up
+        for batch_size in batch_sizes:
+            total = -(-args.frames // batch_size) * batch_size
+            elapsed = run(detector, frames, batch_size, total)
+            print(f"{backend:>10} {batch_size:>6} {total / elapsed:>10.1f} "
+                  f"{1000 * elapsed / total:>10.2f} {1000 * elapsed * batch_size / total:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
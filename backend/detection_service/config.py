@@ -0,0 +1,53 @@
+# detection_service/config.py
+MODEL_PATH = "best.pt"
+ONNX_MODEL_PATH = "best.onnx"
+ONNX_INT8_MODEL_PATH = "best.int8.onnx"
+
+# Inference backend: "torch", "onnx" or "onnx-int8" (see detector.py).
+# Create the ONNX models with `python export_model.py`.
+DETECTOR_BACKEND = "torch"
+
+# Shared pre/post-processing for every backend
+INPUT_SIZE = 640
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.45
+MAX_DETECTIONS = 100
+
+# Intra-op threads for the inference runtime; 0 keeps the runtime default.
+INFERENCE_THREADS = 0
+
+# Worker processes started by workers.py, each a competing consumer of
+# video_frames with its own model. The process's CPUs are split into one
+# contiguous slice per worker; WORKER_THREADS intra-op threads run on each
+# slice (0 means one per CPU of the slice). Find the best split with
+# `python benchmark.py --workers 1,2,4 --threads 0`.
+DETECTION_WORKERS = 1
+WORKER_THREADS = 0
+PIN_WORKERS = True  # restrict each worker to its CPU slice
+WARMUP_BATCHES = 2  # full batches run on blank frames before consuming
+WORKER_STATS_INTERVAL = 10.0  # seconds between aggregate throughput reports
+WORKER_RESTART_BACKOFF = 2.0  # first restart delay for a crashed worker, doubled per crash
+WORKER_RESTART_MAX_BACKOFF = 60.0
+
+# Frames are collected into one inference call until BATCH_SIZE frames have
+# arrived or BATCH_MAX_WAIT_MS has passed since the first one, whichever is first.
+BATCH_SIZE = 8
+BATCH_MAX_WAIT_MS = 50
+
+# Unacknowledged deliveries RabbitMQ may push ahead of the current batch,
+# per worker process.
+PREFETCH_COUNT = 2 * BATCH_SIZE
+
+# Log throughput per batch size every this many batches.
+STATS_INTERVAL_BATCHES = 50
+
+# Frames older than this when their batch is processed are dropped unprocessed.
+STALENESS_BUDGET_SECONDS = 2.0
+
+# How often detection reports its lag to the camera streams' backpressure
+# controllers on the pipeline_feedback exchange.
+FEEDBACK_INTERVAL_SECONDS = 1.0
+
+# Per-stage latency percentiles in Prometheus format on http://localhost:<port>/metrics
+# (worker i of workers.py serves on METRICS_PORT + i)
+METRICS_PORT = 9102
@@ -1,12 +1,19 @@
+import os
+import sys
+
 import pika
-import json
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.models import decode, decode_detections
 
 def callback(ch, method, properties, body):
     try:
-        detection_results = json.loads(body)
-        print(f"Received detection results: {detection_results}")
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
+        message = decode(body)
+        detection_results = decode_detections(message)
+        print(f"Received detection results for camera {message.camera_id} frame {message.frame_seq}: "
+              f"{detection_results}")
+    except ValueError as e:
+        print(f"Error decoding message: {e}")
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
 connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
@@ -16,4 +23,4 @@ channel.queue_declare(queue='detection_results')
 channel.basic_consume(queue='detection_results', on_message_callback=callback)
 
 print('Waiting for detection results. To exit press CTRL+C')
-channel.start_consuming()
\ No newline at end of file
+channel.start_consuming()
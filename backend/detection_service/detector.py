@@ -0,0 +1,206 @@
+# detection_service/detector.py
+"""Container detector with interchangeable inference backends.
+
+Every backend shares the same letterbox pre-processing and NMS
+post-processing; only the forward pass differs:
+
+- ``torch``: the ultralytics ``best.pt`` network run through PyTorch
+- ``onnx``: the exported ``best.onnx`` on ONNX Runtime's CPU provider
+- ``onnx-int8``: the dynamically quantized ``best.int8.onnx`` on ONNX Runtime
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Letterbox parameters for one frame: scale, horizontal pad, vertical pad
+LetterboxMeta = Tuple[float, float, float]
+
+
+def letterbox(frame: np.ndarray, size: int, color: int = 114) -> Tuple[np.ndarray, LetterboxMeta]:
+    """Resizes a frame to fit a size x size square, padding the remainder."""
+    height, width = frame.shape[:2]
+    scale = min(size / height, size / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+
+    if (new_w, new_h) != (width, height):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    padded = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                                value=(color, color, color))
+    return padded, (scale, left, top)
+
+
+def preprocess(frames: List[np.ndarray], size: int) -> Tuple[np.ndarray, List[LetterboxMeta]]:
+    """Letterboxes BGR frames into a float32 NCHW RGB batch scaled to [0, 1]."""
+    batch = np.empty((len(frames), 3, size, size), dtype=np.float32)
+    metas = []
+    for i, frame in enumerate(frames):
+        padded, meta = letterbox(frame, size)
+        batch[i] = padded[:, :, ::-1].transpose(2, 0, 1)
+        metas.append(meta)
+    batch *= 1.0 / 255.0
+    return batch, metas
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy non-maximum suppression; returns kept indices by descending score."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(output: np.ndarray, metas: List[LetterboxMeta], shapes: List[Tuple[int, int]],
+                conf_threshold: float, iou_threshold: float, max_detections: int) -> List[np.ndarray]:
+    """Turns raw (batch, 4 + classes, anchors) output into per-frame detections.
+
+    Each result row is ``x1, y1, x2, y2, confidence, class`` in original
+    frame coordinates.
+    """
+    results = []
+    for pred, (scale, pad_x, pad_y), (height, width) in zip(output, metas, shapes):
+        pred = pred.T  # anchors x (4 + classes)
+        class_scores = pred[:, 4:]
+        classes = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(pred)), classes]
+        mask = scores > conf_threshold
+        if not mask.any():
+            results.append(np.zeros((0, 6), dtype=np.float32))
+            continue
+        cxcywh, scores, classes = pred[mask, :4], scores[mask], classes[mask]
+
+        boxes = np.empty_like(cxcywh)
+        boxes[:, :2] = cxcywh[:, :2] - cxcywh[:, 2:] / 2
+        boxes[:, 2:] = cxcywh[:, :2] + cxcywh[:, 2:] / 2
+        # Offset boxes per class so NMS never suppresses across classes
+        offsets = classes[:, None].astype(np.float32) * 4096.0
+        keep = nms(boxes + offsets, scores, iou_threshold)[:max_detections]
+
+        boxes = boxes[keep]
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad_x) / scale).clip(0, width)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad_y) / scale).clip(0, height)
+        results.append(np.column_stack([boxes, scores[keep], classes[keep]]).astype(np.float32))
+    return results
+
+
+class Detector:
+    """Base detector: shared pre/post-processing around a backend forward pass."""
+
+    def __init__(self, input_size: int = 640, conf_threshold: float = 0.25,
+                 iou_threshold: float = 0.45, max_detections: int = 100):
+        self.input_size = input_size
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.max_detections = max_detections
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        """Runs the network on a preprocessed batch and returns its raw output."""
+        raise NotImplementedError
+
+    def predict(self, frames: List[np.ndarray]) -> List[np.ndarray]:
+        """Returns an (N, 6) detection array per frame."""
+        if not frames:
+            return []
+        batch, metas = preprocess(frames, self.input_size)
+        output = self.infer(batch)
+        shapes = [frame.shape[:2] for frame in frames]
+        return postprocess(output, metas, shapes, self.conf_threshold,
+                           self.iou_threshold, self.max_detections)
+
+    def detect_batch(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        """Runs inference on a batch of frames and returns detections per frame."""
+        return [
+            [
+                {
+                    "box": [int(b) for b in row[:4]],
+                    "confidence": float(row[4]),
+                    "class": int(row[5])
+                }
+                for row in detections
+            ]
+            for detections in self.predict(frames)
+        ]
+
+
+class TorchDetector(Detector):
+    """Runs the ultralytics network directly through PyTorch."""
+
+    def __init__(self, model_path: str, threads: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        import torch
+        from ultralytics import YOLO
+
+        self.torch = torch
+        if threads > 0:
+            torch.set_num_threads(threads)
+            try:
+                # Batches are one forward pass; inter-op threads would only compete with intra-op ones.
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass  # already set, or parallel work has started in this process
+        self.model = YOLO(model_path).model.float().fuse().eval()
+        logging.info(f"Loaded torch detection model {model_path}")
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        with self.torch.inference_mode():
+            output = self.model(self.torch.from_numpy(batch))
+        if isinstance(output, (list, tuple)):
+            output = output[0]
+        return output.cpu().numpy()
+
+
+class OnnxDetector(Detector):
+    """Runs an exported ONNX model on ONNX Runtime's CPU execution provider."""
+
+    def __init__(self, model_path: str, threads: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        logging.info(f"Loaded ONNX detection model {model_path}")
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+def create_detector(backend: str, config, threads: Optional[int] = None) -> Detector:
+    """Builds the detector selected by ``backend`` from a config module.
+
+    ``threads`` overrides ``config.INFERENCE_THREADS``, e.g. per worker process.
+    """
+    threads = config.INFERENCE_THREADS if threads is None else threads
+    kwargs = dict(
+        input_size=config.INPUT_SIZE,
+        conf_threshold=config.CONF_THRESHOLD,
+        iou_threshold=config.IOU_THRESHOLD,
+        max_detections=config.MAX_DETECTIONS,
+    )
+    if backend == "torch":
+        return TorchDetector(config.MODEL_PATH, threads=threads, **kwargs)
+    if backend == "onnx":
+        return OnnxDetector(config.ONNX_MODEL_PATH, threads=threads, **kwargs)
+    if backend == "onnx-int8":
+        return OnnxDetector(config.ONNX_INT8_MODEL_PATH, threads=threads, **kwargs)
+    raise ValueError(f"Unknown detector backend {backend!r}, expected one of {BACKENDS}")
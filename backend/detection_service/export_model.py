@@ -0,0 +1,107 @@
+# detection_service/export_model.py
+"""Exports best.pt to ONNX (optionally int8) and verifies it against the torch backend.
+
+Usage: python export_model.py [--int8] [--video gate.mp4] [--verify-only]
+"""
+import argparse
+import sys
+from typing import List
+
+import numpy as np
+
+import config
+from benchmark import load_frames
+from detector import Detector, OnnxDetector, TorchDetector, preprocess
+
+
+def export_onnx(model_path: str, input_size: int) -> str:
+    """Exports the ultralytics model with a dynamic batch dimension."""
+    from ultralytics import YOLO
+
+    return YOLO(model_path).export(format="onnx", imgsz=input_size, dynamic=True, simplify=True)
+
+
+def quantize_int8(onnx_path: str, output_path: str) -> None:
+    """Writes a dynamically quantized (int8 weights) copy of an ONNX model."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(onnx_path, output_path, weight_type=QuantType.QUInt8)
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between two (N, 4) and (M, 4) xyxy box arrays."""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def verify(reference: Detector, candidate: Detector, frames: List[np.ndarray],
+           raw_atol: float, min_iou: float, conf_atol: float) -> bool:
+    """Checks raw outputs and final detections of two backends agree within tolerance."""
+    ok = True
+    batch, _ = preprocess(frames, reference.input_size)
+    raw_diff = np.abs(reference.infer(batch) - candidate.infer(batch)).max()
+    print(f"max |raw output difference|: {raw_diff:.5f} (tolerance {raw_atol})")
+    if raw_diff > raw_atol:
+        ok = False
+
+    for i, (ref, cand) in enumerate(zip(reference.predict(frames), candidate.predict(frames))):
+        if len(ref) != len(cand):
+            print(f"frame {i}: {len(ref)} reference detections vs {len(cand)}")
+            ok = False
+            continue
+        if not len(ref):
+            continue
+        iou = box_iou(ref[:, :4], cand[:, :4])
+        match = iou.argmax(axis=1)
+        worst_iou = iou[np.arange(len(ref)), match].min()
+        conf_diff = np.abs(ref[:, 4] - cand[match, 4]).max()
+        same_class = np.array_equal(ref[:, 5], cand[match, 5])
+        print(f"frame {i}: {len(ref)} detections, worst IoU {worst_iou:.4f}, "
+              f"max confidence difference {conf_diff:.4f}, classes match: {same_class}")
+        if worst_iou < min_iou or conf_diff > conf_atol or not same_class:
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--int8", action="store_true", help="also write and verify the int8 model")
+    parser.add_argument("--verify-only", action="store_true", help="skip the export step")
+    parser.add_argument("--video", default="", help="video file to sample verification frames from")
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--raw-atol", type=float, default=1e-2)
+    parser.add_argument("--min-iou", type=float, default=0.95)
+    parser.add_argument("--conf-atol", type=float, default=0.02)
+    args = parser.parse_args()
+
+    if not args.verify_only:
+        onnx_path = export_onnx(config.MODEL_PATH, config.INPUT_SIZE)
+        print(f"Exported {onnx_path}")
+        if args.int8:
+            quantize_int8(config.ONNX_MODEL_PATH, config.ONNX_INT8_MODEL_PATH)
+            print(f"Quantized {config.ONNX_INT8_MODEL_PATH}")
+
+    frames = load_frames(args.video, args.frames, 1920, 1080)
+    kwargs = dict(input_size=config.INPUT_SIZE, conf_threshold=config.CONF_THRESHOLD,
+                  iou_threshold=config.IOU_THRESHOLD, max_detections=config.MAX_DETECTIONS)
+    reference = TorchDetector(config.MODEL_PATH, **kwargs)
+
+    print(f"Verifying {config.ONNX_MODEL_PATH} against {config.MODEL_PATH}")
+    ok = verify(reference, OnnxDetector(config.ONNX_MODEL_PATH, **kwargs), frames,
+                args.raw_atol, args.min_iou, args.conf_atol)
+    if args.int8:
+        # Quantized weights only approximate the float model, so compare detections loosely.
+        print(f"Verifying {config.ONNX_INT8_MODEL_PATH} against {config.MODEL_PATH}")
+        ok = verify(reference, OnnxDetector(config.ONNX_INT8_MODEL_PATH, **kwargs), frames,
+                    float("inf"), args.min_iou - 0.15, args.conf_atol * 5) and ok
+
+    print("Verification passed." if ok else "Verification FAILED.")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,183 @@
 # detection_service/main.py
-import pika
-import torch
-import cv2
-import numpy as np
-from ultralytics import YOLO
 import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 
-def main():
-    print("Detection Service started.")
+import config
+import message_queue
+from detector import Detector, create_detector
 
-    try:
-        # Load YOLOv8 model
-        model = YOLO("best.pt") # load a pretrained model, replace with your model if needed
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.frame_store import FrameStoreReader
+from common.message_queue_client import Consumer
+from common.metrics import StageMetrics
+from common.models import (DETECTION_END, DETECTION_START, FRAME_REF, Envelope, decode, detections_message,
+                           is_cropped, stamp, to_full_frame, trace_spans)
 
-        # RabbitMQ connection
-        connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
-        channel = connection.channel()
-        channel.queue_declare(queue='video_frames')
-        channel.queue_declare(queue='detection_results')
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-        def callback(ch, method, properties, body):
-            try:
-                # Decode JPEG frame
-                img_np = np.frombuffer(body, np.uint8)
-                frame = cv2.imdecode(img_np, cv2.IMREAD_COLOR)
-
-                # Perform object detection
-                results = model(frame)
-
-                # Extract detection results
-                detections = []
-                for r in results:
-                    for *box, conf, cls in r.xyxy[0]:
-                        detections.append({
-                            "box": [int(b) for b in box],
-                            "confidence": float(conf),
-                            "class": int(cls)
-                        })
-
-                # Publish detection results to RabbitMQ
-                channel.basic_publish(exchange='', routing_key='detection_results', body=json.dumps(detections))
-                print("Detection results published.")
-
-            except Exception as e:
-                print(f"Error processing frame: {e}")
 
+class BatchStats:
+    """Tracks inference throughput separately for every batch size seen."""
+
+    def __init__(self):
+        self.frames: Dict[int, int] = defaultdict(int)
+        self.seconds: Dict[int, float] = defaultdict(float)
+        self.batches = 0
+
+    def record(self, batch_size: int, seconds: float) -> None:
+        self.frames[batch_size] += batch_size
+        self.seconds[batch_size] += seconds
+        self.batches += 1
+
+    def report(self) -> str:
+        return ", ".join(
+            f"batch={size}: {self.frames[size] / self.seconds[size]:.1f} frames/s"
+            for size in sorted(self.frames) if self.seconds[size] > 0
+        )
+
+
+class FrameBatcher:
+    """Collects frame deliveries and runs one inference call per batch."""
+
+    def __init__(self, consumer: Consumer, detector: Detector, frame_reader: FrameStoreReader,
+                 batch_size: int, max_wait_ms: int, metrics: Optional[StageMetrics] = None):
+        self.consumer = consumer
+        self.metrics = metrics
+        self.detector = detector
+        self.frame_reader = frame_reader
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.pending: List[Tuple[int, Envelope]] = []
+        self.deadline_timer = None
+        self.stats = BatchStats()
+        self.stale_dropped = 0
+        self.last_feedback_time = 0.0
+
+    def on_message(self, ch, method, properties, body) -> None:
+        """Queues one delivery and flushes when the batch is full."""
+        try:
+            frame_ref = decode(body)
+        except ValueError as e:
+            logging.error(f"Dropping malformed frame message: {e}")
             ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        self.pending.append((method.delivery_tag, frame_ref))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif self.deadline_timer is None:
+            self.deadline_timer = self.consumer.call_later(self.max_wait, self.on_deadline)
+
+    def on_deadline(self) -> None:
+        self.deadline_timer = None
+        self.flush()
+
+    def read_frame(self, frame_ref: Envelope):
+        """Returns the referenced frame from the camera's FrameStore, or None if it has expired."""
+        # OCR reads the same frame back from the store, so inline images are not accepted here.
+        if frame_ref.payload_type != FRAME_REF:
+            raise ValueError(f"expected a frame reference, got payload type {frame_ref.payload_type}")
+        return self.frame_reader.get(frame_ref.camera_id, frame_ref.frame_seq)
+
+    def flush(self) -> None:
+        """Runs inference on the pending frames, publishes results and acks the batch."""
+        if self.deadline_timer is not None:
+            self.consumer.remove_timeout(self.deadline_timer)
+            self.deadline_timer = None
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        last_tag = batch[-1][0]
+
+        refs: List[Envelope] = []
+        frames = []
+        now = time.time()
+        for _, frame_ref in batch:
+            if now - frame_ref.ts > config.STALENESS_BUDGET_SECONDS:
+                self.stale_dropped += 1
+                continue
+            try:
+                frame = self.read_frame(frame_ref)
+            except ValueError as e:
+                logging.error(f"Dropping frame message of camera {frame_ref.camera_id}: {e}")
+                continue
+            if frame is None:
+                logging.warning(f"Frame {frame_ref.frame_seq} of camera {frame_ref.camera_id} expired, skipping.")
+                continue
+            refs.append(frame_ref)
+            frames.append(frame)
+
+        try:
+            if frames:
+                started = time.time()
+                start = time.perf_counter()
+                batch_detections = self.detector.detect_batch(frames)
+                self.stats.record(len(frames), time.perf_counter() - start)
+                finished = time.time()
+
+                for frame_ref, detections in zip(refs, batch_detections):
+                    frame_ref = stamp(stamp(frame_ref, DETECTION_START, at=started), DETECTION_END, at=finished)
+                    if self.metrics is not None:
+                        self.metrics.observe_many(trace_spans(frame_ref.ts, frame_ref.trace)[-2:])
+                    if not self.frame_reader.is_current(frame_ref.camera_id, frame_ref.frame_seq):
+                        logging.warning(f"Frame {frame_ref.frame_seq} was overwritten during inference, skipping.")
+                        continue
+                    if is_cropped(frame_ref):
+                        # Inference ran on the camera's detection zones; publish camera-frame boxes.
+                        detections = [dict(d, box=to_full_frame(frame_ref, d["box"])) for d in detections]
+                    self.consumer.basic_publish(exchange='', routing_key='detection_results',
+                                                body=detections_message(frame_ref, detections))
+                logging.debug(f"Detection results published for {len(frames)} frames.")
+
+                if self.stats.batches % config.STATS_INTERVAL_BATCHES == 0:
+                    logging.info(f"Detection throughput: {self.stats.report()}; "
+                                 f"{self.stale_dropped} stale frames dropped")
+        except Exception as e:
+            logging.error(f"Error processing batch of {len(frames)} frames: {e}")
+
+        self.report_lag(max(now - frame_ref.ts for _, frame_ref in batch))
+        self.consumer.basic_ack(delivery_tag=last_tag, multiple=True)
+
+    def report_lag(self, lag: float) -> None:
+        """Tells the camera streams how far behind capture detection is running."""
+        now = time.time()
+        if now - self.last_feedback_time < config.FEEDBACK_INTERVAL_SECONDS:
+            return
+        self.last_feedback_time = now
+        self.consumer.basic_publish(exchange='pipeline_feedback', routing_key='',
+                                   body=json.dumps({"stage": "detection", "lag": lag, "ts": now}))
+
+
+def main():
+    logging.info("Detection Service started.")
+
+    frame_reader: Optional[FrameStoreReader] = None
+    try:
+        detector = create_detector(config.DETECTOR_BACKEND, config)
+        frame_reader = FrameStoreReader()
 
-        channel.basic_consume(queue='video_frames', on_message_callback=callback)
+        # Shared RabbitMQ client
+        consumer = message_queue.connect().consumer('video_frames', prefetch=config.PREFETCH_COUNT)
+        metrics = StageMetrics("detection")
+        metrics.serve(config.METRICS_PORT)
+        batcher = FrameBatcher(consumer, detector, frame_reader, config.BATCH_SIZE, config.BATCH_MAX_WAIT_MS,
+                               metrics)
 
-        print('Waiting for frames. To exit press CTRL+C')
-        channel.start_consuming()
+        logging.info(f"Waiting for frames (batch size {config.BATCH_SIZE}, "
+                     f"max wait {config.BATCH_MAX_WAIT_MS} ms). To exit press CTRL+C")
+        consumer.consume(batcher.on_message)
 
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logging.exception(f"An error occurred: {e}")
+    finally:
+        if frame_reader is not None:
+            frame_reader.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
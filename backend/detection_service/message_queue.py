@@ -0,0 +1,15 @@
+# detection_service/message_queue.py
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.message_queue_client import MessageQueueClient, get_client
+
+
+def connect() -> MessageQueueClient:
+    """Returns this process's broker client with the detection service's queues declared."""
+    client = get_client()
+    client.declare_queue('video_frames')
+    client.declare_queue('detection_results')
+    client.declare_exchange('pipeline_feedback', exchange_type='fanout')
+    return client
@@ -0,0 +1,219 @@
+# detection_service/workers.py
+"""Runs K detection worker processes as competing consumers of video_frames.
+
+A single detection process either oversubscribes the host (every runtime
+sizes its thread pools to all cores) or leaves cores idle while it waits on
+the broker. The launcher splits the available CPUs into one contiguous
+slice per worker and, in each worker before the model is loaded, caps the
+OpenMP/MKL pools and the intra-op threads to its slice and pins the process
+to it. Each worker loads its own model, runs a few warm-up batches and only
+then starts consuming with its own prefetch limit, so RabbitMQ spreads
+frames over the workers that are ready.
+
+Workers report their counters to the launcher, which logs aggregate
+frames/s and restarts workers that die.
+
+Usage: python workers.py [--workers 4] [--threads 2]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import config
+
+# Thread pools sized from the environment when the runtimes load
+THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_slices(workers: int, cpus: Optional[List[int]] = None) -> List[List[int]]:
+    """Splits the CPUs into one contiguous slice per worker, as evenly as possible.
+
+    With more workers than CPUs, workers share CPUs round-robin.
+    """
+    cpus = cpus or available_cpus()
+    if workers >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(workers)]
+    return [[int(cpu) for cpu in part] for part in np.array_split(cpus, workers)]
+
+
+def configure_process(cpus: List[int], threads: int = 0, pin: bool = True) -> int:
+    """Sizes this process's thread pools for its CPU slice; returns the intra-op thread count.
+
+    Must run before torch or onnxruntime is imported, as they read the
+    environment once when they load.
+    """
+    import cv2
+
+    threads = threads or len(cpus)
+    for name in THREAD_ENV:
+        os.environ[name] = str(threads)
+    cv2.setNumThreads(threads)  # letterboxing
+    if pin and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    return threads
+
+
+def warm_up(detector, batch_size: int, batches: int, width: int = 1920, height: int = 1080) -> float:
+    """Runs full and single-frame batches on blank frames so allocation and kernel
+    selection happen before the first real frame. Returns the seconds taken."""
+    frames = [np.zeros((height, width, 3), dtype=np.uint8)] * batch_size
+    start = time.perf_counter()
+    for _ in range(batches):
+        detector.detect_batch(frames)
+    detector.detect_batch(frames[:1])
+    return time.perf_counter() - start
+
+
+def _worker_main(index: int, cpus: List[int], threads: int, events: multiprocessing.Queue) -> None:
+    """Entry point of a detection worker process."""
+    logging.basicConfig(level=logging.INFO,
+                        format=f'%(asctime)s - %(levelname)s - [detection-{index}] %(message)s')
+    threads = configure_process(cpus, threads, config.PIN_WORKERS)
+    # Imported after configure_process, so the runtimes see the thread limits.
+    import message_queue
+    from detector import create_detector
+    from main import FrameBatcher
+    from common.frame_store import FrameStoreReader
+    from common.metrics import StageMetrics
+
+    detector = create_detector(config.DETECTOR_BACKEND, config, threads=threads)
+    seconds = warm_up(detector, config.BATCH_SIZE, config.WARMUP_BATCHES)
+    logging.info(f"Worker ready on CPUs {cpus} with {threads} threads (warm-up {seconds:.1f}s)")
+
+    frame_reader = FrameStoreReader()
+    consumer = message_queue.connect().consumer('video_frames', prefetch=config.PREFETCH_COUNT)
+    metrics = StageMetrics("detection")
+    metrics.serve(config.METRICS_PORT + index)
+    batcher = FrameBatcher(consumer, detector, frame_reader, config.BATCH_SIZE, config.BATCH_MAX_WAIT_MS,
+                           metrics)
+
+    def report() -> None:
+        stats = batcher.stats
+        try:
+            events.put_nowait((index, os.getpid(), sum(stats.frames.values()), sum(stats.seconds.values()),
+                               batcher.stale_dropped, time.process_time()))
+        except queue.Full:
+            pass
+        consumer.call_later(config.WORKER_STATS_INTERVAL / 2, report)
+
+    consumer.call_later(config.WORKER_STATS_INTERVAL / 2, report)
+    try:
+        consumer.consume(batcher.on_message)
+    finally:
+        frame_reader.close()
+
+
+class DetectionWorkers:
+    """Starts the worker processes, restarts the ones that die and reports aggregate throughput."""
+
+    def __init__(self, workers: int = config.DETECTION_WORKERS, threads: int = config.WORKER_THREADS):
+        self.slices = cpu_slices(workers)
+        self.threads = threads
+        self._context = multiprocessing.get_context("spawn")
+        self._events = self._context.Queue(maxsize=1024)
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._failures = [0] * workers
+        self._restart_at: Dict[int, float] = {}
+        # Latest report per worker: (pid, frames, inference seconds, stale dropped, CPU seconds)
+        self._latest: Dict[int, Tuple[int, int, float, int, float]] = {}
+
+    def _start(self, index: int) -> None:
+        process = self._context.Process(target=_worker_main, name=f"detection-{index}", daemon=True,
+                                        args=(index, self.slices[index], self.threads, self._events))
+        process.start()
+        self._processes[index] = process
+
+    def start(self) -> None:
+        for index, cpus in enumerate(self.slices):
+            self._start(index)
+        threads = f"{self.threads} threads each" if self.threads else "one thread per CPU"
+        logging.info(f"Started {len(self.slices)} detection workers on CPU slices {self.slices}, {threads}")
+
+    def _watch(self, now: float) -> None:
+        for index, process in enumerate(self._processes):
+            if process is None or process.is_alive():
+                continue
+            if index not in self._restart_at:
+                self._failures[index] += 1
+                delay = min(config.WORKER_RESTART_MAX_BACKOFF,
+                            config.WORKER_RESTART_BACKOFF * 2 ** (self._failures[index] - 1))
+                self._restart_at[index] = now + delay
+                logging.error(f"Detection worker {index} died (exit code {process.exitcode}); "
+                              f"restarting in {delay:.0f}s")
+            elif now >= self._restart_at[index]:
+                del self._restart_at[index]
+                self._latest.pop(index, None)
+                self._start(index)
+
+    def _report(self, previous: Dict[int, Tuple], elapsed: float) -> None:
+        total = 0.0
+        parts = []
+        for index in sorted(self._latest):
+            pid, frames, seconds, stale, cpu = self._latest[index]
+            last = previous.get(index)
+            if last is None or last[0] != pid:
+                last = (pid, 0, 0.0, 0, 0.0)  # first report, or the worker was restarted
+            fps = (frames - last[1]) / elapsed
+            total += fps
+            busy = 100.0 * (seconds - last[2]) / elapsed
+            parts.append(f"w{index} {fps:.1f} fps ({busy:.0f}% inferring, "
+                         f"{100.0 * (cpu - last[4]) / elapsed:.0f}% CPU, {stale - last[3]} stale)")
+        logging.info(f"Detection: {total:.1f} frames/s over {len(self._latest)} workers; " + ", ".join(parts))
+
+    def run(self) -> None:
+        """Serves until interrupted."""
+        previous: Dict[int, Tuple] = {}
+        last_report = time.time()
+        while True:
+            try:
+                index, *report = self._events.get(timeout=1.0)
+                self._latest[index] = tuple(report)
+            except queue.Empty:
+                pass
+            now = time.time()
+            self._watch(now)
+            if now - last_report >= config.WORKER_STATS_INTERVAL:
+                self._report(previous, now - last_report)
+                previous, last_report = dict(self._latest), now
+
+    def shutdown(self) -> None:
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=config.DETECTION_WORKERS)
+    parser.add_argument("--threads", type=int, default=config.WORKER_THREADS,
+                        help="intra-op threads per worker (0 means one per CPU of its slice)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    workers = DetectionWorkers(args.workers, args.threads)
+    workers.start()
+    try:
+        workers.run()
+    except KeyboardInterrupt:
+        logging.info("Stopping detection workers...")
+    finally:
+        workers.shutdown()
+
+
+if __name__ == "__main__":
+    main()
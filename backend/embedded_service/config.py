@@ -0,0 +1,27 @@
+# embedded_service/config.py
+# Single-process pipeline for gate boxes: capture, detection, OCR,
+# validation and database writing in one process without RabbitMQ. Each
+# stage keeps reading its own service's config.py for everything else.
+
+# Cameras to capture, {camera id: RTSP URL or video file}. When empty, the
+# active cameras are loaded from the camera management API and followed
+# through its change feed, as the stream service does.
+CAMERAS = {}
+
+# Maximum messages waiting between two stages. A full queue blocks the
+# stage that publishes into it; cameras drop frames instead of waiting.
+QUEUE_LENGTH = 64
+
+# Hand decoded frames to detection and OCR as references to the captured
+# arrays. False uses the shared-memory frame store of the distributed setup.
+FRAMES_BY_REFERENCE = True
+
+# Throttle cameras with the backpressure controller (see
+# camera_stream_service/rate_controller.py) instead of a fixed rate.
+RATE_CONTROL = True
+
+# How often per-stage throughput is logged
+STATS_INTERVAL_SECONDS = 30.0
+
+# Per-stage latency percentiles in Prometheus format on http://localhost:<port>/metrics
+METRICS_PORT = 9100
@@ -0,0 +1,74 @@
+# embedded_service/main.py
+import logging
+import os
+import sys
+import time
+from typing import Dict, Optional
+
+import config
+from pipeline import EmbeddedPipeline
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.metrics import StageMetrics
+from common.service_loader import load_service
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def follow_registry(pipeline: EmbeddedPipeline):
+    """Captures the management API's active cameras and applies its changes as they happen."""
+    stream = load_service("camera_stream_service", "config", "camera_registry")
+
+    def on_camera_change(camera_id: str, old: Optional[dict], new: Optional[dict]) -> None:
+        if new is None:
+            if pipeline.remove_camera(camera_id):
+                logging.info(f"Camera {camera_id} was removed or deactivated; stream stopped")
+        elif old is None or (old.get("ip_address"), old.get("detection_zones")) != \
+                (new["ip_address"], new.get("detection_zones")):
+            pipeline.add_camera(camera_id, new["ip_address"], zones=new.get("detection_zones"))
+
+    registry = stream["camera_registry"].CameraRegistry(stream["config"].CAMERA_MANAGEMENT_API_URL,
+                                                         on_camera_change)
+    registry.start()
+    return registry
+
+
+def log_stats(previous: Dict[str, int], current: Dict[str, int], seconds: float) -> None:
+    rates = ", ".join(f"{stage} {(current[stage] - previous.get(stage, 0)) / seconds:.1f}/s" for stage in current)
+    logging.info(f"Embedded pipeline: {rates}")
+
+
+def main():
+    logging.info("Embedded pipeline started.")
+
+    metrics = StageMetrics("embedded")
+    metrics.serve(config.METRICS_PORT)
+    pipeline = EmbeddedPipeline(metrics=metrics)
+
+    pipeline.start()
+    registry = None
+    if config.CAMERAS:
+        for camera_id, url in config.CAMERAS.items():
+            pipeline.add_camera(camera_id, url)
+    else:
+        registry = follow_registry(pipeline)
+
+    try:
+        counters, last = pipeline.counters(), time.monotonic()
+        while True:
+            time.sleep(config.STATS_INTERVAL_SECONDS)
+            current, now = pipeline.counters(), time.monotonic()
+            log_stats(counters, current, now - last)
+            counters, last = current, now
+    except KeyboardInterrupt:
+        logging.info("Stopping the embedded pipeline...")
+    finally:
+        if registry is not None:
+            registry.stop()
+        if not pipeline.stop():
+            logging.warning("Stopped before every queued frame was processed")
+        logging.info("Embedded pipeline stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# embedded_service/pipeline.py
+"""Every pipeline stage in one process, linked by bounded in-memory queues.
+
+The stages are the same classes the distributed services run from their
+``main.py``: ``CameraThread``, ``FrameBatcher``, ``OcrStage``,
+``ValidationStage`` and ``BulkWriter``. Only the transport changes: a
+``MemoryBroker`` replaces RabbitMQ, and with ``frames_by_reference``
+detection and OCR read the captured arrays themselves from a
+``LocalFrameStore``. Each consumer runs on its own thread; inference and
+Tesseract release the GIL for their heavy work.
+"""
+import logging
+import os
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.frame_store import FrameStoreReader, LocalFrameStore, LocalFrameStoreReader
+from common.memory_broker import MemoryBroker, MemoryConsumer
+from common.message_queue_client import set_client
+from common.metrics import StageMetrics
+from common.service_loader import load_service, service_dir
+
+QUEUES = ("video_frames", "detection_results", "ocr_results", "validated_results")
+# How often the cameras' capture latencies are moved into the metrics
+CAPTURE_LATENCY_INTERVAL = 1.0
+
+
+def create_detector(backend: Optional[str] = None):
+    """Builds the detection service's configured detector, or the one for ``backend``."""
+    detection = load_service("detection_service", "config", "detector")
+    detection_config = detection["config"]
+    cwd = os.getcwd()
+    os.chdir(service_dir("detection_service"))  # model paths are relative to the service
+    try:
+        return detection["detector"].create_detector(backend or detection_config.DETECTOR_BACKEND, detection_config)
+    finally:
+        os.chdir(cwd)
+
+
+class EmbeddedPipeline:
+    """Builds the stages from their services and runs them in this process.
+
+    ``detector``, ``engine_pool`` and ``database`` replace the configured
+    model, Tesseract pool and Postgres connection, e.g. with synthetic ones
+    in benchmarks. ``tracking`` overrides the OCR service's setting.
+    """
+
+    def __init__(self, queue_length: int = config.QUEUE_LENGTH,
+                 frames_by_reference: bool = config.FRAMES_BY_REFERENCE,
+                 rate_control: bool = config.RATE_CONTROL, metrics: Optional[StageMetrics] = None,
+                 detector=None, engine_pool=None, tracking: Optional[bool] = None, database=None,
+                 writer_stats_interval: Optional[float] = None):
+        self.frames_by_reference = frames_by_reference
+        self.metrics = metrics
+        self.broker = MemoryBroker(queue_length)
+        set_client(self.broker)
+        for queue in QUEUES:
+            self.broker.declare_queue(queue)
+        self.broker.declare_exchange('pipeline_feedback', exchange_type='fanout')
+
+        self.stream = load_service("camera_stream_service", "config", "camera_stream", "rate_controller")
+        detection = load_service("detection_service", "config", "main")
+        ocr = load_service("ocr_service", "config", "main")
+        validation = load_service("result_validation_service", "config", "main")
+        storage = load_service("database_service", "config", "main", "data_pipeline", "database_manager")
+
+        self.cameras: Dict[str, Any] = {}
+        # Replaced or removed cameras that are still stopping; counted until they are
+        self._stopping: List[Any] = []
+        # Counters of the cameras stopped so far
+        self._stopped_counts = {"decoded": 0, "capture": 0, "capture_dropped": 0}
+        self.rate_controller = self.stream["rate_controller"].BackpressureController() if rate_control else None
+        self.threads: List[threading.Thread] = []
+        self.running = False
+        self._stopped = threading.Event()
+        self._latency_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+        # Detection
+        detection_config = detection["config"]
+        if detector is None:
+            detector = create_detector()
+        consumer = self.broker.consumer('video_frames', prefetch=detection_config.PREFETCH_COUNT)
+        self.batcher = detection["main"].FrameBatcher(
+            consumer, detector, self.frame_reader(), detection_config.BATCH_SIZE,
+            detection_config.BATCH_MAX_WAIT_MS, metrics)
+        self.add_consumer("detection", consumer, lambda c: c.consume(self.batcher.on_message))
+
+        # OCR
+        ocr_config, ocr_main = ocr["config"], ocr["main"]
+        if engine_pool is None:
+            engine_pool = ocr_main.EnginePool(ocr_config.OCR_ENGINES, ocr_config.TESSDATA_DIR, ocr_config.OCR_LANG,
+                                              ocr_config.OCR_PSM)
+        tracking = ocr_config.TRACKING_ENABLED if tracking is None else tracking
+        self.ocr_stage = ocr_main.OcrStage(
+            self.frame_reader(), engine_pool,
+            ocr_main.RoiPreprocessor(**ocr_config.PREPROCESS) if ocr_config.PREPROCESS_ENABLED else None,
+            ocr_main.MultiCameraTracker(**ocr_config.TRACKER) if tracking else None, metrics)
+        consumer = self.broker.consumer('detection_results', prefetch=ocr_config.PREFETCH_COUNT)
+        self.add_consumer("ocr", consumer, self.ocr_stage.run)
+
+        # Validation
+        self.validation_stage = validation["main"].create_stage(metrics)
+        consumer = self.broker.consumer('ocr_results', prefetch=validation["config"].PREFETCH_COUNT)
+        self.add_consumer("validation", consumer, lambda c: c.consume(self.validation_stage.on_message))
+
+        # Database
+        storage_config, storage_main = storage["config"], storage["main"]
+        consumer = self.broker.consumer('validated_results', prefetch=storage_config.PREFETCH_COUNT)
+        if database is None:
+            database = storage["database_manager"].DatabaseManager(
+                storage_config.DB_HOST, storage_config.DB_NAME, storage_config.DB_USER, storage_config.DB_PASSWORD,
+                page_size=storage_config.INSERT_PAGE_SIZE)
+            database.ensure_schema()
+            storage_main.maintain_partitions(database)
+            storage_main.schedule_maintenance(consumer, database)
+        self.database = database
+        self.writer = storage["data_pipeline"].BulkWriter(
+            consumer, database, storage_config.WRITE_BATCH_ROWS, storage_config.WRITE_BATCH_MAX_WAIT_MS,
+            storage_config.RETRY_BACKOFF_SECONDS, storage_config.RETRY_MAX_BACKOFF_SECONDS,
+            storage_config.STATS_INTERVAL_SECONDS if writer_stats_interval is None else writer_stats_interval,
+            metrics)
+        self.add_consumer("database", consumer, lambda c: c.consume(self.writer.on_message))
+
+    def frame_reader(self):
+        return LocalFrameStoreReader() if self.frames_by_reference else FrameStoreReader()
+
+    def add_consumer(self, name: str, consumer: MemoryConsumer, run: Callable[[MemoryConsumer], None]) -> None:
+        """Runs ``run(consumer)`` on a thread of its own once the pipeline starts."""
+        self.threads.append(threading.Thread(target=run, args=(consumer,), name=name, daemon=True))
+
+    # Cameras
+
+    def add_camera(self, camera_id: str, url: str, fps: Optional[float] = None, zones: Optional[list] = None) -> None:
+        """Starts (or restarts) capturing a camera.
+
+        ``fps`` fixes its rate instead of the backpressure controller;
+        ``zones`` are its detection zones (see common/detection_zones.py).
+        """
+        camera_id = str(camera_id)
+        stream_config = self.stream["config"]
+        frame_store = LocalFrameStore(camera_id, slots=stream_config.FRAME_STORE_SLOTS) \
+            if self.frames_by_reference else None
+        camera = self.stream["camera_stream"].CameraThread(
+            camera_id, self.rate_controller if fps is None else None, rtsp_url=url, frame_store=frame_store)
+        camera.set_detection_zones(zones)
+        if fps:
+            camera.frame_interval = 1.0 / fps
+        elif fps is not None:
+            camera.frame_interval = 0.0  # 0 means unthrottled
+        with self._lock:
+            previous = self.cameras.pop(camera_id, None)
+            self.cameras[camera_id] = camera
+            if previous is not None:
+                self._stopping.append(previous)
+        if previous is not None:
+            self._stop_camera(previous)
+        if self.running:
+            camera.start()
+        logging.info(f"Camera {camera_id} added to the embedded pipeline")
+
+    def remove_camera(self, camera_id: str) -> bool:
+        with self._lock:
+            camera = self.cameras.pop(str(camera_id), None)
+            if camera is not None:
+                self._stopping.append(camera)
+        if camera is None:
+            return False
+        self._stop_camera(camera)
+        return True
+
+    def _stop_camera(self, camera) -> None:
+        camera.stop()
+        if camera.is_alive():
+            camera.join(timeout=5)
+        self._retire(camera)
+
+    def _retire(self, camera) -> None:
+        """Folds a stopped camera's counters into the totals and drops the camera with its frames."""
+        if camera.ident is None:
+            camera.frame_store.close()  # never started, so its loop did not close it
+        self._observe_capture_latencies([camera])
+        counts = self._camera_counts([camera])
+        with self._lock:
+            for name, value in counts.items():
+                self._stopped_counts[name] += value
+            if camera in self._stopping:
+                self._stopping.remove(camera)
+
+    @staticmethod
+    def _camera_counts(cameras: List[Any]) -> Dict[str, int]:
+        return {
+            "decoded": sum(camera.capture_stats().get("grabbed", camera.frames_read) for camera in cameras),
+            "capture": sum(camera.frames_published for camera in cameras),
+            "capture_dropped": sum(camera.frames_dropped for camera in cameras),
+        }
+
+    def _observe_capture_latencies(self, cameras: List[Any]) -> None:
+        """Moves the read-to-publish latencies the cameras collected into the metrics."""
+        with self._latency_lock:
+            for camera in cameras:
+                latencies, camera.capture_latencies = camera.capture_latencies, []
+                if self.metrics is not None:
+                    self.metrics.observe_many(("capture", seconds) for seconds in latencies)
+
+    def _collect_capture_latencies(self) -> None:
+        while not self._stopped.wait(CAPTURE_LATENCY_INTERVAL):
+            with self._lock:
+                cameras = list(self.cameras.values()) + self._stopping
+            self._observe_capture_latencies(cameras)
+
+    # Lifecycle
+
+    def start(self) -> None:
+        self.running = True
+        self._stopped.clear()
+        for thread in self.threads:
+            thread.start()
+        threading.Thread(target=self._collect_capture_latencies, name="capture-latencies", daemon=True).start()
+        if self.rate_controller is not None:
+            self.rate_controller.start()
+        with self._lock:
+            cameras = list(self.cameras.values())
+        for camera in cameras:
+            camera.start()
+
+    def stop(self, drain_timeout: float = 30.0) -> bool:
+        """Stops capture, lets the queued frames finish, then stops the stages.
+
+        Returns False if the queues did not drain within ``drain_timeout``.
+        """
+        self.running = False
+        with self._lock:
+            cameras, self.cameras = list(self.cameras.values()), {}
+            self._stopping.extend(cameras)
+        for camera in cameras:
+            camera.stop()
+        for camera in cameras:
+            if camera.is_alive():
+                camera.join(timeout=5)
+            self._retire(camera)
+        self._stopped.set()
+        drained = self.broker.wait_idle(timeout=drain_timeout, queues=list(QUEUES))
+        if self.rate_controller is not None:
+            self.rate_controller.stop()
+        self.broker.close()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.database.close()
+        return drained
+
+    def counters(self) -> Dict[str, int]:
+        """Frames or messages handled so far by each stage."""
+        consumed = self.broker.stats()["consumed"]
+        with self._lock:
+            cameras = list(self.cameras.values()) + self._stopping
+            stopped = dict(self._stopped_counts)
+        self._observe_capture_latencies(cameras)
+        counts = self._camera_counts(cameras)
+        return {
+            **{name: stopped[name] + value for name, value in counts.items()},
+            "detection": sum(self.batcher.stats.frames.values()),
+            "detection_stale": self.batcher.stale_dropped,
+            "ocr": consumed.get("detection_results", 0),
+            "validation": consumed.get("ocr_results", 0),
+            "database": consumed.get("validated_results", 0),
+        }
@@ -0,0 +1,87 @@
+# ocr_service/benchmark.py
+"""Compares per-ROI OCR latency of the pytesseract subprocess path and the engine pool.
+
+Usage: python benchmark.py [--rois crops_dir] [--iterations 200] [--engines 2]
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+from typing import Callable, List
+
+import cv2
+import numpy as np
+
+import config
+from ocr_processor import EnginePool, SubprocessEngine, TesseractEngine
+
+
+def load_rois(rois_dir: str) -> List[np.ndarray]:
+    """Loads ROI crops from a directory, or renders synthetic container codes."""
+    if rois_dir:
+        rois = [cv2.imread(path) for path in sorted(glob.glob(os.path.join(rois_dir, "*")))]
+        rois = [roi for roi in rois if roi is not None]
+        if not rois:
+            raise SystemExit(f"No images found in {rois_dir}")
+        return rois
+
+    rois = []
+    for code in ("MSCU1234565", "TGHU4927710", "CSQU3054383", "MAEU8177870"):
+        roi = np.full((60, 420, 3), 255, dtype=np.uint8)
+        cv2.putText(roi, code, (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (0, 0, 0), 3)
+        rois.append(roi)
+    return rois
+
+
+def time_per_roi(recognize: Callable[[np.ndarray], str], rois: List[np.ndarray],
+                 iterations: int) -> List[float]:
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        recognize(rois[i % len(rois)])
+        timings.append(1000 * (time.perf_counter() - start))
+    return timings
+
+
+def summarize(name: str, timings: List[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(0.95 * (len(timings) - 1))]
+    print(f"{name:>22} {statistics.mean(timings):>9.2f} {statistics.median(timings):>9.2f} {p95:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rois", default="", help="directory of ROI crop images")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--engines", type=int, default=config.OCR_ENGINES)
+    args = parser.parse_args()
+
+    rois = load_rois(args.rois)
+    engine_args = (config.TESSDATA_DIR, config.OCR_LANG, config.OCR_PSM)
+
+    print(f"{'path':>22} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    summarize("pytesseract subprocess",
+              time_per_roi(SubprocessEngine(*engine_args).recognize, rois, args.iterations))
+
+    engine = TesseractEngine(*engine_args)
+    engine.recognize(rois[0])  # warm-up
+    summarize("in-process engine", time_per_roi(engine.recognize, rois, args.iterations))
+    engine.close()
+
+    # Frame-level throughput: all ROIs of a frame recognized in parallel by the pool
+    pool = EnginePool(args.engines, *engine_args)
+    frame_rois = [rois[i % len(rois)] for i in range(8)]
+    pool.recognize_many(frame_rois)  # warm-up
+    start = time.perf_counter()
+    frames = max(1, args.iterations // len(frame_rois))
+    for _ in range(frames):
+        pool.recognize_many(frame_rois)
+    elapsed = time.perf_counter() - start
+    print(f"engine pool ({args.engines} engines): "
+          f"{1000 * elapsed / (frames * len(frame_rois)):.2f} ms/ROI effective over {frames} frames of 8 ROIs")
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# ocr_service/config.py
+import os
+
+# Directory holding cntr.traineddata
+TESSDATA_DIR = os.path.dirname(os.path.abspath(__file__))
+OCR_LANG = "cntr"
+# Tesseract page segmentation mode (3 = fully automatic, Tesseract's default)
+OCR_PSM = 3
+
+# Persistent Tesseract engines per OCR process; ROIs of a frame are
+# recognized on this many threads in parallel.
+OCR_ENGINES = 2
+# Page segmentation mode for vertically stacked codes (5 = vertical block of text)
+OCR_PSM_VERTICAL = 5
+
+# ROI preprocessing before recognition (see ocr_processor.RoiPreprocessor)
+PREPROCESS_ENABLED = True
+PREPROCESS = {
+    "target_height": 48,  # glyph height in pixels after scaling
+    "block_size": 31,  # adaptive threshold neighbourhood
+    "c": 10,  # adaptive threshold offset
+    "vertical_ratio": 1.8,  # height/width above which a ROI is a vertical code strip
+    "deskew": True,
+    "max_skew": 15.0,  # degrees; larger estimates are ignored
+}
+
+# Multi-object tracking (see tracker.py): detections are grouped into tracks
+# per camera and each track is OCR'd once, from its best crops, when it ends.
+TRACKING_ENABLED = True
+TRACKER = {
+    "iou_threshold": 0.3,  # minimum IoU between a predicted track box and a detection
+    "max_age_seconds": 1.5,  # a track ends after this long without a matching detection
+    "min_hits": 3,  # shorter tracks are treated as spurious and dropped
+    "crops_per_track": 3,  # best crops kept per track, ranked by sharpness x size
+}
+# How often tracks of idle cameras are checked for expiry
+TRACK_EXPIRY_INTERVAL_SECONDS = 0.5
+# Frames reach OCR up to the detection staleness budget late, so the timer
+# only expires tracks against a clock held back by this much.
+TRACK_EXPIRY_DELAY_SECONDS = 2.0
+
+# Unacknowledged detection results buffered from RabbitMQ
+PREFETCH_COUNT = 20
+
+# Per-stage latency percentiles in Prometheus format on http://localhost:<port>/metrics
+METRICS_PORT = 9103
@@ -1,13 +1,23 @@
-import pika
-import pytesseract
-import cv2
-import numpy as np
 import json
 import socketio
 import eventlet
 import logging
 import os
 import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import config
+import message_queue
+from ocr_processor import EnginePool, RoiPreprocessor
+from tracker import MultiCameraTracker, fuse_reads
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.frame_store import FrameStoreReader
+from common.metrics import StageMetrics
+from common.models import (OCR_END, OCR_RECEIVED, OCR_START, Envelope, decode, decode_detections, is_cropped,
+                           results_message, stamp, to_cropped_frame, trace_spans)
 
 # Configure logging (if you haven't already)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,68 +26,174 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 sio = socketio.Server(cors_allowed_origins='*')
 app = socketio.WSGIApp(sio)
 
+
+class OcrStage:
+    """Recognizes container codes in detected regions and publishes the reads.
+
+    With a tracker, detections are grouped into tracks and each track is
+    OCR'd once, from its best crops, when it ends; otherwise every frame's
+    detections are OCR'd as they arrive.
+    """
+
+    def __init__(self, frame_reader: FrameStoreReader, engine_pool: EnginePool,
+                 preprocessor: Optional[RoiPreprocessor] = None, tracker: Optional[MultiCameraTracker] = None,
+                 metrics: Optional[StageMetrics] = None, on_results: Optional[Callable[[List[Dict]], None]] = None):
+        self.frame_reader = frame_reader
+        self.engine_pool = engine_pool
+        self.preprocessor = preprocessor
+        self.tracker = tracker
+        self.metrics = metrics
+        self.on_results = on_results
+        # Tracked results carry the trace of their camera's latest frame
+        self.latest_frames: Dict[str, Envelope] = {}
+
+    def recognize(self, frame, boxes) -> List[str]:
+        # Extract and normalize detected regions, then OCR them with the trained model
+        if self.preprocessor is not None:
+            prepared = self.preprocessor.process(frame, boxes)
+            rois = [roi.image for roi in prepared]
+            psms = [config.OCR_PSM_VERTICAL if roi.vertical else None for roi in prepared]
+        else:
+            rois = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+            psms = None
+        return self.engine_pool.recognize_many(rois, psms)
+
+    def publish(self, ch, message: Envelope, ocr_results: List[Dict]) -> None:
+        # Send OCR results to validation and to the frontend via websocket
+        if self.metrics is not None:
+            self.metrics.observe_many(trace_spans(message.ts, message.trace)[-3:])
+        ch.basic_publish(exchange='', routing_key='ocr_results', body=results_message(
+            message.camera_id, message.frame_seq, message.ts, ocr_results, message.trace))
+        if self.on_results is not None:
+            self.on_results(ocr_results)
+        logging.info(f"OCR results published ({len(ocr_results)}).")
+
+    def recognize_track(self, track) -> Dict:
+        """OCRs a track's kept crops and fuses them into one result."""
+        crops = track.best_crops()
+        texts = []
+        for _, crop, _, _ in crops:
+            texts.extend(self.recognize(crop, [[0, 0, crop.shape[1], crop.shape[0]]]))
+        reads = [(text, quality) for text, (quality, _, _, _) in zip(texts, crops)]
+        _, _, best_detection, best_seq = crops[0]
+        return {
+            "camera_id": track.camera_id,
+            "track_id": track.track_id,
+            "frame_seq": best_seq,
+            "box": best_detection["box"],
+            "confidence": track.confidence,
+            "class": track.class_id,
+            "text": fuse_reads(reads),
+            "reads": texts,
+            "first_seen": track.first_seen,
+            "last_seen": track.last_seen,
+            "frames": track.hits,
+        }
+
+    def publish_tracks(self, ch, tracks) -> None:
+        """OCRs the kept crops of finished tracks and publishes one fused read per track."""
+        if not tracks:
+            return
+        by_camera = {}
+        for track in tracks:
+            by_camera.setdefault(track.camera_id, []).append(track)
+        for camera_id, camera_tracks in by_camera.items():
+            message = stamp(self.latest_frames[camera_id], OCR_START)
+            ocr_results = [self.recognize_track(track) for track in camera_tracks]
+            self.publish(ch, stamp(message, OCR_END), ocr_results)
+
+    def on_message(self, ch, method, properties, body) -> None:
+        try:
+            # Decode detection results and look up the frame they were computed on
+            message = stamp(decode(body), OCR_RECEIVED)
+            camera_id = message.camera_id
+            frame_seq = message.frame_seq
+            detections = decode_detections(message)
+            # Boxes are in camera-frame pixels; "roi" is where they are in the stored, possibly cropped, frame.
+            cropped = is_cropped(message)
+            for detection in detections:
+                detection["roi"] = to_cropped_frame(message, detection["box"]) if cropped else detection["box"]
+
+            frame = self.frame_reader.get(camera_id, frame_seq)
+            if frame is None:
+                logging.warning(f"Frame {frame_seq} of camera {camera_id} is no longer available for OCR.")
+            elif self.tracker is not None:
+                # Only the best crops are kept; OCR runs when the track ends.
+                self.latest_frames[camera_id] = message
+                finished = self.tracker.update(camera_id, message.ts or time.time(), detections, frame, frame_seq)
+                if not self.frame_reader.is_current(camera_id, frame_seq):
+                    logging.warning(f"Frame {frame_seq} of camera {camera_id} was overwritten during tracking.")
+                self.publish_tracks(ch, finished)
+            else:
+                message = stamp(message, OCR_START)
+                texts = self.recognize(frame, [detection["roi"] for detection in detections])
+                message = stamp(message, OCR_END)
+
+                ocr_results = []
+                for detection, text in zip(detections, texts):
+                    ocr_result = {
+                        "camera_id": camera_id,
+                        "frame_seq": frame_seq,
+                        "box": detection["box"],
+                        "confidence": detection["confidence"],
+                        "class": detection["class"],
+                        "text": text
+                    }
+                    ocr_results.append(ocr_result)
+
+                if not self.frame_reader.is_current(camera_id, frame_seq):
+                    logging.warning(f"Frame {frame_seq} of camera {camera_id} was overwritten during OCR.")
+                else:
+                    self.publish(ch, message, ocr_results)
+
+        except Exception as e:
+            logging.error(f"Error processing detection results: {e}")
+
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    def expire_tracks(self, ch, now: float) -> None:
+        """Finishes tracks on cameras that stopped sending frames."""
+        if self.tracker is not None:
+            self.publish_tracks(ch, self.tracker.expire(now - config.TRACK_EXPIRY_DELAY_SECONDS))
+
+    def run(self, consumer) -> None:
+        """Consumes detection results on the calling thread until the consumer stops."""
+        if self.tracker is not None:
+            def on_expiry_timer():
+                try:
+                    self.expire_tracks(consumer, time.time())
+                except Exception as e:
+                    logging.error(f"Error finishing expired tracks: {e}")
+                consumer.call_later(config.TRACK_EXPIRY_INTERVAL_SECONDS, on_expiry_timer)
+
+            consumer.call_later(config.TRACK_EXPIRY_INTERVAL_SECONDS, on_expiry_timer)
+        consumer.consume(self.on_message)
+
+
+def create_stage(metrics: Optional[StageMetrics] = None, **kwargs) -> OcrStage:
+    """Builds the OCR stage from config."""
+    return OcrStage(
+        FrameStoreReader(),
+        EnginePool(config.OCR_ENGINES, config.TESSDATA_DIR, config.OCR_LANG, config.OCR_PSM),
+        RoiPreprocessor(**config.PREPROCESS) if config.PREPROCESS_ENABLED else None,
+        MultiCameraTracker(**config.TRACKER) if config.TRACKING_ENABLED else None,
+        metrics, **kwargs)
+
+
 def main():
     print("OCR Service started.")
 
     try:
-        # RabbitMQ connection
-        connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
-        channel = connection.channel()
-        channel.queue_declare(queue='detection_results')
-        channel.queue_declare(queue='video_frames')
-
-        def callback(ch, method, properties, body):
-            try:
-                # Decode detection results
-                detections = json.loads(body)
-
-                # Get frame from RabbitMQ video_frames queue
-                frame_channel = connection.channel()
-                method_frame, properties_frame, frame_body = frame_channel.basic_get(queue='video_frames', auto_ack=True)
-
-                if frame_body:
-                    # Decode JPEG frame
-                    img_np = np.frombuffer(frame_body, np.uint8)
-                    frame = cv2.imdecode(img_np, cv2.IMREAD_COLOR)
-
-                    ocr_results = []
-                    for detection in detections:
-                        box = detection["box"]
-                        confidence = detection["confidence"]
-                        class_id = detection["class"]
-
-                        # Extract detected region
-                        x1, y1, x2, y2 = box
-                        roi = frame[y1:y2, x1:x2]
-
-                        # Perform OCR with the trained model
-                        script_dir = os.path.dirname(os.path.abspath(__file__))
-                        tessdata_dir_config = r'--tessdata-dir "' + script_dir + r'"'
-                        text = pytesseract.image_to_string(roi, lang='cntr', config=tessdata_dir_config)
-
-                        ocr_result = {
-                            "camera_id": "camera1",  # Consistent camera_id
-                            "box": box,
-                            "confidence": confidence,
-                            "class": class_id,
-                            "text": text.strip(),
-                            "frame": img_base64  # Add base64 frame (if needed for debugging)
-                        }
-                        ocr_results.append(ocr_result)
-
-                        # Send OCR result to frontend via websocket
-                        sio.emit('ocr_results', json.dumps(ocr_results))  # Send array of results
-
-                    logging.info("OCR results published to websocket.")
-                else:
-                    logging.warning("No frame available for OCR.")
-
-            except Exception as e:
-                logging.error(f"Error processing detection results: {e}")
+        metrics = StageMetrics("ocr")
+        metrics.serve(config.METRICS_PORT)
+        stage = create_stage(metrics, on_results=lambda ocr_results: sio.emit('ocr_results', json.dumps(ocr_results)))
 
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+        def consume():
+            # Deliveries and timers are dispatched on this thread; the
+            # websocket server owns the main thread.
+            stage.run(message_queue.connect().consumer('detection_results', prefetch=config.PREFETCH_COUNT))
 
-        channel.basic_consume(queue='detection_results', on_message_callback=callback)
+        threading.Thread(target=consume, daemon=True).start()
 
         print('Waiting for detection results. To exit press CTRL+C')
         eventlet.wsgi.server(eventlet.listen(('0.0.0.0', 5000)), app)
@@ -87,4 +203,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,14 @@
+# ocr_service/message_queue.py
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.message_queue_client import MessageQueueClient, get_client
+
+
+def connect() -> MessageQueueClient:
+    """Returns this process's broker client with the OCR service's queues declared."""
+    client = get_client()
+    client.declare_queue('detection_results')
+    client.declare_queue('ocr_results')
+    return client
@@ -0,0 +1,212 @@
+# ocr_service/ocr_processor.py
+"""OCR engine layer for container-code ROIs.
+
+``TesseractEngine`` keeps an initialized Tesseract API handle (via
+tesserocr) with the ``cntr`` model loaded once, and feeds it numpy pixels
+directly. ``EnginePool`` holds several of them so the ROIs of a frame are
+recognized in parallel; tesserocr releases the GIL while recognizing.
+``SubprocessEngine`` is the old pytesseract path, kept as a fallback and as
+the benchmark baseline.
+
+``RoiPreprocessor`` normalizes all ROIs of a frame before recognition:
+grayscale, scaling to a target glyph height, polarity correction,
+adaptive binarization and deskew.
+"""
+import logging
+import math
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+
+import cv2
+import numpy as np
+
+
+class SubprocessEngine:
+    """Runs one tesseract process per ROI through pytesseract."""
+
+    def __init__(self, tessdata_dir: str, lang: str, psm: int):
+        import pytesseract
+
+        self.pytesseract = pytesseract
+        self.lang = lang
+        self.psm = psm
+        self.config = f'--tessdata-dir "{tessdata_dir}"'
+
+    def recognize(self, roi: np.ndarray, psm: Optional[int] = None) -> str:
+        config = f"{self.config} --psm {psm or self.psm}"
+        return self.pytesseract.image_to_string(roi, lang=self.lang, config=config).strip()
+
+
+class TesseractEngine:
+    """A persistent in-process Tesseract API handle."""
+
+    def __init__(self, tessdata_dir: str, lang: str, psm: int):
+        import tesserocr
+
+        self.api = tesserocr.PyTessBaseAPI(path=tessdata_dir, lang=lang, psm=psm)
+        self.psm = psm
+        self.current_psm = psm
+
+    def recognize(self, roi: np.ndarray, psm: Optional[int] = None) -> str:
+        if roi.size == 0:
+            return ""
+        psm = psm or self.psm
+        if psm != self.current_psm:
+            self.api.SetPageSegMode(psm)
+            self.current_psm = psm
+        roi = np.ascontiguousarray(roi)
+        height, width = roi.shape[:2]
+        bytes_per_pixel = roi.shape[2] if roi.ndim == 3 else 1
+        self.api.SetImageBytes(roi.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+        return self.api.GetUTF8Text().strip()
+
+    def close(self) -> None:
+        self.api.End()
+
+
+class EnginePool:
+    """A fixed set of OCR engines shared by the worker threads of one process."""
+
+    def __init__(self, size: int, tessdata_dir: str, lang: str, psm: int):
+        try:
+            engines = [TesseractEngine(tessdata_dir, lang, psm) for _ in range(size)]
+            logging.info(f"Loaded {size} in-process Tesseract engines ({lang})")
+        except ImportError:
+            logging.warning("tesserocr is not installed; falling back to one tesseract process per ROI")
+            engines = [SubprocessEngine(tessdata_dir, lang, psm) for _ in range(size)]
+        self.size = size
+        self._engines: "queue.Queue" = queue.Queue()
+        for engine in engines:
+            self._engines.put(engine)
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="ocr")
+
+    @contextmanager
+    def engine(self) -> Iterator:
+        """Borrows an engine for the duration of a ``with`` block."""
+        engine = self._engines.get()
+        try:
+            yield engine
+        finally:
+            self._engines.put(engine)
+
+    def recognize(self, roi: np.ndarray, psm: Optional[int] = None) -> str:
+        with self.engine() as engine:
+            return engine.recognize(roi, psm)
+
+    def recognize_many(self, rois: List[np.ndarray], psms: Optional[Sequence[Optional[int]]] = None) -> List[str]:
+        """Recognizes the ROIs of one frame in parallel, preserving order."""
+        psms = psms or [None] * len(rois)
+        if len(rois) <= 1:
+            return [self.recognize(roi, psm) for roi, psm in zip(rois, psms)]
+        return list(self._executor.map(self.recognize, rois, psms))
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        while not self._engines.empty():
+            engine = self._engines.get_nowait()
+            if hasattr(engine, "close"):
+                engine.close()
+
+
+class PreparedRoi(NamedTuple):
+    image: np.ndarray  # binarized, dark glyphs on a white background
+    vertical: bool  # characters stacked top to bottom
+    inverted: bool  # the original was light text on a dark background
+    skew: float  # degrees of rotation that were corrected
+
+
+class RoiPreprocessor:
+    """Normalizes every ROI of a frame in one batch before recognition.
+
+    The frame is converted to grayscale once. Each ROI is scaled so its
+    glyphs are ``target_height`` pixels tall, then all of them are packed
+    into one canvas. Polarity inversion and adaptive thresholding run once
+    over the whole canvas, and each ROI is then cut back out and deskewed.
+    """
+
+    def __init__(self, target_height: int = 48, block_size: int = 31, c: int = 10,
+                 vertical_ratio: float = 1.8, deskew: bool = True, max_skew: float = 15.0):
+        self.target_height = target_height
+        self.block_size = block_size | 1  # adaptiveThreshold needs an odd block size
+        self.c = c
+        self.vertical_ratio = vertical_ratio
+        self.deskew = deskew
+        self.max_skew = max_skew
+
+    def _scale(self, roi: np.ndarray, vertical: bool) -> np.ndarray:
+        height, width = roi.shape[:2]
+        # Glyph size follows the strip's short side: its height for a
+        # horizontal code, its width for a vertically stacked one.
+        scale = self.target_height / (width if vertical else height)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+        return cv2.resize(roi, size, interpolation=interpolation)
+
+    @staticmethod
+    def _is_light_on_dark(roi: np.ndarray) -> bool:
+        # The border ring is mostly background; text on a dark plate makes the
+        # interior brighter than its border.
+        border = np.concatenate([roi[0], roi[-1], roi[:, 0], roi[:, -1]])
+        return float(border.mean()) < float(roi.mean())
+
+    def _skew_angle(self, binary: np.ndarray, vertical: bool) -> float:
+        ys, xs = np.nonzero(binary == 0)
+        if len(xs) < 20:
+            return 0.0
+        xs = xs - xs.mean()
+        ys = ys - ys.mean()
+        # Principal axis of the glyph pixels is the text direction.
+        angle = 0.5 * math.degrees(math.atan2(2 * (xs * ys).mean(), (xs * xs).mean() - (ys * ys).mean()))
+        if vertical:
+            angle = angle - 90 if angle > 0 else angle + 90
+        return angle if abs(angle) <= self.max_skew else 0.0
+
+    @staticmethod
+    def _rotate(binary: np.ndarray, angle: float) -> np.ndarray:
+        height, width = binary.shape
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        return cv2.warpAffine(binary, matrix, (width, height), flags=cv2.INTER_NEAREST,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+
+    def process(self, frame: np.ndarray, boxes: Sequence[Sequence[int]]) -> List[PreparedRoi]:
+        """Returns one prepared ROI per ``[x1, y1, x2, y2]`` box of the frame."""
+        if not len(boxes):
+            return []
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        pad = self.block_size
+
+        pieces, vertical, inverted = [], [], []
+        for x1, y1, x2, y2 in boxes:
+            roi = gray[max(0, y1):y2, max(0, x1):x2]
+            if roi.size == 0:
+                roi = np.full((1, 1), 255, dtype=np.uint8)
+            is_vertical = roi.shape[0] > self.vertical_ratio * roi.shape[1]
+            roi = self._scale(roi, is_vertical)
+            vertical.append(is_vertical)
+            inverted.append(self._is_light_on_dark(roi))
+            # Replicated borders keep the neighbourhood statistics of each ROI
+            # separate from its neighbours on the shared canvas.
+            pieces.append(cv2.copyMakeBorder(roi, pad, pad, pad, pad, cv2.BORDER_REPLICATE))
+
+        canvas_width = max(piece.shape[1] for piece in pieces)
+        offsets = np.cumsum([0] + [piece.shape[0] for piece in pieces])
+        canvas = np.full((offsets[-1], canvas_width), 255, dtype=np.uint8)
+        for piece, top in zip(pieces, offsets):
+            canvas[top:top + piece.shape[0], :piece.shape[1]] = piece
+
+        invert_rows = np.repeat(np.array(inverted), np.diff(offsets))
+        canvas[invert_rows] = 255 - canvas[invert_rows]
+        binary = cv2.adaptiveThreshold(canvas, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv2.THRESH_BINARY, self.block_size, self.c)
+
+        prepared = []
+        for piece, top, is_vertical, is_inverted in zip(pieces, offsets, vertical, inverted):
+            height, width = piece.shape
+            roi = binary[top + pad:top + height - pad, pad:width - pad]
+            angle = self._skew_angle(roi, is_vertical) if self.deskew else 0.0
+            if abs(angle) >= 0.5:
+                roi = self._rotate(roi, angle)
+            prepared.append(PreparedRoi(np.ascontiguousarray(roi), is_vertical, is_inverted, angle))
+        return prepared
@@ -0,0 +1,212 @@
+# ocr_service/tracker.py
+"""Per-camera multi-object tracking of detected containers.
+
+Detections are associated across frames by IoU against Kalman-predicted
+boxes, so a container passing the gate becomes one track instead of
+hundreds of independent detections. Each track keeps only its best few
+crops (by sharpness and size); OCR runs on those once the track ends and
+the reads are fused into a single result.
+"""
+import heapq
+import itertools
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+def box_iou(boxes: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy box arrays."""
+    lt = np.maximum(boxes[:, None, :2], others[None, :, :2])
+    rb = np.minimum(boxes[:, None, 2:], others[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    other_area = np.prod(others[:, 2:] - others[:, :2], axis=1)
+    return inter / (area[:, None] + other_area[None, :] - inter + 1e-9)
+
+
+class KalmanBoxFilter:
+    """Constant-velocity Kalman filter over box centre and size."""
+
+    _H = np.hstack([np.eye(4), np.zeros((4, 4))])
+
+    def __init__(self, box: Sequence[float], position_noise: float = 1.0, velocity_noise: float = 0.01):
+        x1, y1, x2, y2 = box
+        self.x = np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1, 0, 0, 0, 0], dtype=np.float64)
+        size = max(self.x[2], self.x[3])
+        # Velocities start unknown, so their variance is much larger.
+        self.P = np.diag([size] * 4 + [10 * size] * 4)
+        self.position_noise = position_noise
+        self.velocity_noise = velocity_noise
+
+    def predict(self, dt: float) -> np.ndarray:
+        F = np.eye(8)
+        F[:4, 4:] = dt * np.eye(4)
+        scale = max(self.x[2], self.x[3], 1.0)
+        Q = np.diag([self.position_noise * scale] * 4 + [self.velocity_noise * scale] * 4) * max(dt, 1e-3)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + Q
+        return self.box()
+
+    def update(self, box: Sequence[float]) -> None:
+        x1, y1, x2, y2 = box
+        z = np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+        R = np.eye(4) * max(z[2], z[3], 1.0) * 0.05
+        S = self._H @ self.P @ self._H.T + R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - self._H @ self.x)
+        self.P = (np.eye(8) - K @ self._H) @ self.P
+
+    def box(self) -> np.ndarray:
+        cx, cy, w, h = self.x[:4]
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+
+def crop_quality(crop: np.ndarray) -> float:
+    """Scores a crop by sharpness (variance of the Laplacian) weighted by its area."""
+    if crop.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return float(sharpness * np.sqrt(gray.shape[0] * gray.shape[1]))
+
+
+class Track:
+    """One container followed across frames, holding its best crops."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, camera_id: str, detection: Dict, ts: float, max_crops: int):
+        self.track_id = next(self._ids)
+        self.camera_id = camera_id
+        self.filter = KalmanBoxFilter(detection["box"])
+        self.first_seen = ts
+        self.last_seen = ts
+        self.hits = 0
+        self.max_crops = max_crops
+        self.class_votes: Counter = Counter()
+        self.confidence = 0.0
+        # Min-heap of (quality, sequence, crop, detection, frame_seq)
+        self.crops: List[Tuple[float, int, np.ndarray, Dict, int]] = []
+        self._crop_seq = itertools.count()
+
+    def add(self, detection: Dict, ts: float, frame: np.ndarray, frame_seq: int) -> None:
+        self.filter.update(detection["box"])
+        self.last_seen = ts
+        self.hits += 1
+        self.class_votes[detection["class"]] += 1
+        self.confidence = max(self.confidence, detection["confidence"])
+
+        # "roi" locates the box in a frame cropped to the camera's detection zones
+        x1, y1, x2, y2 = detection.get("roi", detection["box"])
+        view = frame[max(0, y1):y2, max(0, x1):x2]
+        quality = crop_quality(view)
+        if len(self.crops) < self.max_crops:
+            heapq.heappush(self.crops, (quality, next(self._crop_seq), view.copy(), detection, frame_seq))
+        elif quality > self.crops[0][0]:
+            heapq.heapreplace(self.crops, (quality, next(self._crop_seq), view.copy(), detection, frame_seq))
+
+    def best_crops(self) -> List[Tuple[float, np.ndarray, Dict, int]]:
+        """Returns the kept crops, best first."""
+        return [(q, crop, det, seq) for q, _, crop, det, seq in sorted(self.crops, key=lambda c: -c[0])]
+
+    @property
+    def class_id(self) -> int:
+        return self.class_votes.most_common(1)[0][0]
+
+
+class CameraTracker:
+    """Greedy IoU association of detections to Kalman-predicted tracks for one camera."""
+
+    def __init__(self, camera_id: str, iou_threshold: float = 0.3, max_age_seconds: float = 1.5,
+                 min_hits: int = 3, crops_per_track: int = 3):
+        self.camera_id = camera_id
+        self.iou_threshold = iou_threshold
+        self.max_age_seconds = max_age_seconds
+        self.min_hits = min_hits
+        self.crops_per_track = crops_per_track
+        self.tracks: List[Track] = []
+        self.last_ts: Optional[float] = None
+
+    def update(self, ts: float, detections: List[Dict], frame: np.ndarray, frame_seq: int) -> List[Track]:
+        """Associates one frame's detections and returns tracks that just finished."""
+        dt = 0.0 if self.last_ts is None else max(0.0, ts - self.last_ts)
+        self.last_ts = ts
+        predicted = np.array([track.filter.predict(dt) for track in self.tracks]).reshape(-1, 4)
+
+        unmatched = set(range(len(detections)))
+        if len(self.tracks) and detections:
+            boxes = np.array([detection["box"] for detection in detections], dtype=np.float64)
+            iou = box_iou(predicted, boxes)
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                t, d = np.unravel_index(flat, iou.shape)
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if d not in unmatched or self.tracks[t].last_seen == ts:
+                    continue
+                self.tracks[t].add(detections[d], ts, frame, frame_seq)
+                unmatched.discard(d)
+
+        for d in sorted(unmatched):
+            track = Track(self.camera_id, detections[d], ts, self.crops_per_track)
+            track.add(detections[d], ts, frame, frame_seq)
+            self.tracks.append(track)
+        return self.expire(ts)
+
+    def expire(self, now: float) -> List[Track]:
+        """Removes tracks unseen for max_age_seconds; returns those confirmed by min_hits."""
+        finished = [track for track in self.tracks if now - track.last_seen > self.max_age_seconds]
+        if finished:
+            self.tracks = [track for track in self.tracks if now - track.last_seen <= self.max_age_seconds]
+        return [track for track in finished if track.hits >= self.min_hits]
+
+
+class MultiCameraTracker:
+    """Keeps one CameraTracker per camera."""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self.cameras: Dict[str, CameraTracker] = {}
+
+    def update(self, camera_id: str, ts: float, detections: List[Dict],
+               frame: np.ndarray, frame_seq: int) -> List[Track]:
+        tracker = self.cameras.get(camera_id)
+        if tracker is None:
+            tracker = self.cameras[camera_id] = CameraTracker(camera_id, **self.settings)
+        return tracker.update(ts, detections, frame, frame_seq)
+
+    def expire(self, now: float) -> List[Track]:
+        """Finishes stale tracks on every camera, including cameras that stopped sending frames."""
+        finished = []
+        for tracker in self.cameras.values():
+            finished.extend(tracker.expire(now))
+        return finished
+
+
+def fuse_reads(reads: List[Tuple[str, float]]) -> str:
+    """Fuses several OCR reads of one container into a single string.
+
+    Reads are weighted (e.g. by crop quality). The most supported length
+    wins, then each character position is decided by weighted vote.
+    """
+    reads = [("".join(text.split()).upper(), weight) for text, weight in reads]
+    reads = [(text, weight) for text, weight in reads if text]
+    if not reads:
+        return ""
+    length_votes: Dict[int, float] = defaultdict(float)
+    for text, weight in reads:
+        length_votes[len(text)] += weight
+    length = max(length_votes, key=length_votes.get)
+
+    fused = []
+    for i in range(length):
+        votes: Dict[str, float] = defaultdict(float)
+        for text, weight in reads:
+            if len(text) == length:
+                votes[text[i]] += weight
+        fused.append(max(votes, key=votes.get))
+    result = "".join(fused)
+    logging.debug(f"Fused reads {[text for text, _ in reads]} into {result}")
+    return result
@@ -0,0 +1,64 @@
+# result_validation_service/benchmark.py
+"""Compares per-read validation with validate_batch, and times candidate correction.
+
+Usage: python benchmark.py [--reads 100000] [--noise 0.1]
+"""
+import argparse
+import random
+import time
+
+from validator import (CHAR_VALUES, calculate_check_digit, correct_container_number, default_registry,
+                       validate_batch, validate_container_number)
+
+OWNERS = ("MSC", "MAE", "CSQ", "TGH", "HLX", "CMA", "OOL", "EMC")
+CONFUSIONS = {"0": "O", "1": "I", "5": "S", "8": "B", "2": "Z", "6": "G"}
+
+
+def make_reads(count: int, noise: float, seed: int = 0) -> list:
+    """Generates valid container numbers with a share of them OCR-corrupted."""
+    rng = random.Random(seed)
+    reads = []
+    for _ in range(count):
+        code = rng.choice(OWNERS) + "U" + "".join(rng.choice("0123456789") for _ in range(6))
+        code += str(calculate_check_digit(code))
+        if rng.random() < noise:
+            i = rng.randrange(4, 11)
+            code = code[:i] + CONFUSIONS.get(code[i], rng.choice(list(CHAR_VALUES))) + code[i + 1:]
+        reads.append(code)
+    return reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reads", type=int, default=100000)
+    parser.add_argument("--noise", type=float, default=0.1, help="share of reads with one OCR error")
+    args = parser.parse_args()
+
+    reads = make_reads(args.reads, args.noise)
+    iso_types = ["22G1"] * len(reads)
+    registry = default_registry()
+
+    start = time.perf_counter()
+    looped = [validate_container_number(read) and iso_type in registry for read, iso_type in zip(reads, iso_types)]
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = validate_batch(reads, iso_types, registry)
+    batch_seconds = time.perf_counter() - start
+    assert batched.tolist() == looped
+
+    print(f"{len(reads)} reads, {int(batched.sum())} valid")
+    print(f"per-read loop:  {1e6 * loop_seconds / len(reads):.2f} us/read")
+    print(f"validate_batch: {1e6 * batch_seconds / len(reads):.2f} us/read")
+
+    invalid = [read for read, valid in zip(reads, batched) if not valid][:2000]
+    if invalid:
+        start = time.perf_counter()
+        corrected = sum(1 for read in invalid if correct_container_number(read))
+        elapsed = time.perf_counter() - start
+        print(f"correction: {corrected}/{len(invalid)} invalid reads corrected, "
+              f"{1e3 * elapsed / len(invalid):.3f} ms/read")
+
+
+if __name__ == "__main__":
+    main()
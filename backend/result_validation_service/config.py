@@ -0,0 +1,12 @@
+# result_validation_service/config.py
+
+# Check-digit-guided correction of OCR reads (see validator.correct_container_number)
+CORRECTION_MAX_COST = 0.5  # total confusion cost above which a read is rejected
+CORRECTION_MAX_CANDIDATES = 5  # ranked candidates attached to each result
+CORRECTION_MIN_MARGIN = 0.3  # a correction must be this much cheaper than the runner-up
+
+# Unacknowledged OCR results buffered from RabbitMQ
+PREFETCH_COUNT = 100
+
+# Per-stage latency percentiles in Prometheus format on http://localhost:<port>/metrics
+METRICS_PORT = 9104
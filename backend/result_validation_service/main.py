@@ -1,92 +1,76 @@
 # result_validation_service/main.py
-import pika
-import json
-import pandas as pd
+import logging
+import os
+import sys
+from typing import Optional
 
-def calculate_check_digit(container_code):
-    letter_values = {
-        'A': 10, 'B': 12, 'C': 13, 'D': 14, 'E': 15, 'F': 16, 'G': 17, 'H': 18, 'I': 19, 'J': 20,
-        'K': 21, 'L': 23, 'M': 24, 'N': 25, 'O': 26, 'P': 27, 'Q': 28, 'R': 29, 'S': 30, 'T': 31,
-        'U': 32, 'V': 34, 'W': 35, 'X': 36, 'Y': 37, 'Z': 38
-    }
+import config
+import message_queue
+from validator import SizeTypeRegistry, validate_results
 
-    values = []
-    for char in container_code:
-        if char.isalpha():
-            values.append(letter_values[char.upper()])
-        else:
-            values.append(int(char))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.metrics import StageMetrics
+from common.models import VALIDATION_END, VALIDATION_START, decode, decode_results, results_message, stamp, trace_spans
 
-    total = sum(val * (2 ** i) for i, val in enumerate(values))
-    check_digit = total % 11
-    if check_digit == 10:
-        check_digit = 0
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-    return check_digit
+class ValidationStage:
+    """Checks OCR reads against ISO 6346 and publishes them with a validity flag."""
 
-def validate_container_number(container_number):
-    if len(container_number) != 11:
-        return False
+    def __init__(self, registry: SizeTypeRegistry, metrics: Optional[StageMetrics] = None):
+        self.registry = registry
+        self.metrics = metrics
 
-    container_code = container_number[:-1]
-    expected_check_digit = int(container_number[-1])
-    calculated_check_digit = calculate_check_digit(container_code)
+    def on_message(self, ch, method, properties, body) -> None:
+        try:
+            # Decode OCR results
+            message = stamp(decode(body), VALIDATION_START)
+            ocr_results = decode_results(message)
 
-    return expected_check_digit == calculated_check_digit
+            validated_results = []
+            for result in ocr_results:
+                valid = validate_results(result, self.registry, config.CORRECTION_MAX_COST,
+                                         config.CORRECTION_MAX_CANDIDATES, config.CORRECTION_MIN_MARGIN)
+                result["valid"] = valid
+                validated_results.append(result)
 
-def validate_iso_type(iso_type, iso_types_df):
-    return iso_type in iso_types_df['code'].values
+            # Publish validated results to RabbitMQ
+            message = stamp(message, VALIDATION_END)
+            if self.metrics is not None:
+                self.metrics.observe_many(trace_spans(message.ts, message.trace)[-2:])
+            ch.basic_publish(exchange='', routing_key='validated_results', body=results_message(
+                message.camera_id, message.frame_seq, message.ts, validated_results, message.trace))
+            logging.info("Validated results published.")
 
-def validate_results(results, iso_types_df):
-    container_number = results['text'] # Assuming the extracted text is the container number
-    iso_type = results['text'] # Assuming the extracted text is the ISO type
+        except Exception as e:
+            logging.error(f"Error processing OCR results: {e}")
 
-    container_valid = validate_container_number(container_number)
-    iso_type_valid = validate_iso_type(iso_type, iso_types_df)
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+
+def create_stage(metrics: Optional[StageMetrics] = None) -> ValidationStage:
+    """Builds the validation stage with the bundled ISO size/type code table."""
+    registry = SizeTypeRegistry.load()
+    logging.info(f"Loaded {len(registry)} ISO size/type codes")
+    return ValidationStage(registry, metrics)
 
-    return container_valid and iso_type_valid
 
 def main():
     print("Result Validation Service started.")
 
     try:
-        # Load ISO types CSV (simulate for now)
-        iso_types_data = {'code': ['22B0', '22B1', '22B3']}
-        iso_types_df = pd.DataFrame(iso_types_data)
-
-        # RabbitMQ connection
-        connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
-        channel = connection.channel()
-        channel.queue_declare(queue='ocr_results')
-        channel.queue_declare(queue='validated_results')
-
-        def callback(ch, method, properties, body):
-            try:
-                # Decode OCR results
-                ocr_results = json.loads(body)
-
-                validated_results = []
-                for result in ocr_results:
-                    valid = validate_results(result, iso_types_df)
-                    result["valid"] = valid
-                    validated_results.append(result)
-
-                # Publish validated results to RabbitMQ
-                channel.basic_publish(exchange='', routing_key='validated_results', body=json.dumps(validated_results))
-                print("Validated results published.")
-
-            except Exception as e:
-                print(f"Error processing OCR results: {e}")
-
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+        metrics = StageMetrics("validation")
+        metrics.serve(config.METRICS_PORT)
+        stage = create_stage(metrics)
 
-        channel.basic_consume(queue='ocr_results', on_message_callback=callback)
+        # Shared RabbitMQ client
+        consumer = message_queue.connect().consumer('ocr_results', prefetch=config.PREFETCH_COUNT)
 
         print('Waiting for OCR results. To exit press CTRL+C')
-        channel.start_consuming()
+        consumer.consume(stage.on_message)
 
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logging.exception(f"An error occurred: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,46 +1,304 @@
 # validator.py
+"""ISO 6346 container number validation and check-digit-guided correction.
 
-import pandas as pd
+A container number is a three-letter owner code, a category identifier
+(U, J or Z), a six-digit serial number and a check digit. The check digit
+is the weighted sum of the first ten characters' values modulo 11 (10
+maps to 0). ``correct_container_number`` uses that redundancy to repair
+typical OCR confusions such as O/0, I/1, S/5 and B/8 where the layout
+shows a character is wrong (a letter in the serial number, a digit in the
+owner code). It returns ranked candidates; every candidate satisfies both
+the layout and the check digit. A read that fits the layout but fails the
+check digit is not corrected: any digit could be the wrong one, so the
+check digit would stop meaning anything.
 
-def calculate_check_digit(container_code):
-    letter_values = {
-        'A': 10, 'B': 12, 'C': 13, 'D': 14, 'E': 15, 'F': 16, 'G': 17, 'H': 18, 'I': 19, 'J': 20,
-        'K': 21, 'L': 23, 'M': 24, 'N': 25, 'O': 26, 'P': 27, 'Q': 28, 'R': 29, 'S': 30, 'T': 31,
-        'U': 32, 'V': 34, 'W': 35, 'X': 36, 'Y': 37, 'Z': 38
-    }
+``SizeTypeRegistry`` indexes the ISO size/type codes built from the bundled
+``iso_size_types.csv``, and ``validate_batch`` checks many container numbers
+at once with a vectorized check-digit computation.
+"""
+import csv
+import functools
+import heapq
+import math
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
 
-    values = []
-    for char in container_code:
-        if char.isalpha():
-            values.append(letter_values[char.upper()])
-        else:
-            values.append(int(char))
+import numpy as np
 
-    total = sum(val * (2 ** i) for i, val in enumerate(values))
-    check_digit = total % 11
-    if check_digit == 10:
-        check_digit = 0
+ISO_SIZE_TYPES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "iso_size_types.csv")
 
-    return check_digit
 
-def validate_container_number(container_number):
-    if len(container_number) != 11:
+def _letter_values() -> Dict[str, int]:
+    # Letters count from 10 upwards, skipping multiples of 11.
+    values, value = {}, 10
+    for letter in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+        if value % 11 == 0:
+            value += 1
+        values[letter] = value
+        value += 1
+    return values
+
+
+LETTER_VALUES = _letter_values()
+CHAR_VALUES = {**LETTER_VALUES, **{str(digit): digit for digit in range(10)}}
+WEIGHTS = tuple(2 ** i for i in range(10))
+
+CATEGORY_IDENTIFIERS = "UJZ"
+_LETTERS = frozenset(LETTER_VALUES)
+_DIGITS = frozenset("0123456789")
+# Allowed characters per position: owner code, category, serial number
+_LAYOUT = (_LETTERS,) * 3 + (frozenset(CATEGORY_IDENTIFIERS),) + (_DIGITS,) * 6
+CONTAINER_NUMBER_PATTERN = re.compile(r'^[A-Z]{3}[UJZ][0-9]{7}$')
+
+# Cost of reading the first character when the second one was printed.
+# Lower is a more common OCR confusion; pairs are symmetric. There are no
+# digit/digit pairs: a digit misread as another digit cannot be told apart
+# from a wrong check digit.
+CONFUSION_COSTS: Dict[Tuple[str, str], float] = {}
+for _a, _b, _cost in (
+        ('O', '0', 0.2), ('D', '0', 0.4), ('Q', '0', 0.4), ('U', '0', 0.7), ('C', '0', 0.7),
+        ('I', '1', 0.2), ('L', '1', 0.4), ('T', '1', 0.6), ('J', '1', 0.6),
+        ('Z', '2', 0.3), ('E', '3', 0.7), ('A', '4', 0.5), ('S', '5', 0.2),
+        ('G', '6', 0.3), ('B', '6', 0.7), ('T', '7', 0.6), ('Z', '7', 0.7), ('B', '8', 0.2), ('B', '3', 0.7),
+        ('U', 'V', 0.4), ('U', 'J', 0.6), ('O', 'D', 0.5), ('O', 'Q', 0.4), ('C', 'G', 0.5),
+        ('M', 'N', 0.6), ('H', 'N', 0.7), ('E', 'F', 0.5), ('P', 'R', 0.5), ('I', 'L', 0.6), ('I', 'J', 0.6)):
+    CONFUSION_COSTS[(_a, _b)] = CONFUSION_COSTS[(_b, _a)] = _cost
+
+# About one substitution forced by the layout
+DEFAULT_MAX_COST = 0.5
+DEFAULT_MAX_CANDIDATES = 5
+# A correction is only accepted this much cheaper than the runner-up
+DEFAULT_MIN_MARGIN = 0.3
+# Upper bound on explored substitution combinations per read
+MAX_EXPANSIONS = 5000
+
+
+class Candidate(NamedTuple):
+    code: str
+    cost: float  # sum of substitution costs; 0 means the read was already valid
+    score: float  # exp(-cost), in (0, 1]
+    substitutions: Tuple[Tuple[int, str, str], ...]  # (position, read, corrected)
+
+
+def _substitution_options(read: str, allowed: frozenset, forced_only: bool) -> List[Tuple[float, str]]:
+    """Characters a read character may stand for at a position, cheapest first.
+
+    With ``forced_only``, a character the position allows is taken as read.
+    """
+    if read in allowed and forced_only:
+        return [(0.0, read)]
+    options = [(0.0, read)] if read in allowed else []
+    options.extend((cost, char) for (seen, char), cost in CONFUSION_COSTS.items()
+                   if seen == read and char in allowed)
+    return sorted(options)
+
+
+# Precomputed substitution options for every character at every layout
+# position, and for the check digit, keyed by forced_only
+_OPTIONS = {forced_only: [{char: _substitution_options(char, allowed, forced_only) for char in CHAR_VALUES}
+                          for allowed in _LAYOUT]
+            for forced_only in (True, False)}
+_CHECK_DIGIT_COSTS = {forced_only: {char: dict((digit, cost) for cost, digit
+                                               in _substitution_options(char, _DIGITS, forced_only))
+                                    for char in CHAR_VALUES}
+                      for forced_only in (True, False)}
+
+
+def normalize(text: str) -> str:
+    """Upper-cases a read and drops everything but letters and digits."""
+    if text.isascii() and text.isalnum():
+        return text.upper()  # already clean; skips the regex
+    return re.sub(r'[^A-Z0-9]', '', text.upper())
+
+
+def calculate_check_digit(container_code: str) -> int:
+    """Computes the ISO 6346 check digit of the first ten characters."""
+    total = sum(CHAR_VALUES[char] * weight for char, weight in zip(container_code.upper(), WEIGHTS))
+    return total % 11 % 10
+
+
+def validate_container_number(container_number: str) -> bool:
+    """Checks the layout and the check digit of a container number."""
+    if not CONTAINER_NUMBER_PATTERN.match(container_number):
         return False
+    return calculate_check_digit(container_number[:10]) == int(container_number[10])
+
+
+def correct_container_number(text: str, max_cost: float = DEFAULT_MAX_COST,
+                             max_candidates: int = DEFAULT_MAX_CANDIDATES,
+                             layout_forced_only: bool = True) -> List[Candidate]:
+    """Returns valid container numbers reachable from an OCR read, best first.
+
+    Substitutions for the first ten characters are enumerated best-first by
+    total confusion cost. Each combination fixes the check digit it needs,
+    and the read check digit is corrected only if that is a known confusion.
+    By default only characters the layout rules out are substituted, so a
+    read with a wrong check digit but no misplaced character has no
+    candidates.
+    """
+    read = normalize(text)
+    if len(read) != 11:
+        return []
+    options = [_OPTIONS[layout_forced_only][i].get(char, []) for i, char in enumerate(read[:10])]
+    if not all(options):
+        return []
+    check_costs = _CHECK_DIGIT_COSTS[layout_forced_only][read[10]]
+
+    candidates: List[Candidate] = []
+    start = (0,) * 10
+    heap = [(sum(position[0][0] for position in options), start)]
+    seen = {start}
+    expansions = 0
+    while heap and expansions < MAX_EXPANSIONS:
+        cost, state = heapq.heappop(heap)
+        expansions += 1
+        # The check digit can only add cost, so nothing later can beat this.
+        if cost > max_cost or (len(candidates) >= max_candidates and cost >= candidates[-1].cost):
+            break
+
+        chars = [options[i][j][1] for i, j in enumerate(state)]
+        check_digit = str(sum(CHAR_VALUES[char] * weight for char, weight in zip(chars, WEIGHTS)) % 11 % 10)
+        check_cost = check_costs.get(check_digit)
+        if check_cost is not None and cost + check_cost <= max_cost:
+            total = cost + check_cost
+            code = "".join(chars) + check_digit
+            substitutions = tuple((i, seen_char, char) for i, (seen_char, char)
+                                  in enumerate(zip(read, code)) if seen_char != char)
+            candidates.append(Candidate(code, round(total, 6), math.exp(-total), substitutions))
+            candidates.sort(key=lambda candidate: candidate.cost)
+            del candidates[max_candidates:]
+
+        for i, j in enumerate(state):
+            if j + 1 < len(options[i]):
+                successor = state[:i] + (j + 1,) + state[i + 1:]
+                if successor not in seen:
+                    seen.add(successor)
+                    heapq.heappush(heap, (cost - options[i][j][0] + options[i][j + 1][0], successor))
+    return candidates
+
+
+def split_read(text: str) -> Tuple[str, str]:
+    """Splits an OCR read into its container number and trailing size/type code."""
+    chars = normalize(text)
+    return chars[:11], chars[11:15]
+
+
+class SizeTypeRegistry:
+    """Indexed table of ISO 6346 size/type codes.
+
+    A code is a length character, a height/width character and a two
+    character type code. All combinations of the bundled component tables
+    are held in a frozenset for membership checks, and every 1-3 character
+    prefix maps to its completions for partial reads.
+    """
+
+    def __init__(self, lengths: Dict[str, str], sizes: Dict[str, str], types: Dict[str, str]):
+        self.lengths = lengths
+        self.sizes = sizes
+        self.types = types
+        self.codes = frozenset(length + size + kind for length in lengths for size in sizes for kind in types)
+        prefixes: Dict[str, List[str]] = defaultdict(list)
+        for code in sorted(self.codes):
+            for n in range(1, 4):
+                prefixes[code[:n]].append(code)
+        self._prefixes = {prefix: tuple(codes) for prefix, codes in prefixes.items()}
+
+    @classmethod
+    def load(cls, path: str = ISO_SIZE_TYPES_PATH) -> "SizeTypeRegistry":
+        """Reads the component table from a ``field,code,description`` CSV file."""
+        fields: Dict[str, Dict[str, str]] = {"length": {}, "size": {}, "type": {}}
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                fields[row["field"]][row["code"].upper()] = row["description"]
+        return cls(fields["length"], fields["size"], fields["type"])
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def with_prefix(self, prefix: str) -> Tuple[str, ...]:
+        """Returns every code starting with a partial read, in sorted order."""
+        prefix = normalize(prefix)
+        if len(prefix) >= 4:
+            return (prefix[:4],) if prefix[:4] in self.codes else ()
+        return self._prefixes.get(prefix, ()) if prefix else tuple(sorted(self.codes))
+
+    def describe(self, code: str) -> Optional[Dict[str, str]]:
+        """Returns the length, size and type descriptions of a code."""
+        if code not in self.codes:
+            return None
+        return {"length": self.lengths[code[0]], "size": self.sizes[code[1]], "type": self.types[code[2:]]}
+
+
+@functools.lru_cache(maxsize=None)
+def default_registry() -> SizeTypeRegistry:
+    """The registry built from the bundled size/type table, loaded once."""
+    return SizeTypeRegistry.load()
+
+
+def validate_iso_type(iso_type: str, registry: Optional[SizeTypeRegistry] = None) -> bool:
+    return normalize(iso_type) in (registry or default_registry())
+
+
+# Byte lookup tables for vectorized validation
+_BYTE_VALUES = np.full(256, -1, dtype=np.int64)
+for _char, _value in CHAR_VALUES.items():
+    _BYTE_VALUES[ord(_char)] = _value
+_LAYOUT_MASKS = np.zeros((11, 256), dtype=bool)
+for _position, _allowed in enumerate(_LAYOUT + (_DIGITS,)):
+    _LAYOUT_MASKS[_position, [ord(char) for char in _allowed]] = True
+_WEIGHTS = np.array(WEIGHTS, dtype=np.int64)
+
+
+def validate_batch(container_numbers: Sequence[str], iso_types: Optional[Iterable[Optional[str]]] = None,
+                   registry: Optional[SizeTypeRegistry] = None) -> np.ndarray:
+    """Validates many container numbers at once and returns a boolean array.
+
+    Layout and check digits are computed over an (N, 11) byte matrix in a
+    few numpy operations. If ``iso_types`` is given, a non-empty size/type
+    code must also be in the registry for a read to be valid.
+    """
+    normalized = [normalize(number) for number in container_numbers]
+    if not normalized:
+        return np.zeros(0, dtype=bool)
+    # Reads of the wrong length become a row that fails every layout check.
+    joined = "".join(number if len(number) == 11 else "-" * 11 for number in normalized)
+    codes = np.frombuffer(joined.encode("ascii"), dtype=np.uint8).reshape(-1, 11)
+
+    layout_ok = _LAYOUT_MASKS[np.arange(11), codes].all(axis=1)
+    values = _BYTE_VALUES[codes]
+    check_digits = values[:, :10] @ _WEIGHTS % 11 % 10
+    valid = layout_ok & (check_digits == values[:, 10])
 
-    container_code = container_number[:-1]
-    expected_check_digit = int(container_number[-1])
-    calculated_check_digit = calculate_check_digit(container_code)
+    if iso_types is not None:
+        registry = registry or default_registry()
+        valid &= np.fromiter((not iso_type or normalize(iso_type) in registry for iso_type in iso_types),
+                             dtype=bool, count=len(normalized))
+    return valid
 
-    return expected_check_digit == calculated_check_digit
 
-def validate_iso_type(iso_type, iso_types_df):
-    return iso_type in iso_types_df['code'].values
+def validate_results(results: dict, registry: SizeTypeRegistry, max_cost: float = DEFAULT_MAX_COST,
+                     max_candidates: int = DEFAULT_MAX_CANDIDATES, min_margin: float = DEFAULT_MIN_MARGIN) -> bool:
+    """Corrects and validates one OCR result in place and returns whether it is valid.
 
-def validate_results(results, iso_types_df):
-    container_number = results['container_number']
-    iso_type = results['iso_type']
+    A read that needed substitutions is only accepted when it beats the
+    runner-up by ``min_margin``, and is flagged ``corrected``.
+    """
+    container_number, iso_type = split_read(results['text'])
+    candidates = correct_container_number(container_number, max_cost, max_candidates)
+    best: Optional[Candidate] = candidates[0] if candidates else None
+    if best is not None and best.cost > 0 and len(candidates) > 1 \
+            and candidates[1].cost - best.cost < min_margin:
+        best = None  # ambiguous
 
-    container_valid = validate_container_number(container_number)
-    iso_type_valid = validate_iso_type(iso_type, iso_types_df)
+    results['container_number'] = best.code if best else None
+    results['corrected'] = best is not None and best.cost > 0
+    results['iso_type'] = iso_type or None
+    results['candidates'] = [{'code': c.code, 'score': round(c.score, 4), 'cost': c.cost} for c in candidates]
 
-    return container_valid and iso_type_valid
\ No newline at end of file
+    iso_type_valid = not iso_type or iso_type in registry
+    return best is not None and iso_type_valid
@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os
+import sys
+
+# Shared modules are imported as ``common.*``; service modules are loaded
+# with common.service_loader, as the embedded pipeline does.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,60 @@
+# tests/test_detection_zones.py
+import pytest
+
+from common import models
+from common.detection_zones import crop_box, parse_zones
+
+
+def test_parse_rect_and_polygon():
+    zones = parse_zones([{"rect": [0.1, 0.4, 0.9, 1.0]},
+                         {"polygon": [[0.0, 0.5], [0.6, 0.3], [0.7, 0.9]]}])
+    assert zones == [[(0.1, 0.4), (0.9, 0.4), (0.9, 1.0), (0.1, 1.0)],
+                     [(0.0, 0.5), (0.6, 0.3), (0.7, 0.9)]]
+
+
+def test_no_zones_means_the_whole_frame():
+    assert parse_zones(None) == []
+    assert parse_zones([]) == []
+    assert crop_box([], 1920, 1080) is None
+
+
+@pytest.mark.parametrize("value", [
+    {"rect": [0, 0, 1, 1]},  # not a list
+    [{"rect": [0, 0, 1]}],
+    [{"rect": [0.5, 0, 0.5, 1]}],  # empty
+    [{"rect": [0, 0, 1.5, 1]}],  # outside the frame
+    [{"rect": ["a", 0, 1, 1]}],
+    [{"polygon": [[0, 0], [1, 1]]}],  # too few points
+    [{"circle": [0.5, 0.5, 0.1]}],
+    [{"rect": [0, 0, 1, 1], "polygon": [[0, 0], [1, 0], [1, 1]]}],
+])
+def test_malformed_zones_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_zones(value)
+
+
+def test_crop_box_covers_every_zone():
+    zones = parse_zones([{"rect": [0.1, 0.5, 0.4, 0.9]}, {"polygon": [[0.3, 0.4], [0.8, 0.45], [0.6, 0.7]]}])
+    assert crop_box(zones, 1000, 500) == (100, 200, 800, 450)
+
+
+def test_crop_box_rounds_outwards():
+    zones = parse_zones([{"rect": [0.1001, 0.1001, 0.2001, 0.2001]}])
+    assert crop_box(zones, 1000, 1000) == (100, 100, 201, 201)
+
+
+def test_whole_frame_or_degenerate_zones_do_not_crop():
+    assert crop_box(parse_zones([{"rect": [0, 0, 1, 1]}]), 640, 480) is None
+    assert crop_box(parse_zones([{"rect": [0.5, 0.5, 0.501, 0.501]}]), 640, 480) is None
+
+
+@pytest.mark.parametrize("crop", [(300, 200, 1.0), (300, 200, 0.5)])
+def test_cropped_boxes_map_back_to_the_camera_frame(crop):
+    envelope = models.decode(models.frame_ref("cam", 1, 0.0, 640, 360, crop=crop))
+    assert models.is_cropped(envelope)
+    assert (envelope.crop_x, envelope.crop_y, envelope.crop_scale) == crop
+    full = [400, 260, 700, 460]
+    cropped = models.to_cropped_frame(envelope, full)
+    assert cropped == [round((400 - 300) * crop[2]), round((260 - 200) * crop[2]),
+                       round((700 - 300) * crop[2]), round((460 - 200) * crop[2])]
+    assert models.to_full_frame(envelope, cropped) == full
@@ -0,0 +1,45 @@
+# tests/test_detector.py
+import numpy as np
+
+from common.service_loader import load_service
+
+detector = load_service("detection_service", "detector")["detector"]
+
+
+def test_nms_suppresses_overlapping_boxes():
+    boxes = np.array([[0, 0, 100, 100], [5, 5, 105, 105], [200, 200, 300, 300], [0, 0, 100, 100]],
+                     dtype=np.float32)
+    scores = np.array([0.8, 0.9, 0.7, 0.5], dtype=np.float32)
+    assert detector.nms(boxes, scores, 0.5).tolist() == [1, 2]
+
+
+def test_nms_keeps_boxes_below_the_threshold():
+    boxes = np.array([[0, 0, 100, 100], [50, 0, 150, 100]], dtype=np.float32)  # IoU 1/3
+    scores = np.array([0.6, 0.9], dtype=np.float32)
+    assert detector.nms(boxes, scores, 0.5).tolist() == [1, 0]
+    assert detector.nms(boxes, scores, 0.3).tolist() == [1]
+
+
+def test_nms_of_nothing():
+    assert detector.nms(np.zeros((0, 4)), np.zeros(0), 0.5).tolist() == []
+
+
+def test_letterbox_pads_to_a_square():
+    frame = np.full((360, 640, 3), 255, dtype=np.uint8)
+    padded, (scale, pad_x, pad_y) = detector.letterbox(frame, 320)
+    assert padded.shape == (320, 320, 3)
+    assert (scale, pad_x, pad_y) == (0.5, 0, 70)
+    assert (padded[:70] == 114).all() and (padded[70:250] == 255).all() and (padded[250:] == 114).all()
+
+
+def test_postprocess_maps_boxes_back_to_the_frame():
+    # One anchor per frame: a box centred at (160, 160), 100 x 50 in the 320 x 320 letterbox
+    output = np.zeros((1, 4 + 2, 3), dtype=np.float32)
+    output[0, :, 0] = [160, 160, 100, 50, 0.1, 0.9]
+    output[0, :, 1] = [160, 160, 100, 50, 0.2, 0.1]  # below the threshold
+    metas = [(0.5, 0, 70)]  # 640 x 360 frame letterboxed to 320
+    results = detector.postprocess(output, metas, [(360, 640)], 0.25, 0.45, 100)
+    assert len(results) == 1 and results[0].shape == (1, 6)
+    x1, y1, x2, y2, confidence, class_id = results[0][0]
+    assert np.allclose([x1, y1, x2, y2], [220, 130, 420, 230])
+    assert np.isclose(confidence, 0.9) and class_id == 1
@@ -0,0 +1,75 @@
+# tests/test_models.py
+import numpy as np
+import pytest
+
+from common import models
+
+
+def test_frame_ref_round_trip():
+    trace = ((models.PUBLISHED, 1000.25),)
+    envelope = models.decode(models.frame_ref("cam-7", 2 ** 40 + 3, 1000.0, 1920, 1080, trace=trace))
+    assert envelope.payload_type == models.FRAME_REF
+    assert (envelope.camera_id, envelope.frame_seq, envelope.ts) == ("cam-7", 2 ** 40 + 3, 1000.0)
+    assert (envelope.width, envelope.height) == (1920, 1080)
+    assert envelope.trace == trace
+    assert bytes(envelope.payload) == b""
+    assert not models.is_cropped(envelope)
+
+
+def test_detections_round_trip_with_trace_stamps():
+    frame = models.decode(models.frame_ref("1", 42, 1000.0, 640, 480, trace=((models.PUBLISHED, 1000.1),)))
+    stamped = models.stamp(frame, models.DETECTION_START, models.DETECTION_END, at=1000.3)
+    detections = [{"box": [10, 20, 110, 220], "confidence": 0.75, "class": 1},
+                  {"box": [0, 0, 5, 5], "confidence": 0.5, "class": 0}]
+    envelope = models.decode(models.detections_message(stamped, detections))
+
+    assert envelope.payload_type == models.DETECTIONS
+    assert (envelope.camera_id, envelope.frame_seq, envelope.ts) == ("1", 42, 1000.0)
+    assert envelope.trace == ((models.PUBLISHED, 1000.1), (models.DETECTION_START, 1000.3),
+                              (models.DETECTION_END, 1000.3))
+    assert models.decode_detections(envelope) == detections
+    assert models.decode_detections(models.decode(models.detections_message(frame, []))) == []
+
+
+def test_results_round_trip():
+    results = [{"text": "CSQU3054383", "box": [1, 2, 3, 4], "valid": True, "candidates": []}]
+    envelope = models.decode(models.results_message("cam", 9, 5.0, results, trace=((models.OCR_END, 6.0),)))
+    assert models.decode_results(envelope) == results
+    assert envelope.trace == ((models.OCR_END, 6.0),)
+
+
+def test_raw_image_round_trip_is_a_view():
+    frame = np.random.default_rng(0).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+    body = models.image_message("cam", 1, 0.0, frame)
+    envelope = models.decode(body)
+    decoded = models.decode_image(envelope)
+    assert np.array_equal(decoded, frame)
+    assert not decoded.flags.writeable  # read straight from the message body
+
+
+def test_decode_rejects_bad_messages():
+    body = models.frame_ref("cam", 1, 0.0)
+    with pytest.raises(ValueError):
+        models.decode(body[:10])
+    with pytest.raises(ValueError):
+        models.decode(b"XX" + body[2:])
+    with pytest.raises(ValueError):
+        models.decode(body[:2] + bytes([models.VERSION - 1]) + body[3:])
+    with pytest.raises(ValueError):
+        models.decode(body + b"extra")
+    with pytest.raises(ValueError):
+        models.decode_detections(models.decode(body))
+
+
+def test_camera_id_length_limit():
+    with pytest.raises(ValueError):
+        models.frame_ref("x" * 256, 1, 0.0)
+
+
+def test_trace_spans_and_latency_breakdown():
+    trace = ((models.PUBLISHED, 10.5), (models.DETECTION_START, 11.0), (models.DETECTION_END, 11.25))
+    assert models.trace_spans(10.0, trace) == [("capture", 0.5), ("detection_queue", 0.5), ("detection", 0.25)]
+    assert models.latency_breakdown(10.0, trace) == {
+        "capture": 0.5, "detection_queue": 0.5, "detection": 0.25, "total": 1.25}
+    assert models.latency_breakdown(10.0, trace, now=12.0)["total"] == 2.0
+    assert models.latency_breakdown(10.0, ()) == {"total": 0.0}
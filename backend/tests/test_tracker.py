@@ -0,0 +1,103 @@
+# tests/test_tracker.py
+import numpy as np
+
+from common.service_loader import load_service
+
+tracker = load_service("ocr_service", "tracker")["tracker"]
+
+
+def detection(box, confidence=0.9, class_id=0):
+    return {"box": list(box), "confidence": confidence, "class": class_id}
+
+
+def frame(seed=0):
+    return np.random.default_rng(seed).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+
+
+def test_box_iou():
+    boxes = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=np.float64)
+    others = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [40, 40, 50, 50]], dtype=np.float64)
+    iou = tracker.box_iou(boxes, others)
+    assert iou.shape == (2, 3)
+    assert np.allclose(iou[0], [1.0, 1 / 3, 0.0])
+    assert np.allclose(iou[1], 0.0)
+
+
+def test_kalman_filter_follows_constant_velocity():
+    kalman = tracker.KalmanBoxFilter([0, 0, 100, 50])
+    for step in range(1, 11):
+        kalman.predict(0.1)
+        kalman.update([10 * step, 0, 100 + 10 * step, 50])
+    # 10 px per 0.1 s: the next box is predicted about 10 px further on
+    x1, y1, x2, y2 = kalman.predict(0.1)
+    assert abs(x1 - 110) < 3 and abs(x2 - 210) < 3
+    assert abs(y1) < 1 and abs(y2 - 50) < 1
+
+
+def test_moving_container_is_one_track():
+    camera = tracker.CameraTracker("cam", iou_threshold=0.3, max_age_seconds=0.5, min_hits=3)
+    image = frame()
+    for step in range(10):
+        finished = camera.update(step * 0.1, [detection([100 + 15 * step, 100, 300 + 15 * step, 200])],
+                                 image, step)
+        assert finished == []
+    assert len(camera.tracks) == 1
+    track = camera.tracks[0]
+    assert track.hits == 10 and len(track.crops) == camera.crops_per_track
+
+    # Unseen for longer than max_age_seconds: the track finishes once
+    finished = camera.update(2.0, [], image, 10)
+    assert finished == [track] and camera.tracks == []
+
+
+def test_separate_containers_get_separate_tracks():
+    camera = tracker.CameraTracker("cam", min_hits=1)
+    image = frame()
+    camera.update(0.0, [detection([0, 0, 100, 100]), detection([300, 300, 400, 400])], image, 1)
+    camera.update(0.1, [detection([302, 300, 402, 400]), detection([2, 0, 102, 100])], image, 2)
+    assert len(camera.tracks) == 2
+    assert [track.hits for track in camera.tracks] == [2, 2]
+    first, second = camera.tracks
+    assert first.filter.box()[0] < 50 < second.filter.box()[0]
+
+
+def test_unconfirmed_tracks_are_not_reported():
+    camera = tracker.CameraTracker("cam", max_age_seconds=0.5, min_hits=3)
+    image = frame()
+    camera.update(0.0, [detection([0, 0, 100, 100])], image, 1)
+    assert camera.update(1.0, [], image, 2) == []
+    assert camera.tracks == []
+
+
+def test_track_keeps_its_sharpest_crops():
+    track = tracker.Track("cam", detection([0, 0, 50, 50]), 0.0, max_crops=2)
+    flat = np.full((100, 100, 3), 128, dtype=np.uint8)
+    for seq, image in enumerate((flat, frame(1), flat, frame(2))):
+        track.add(detection([0, 0, 50, 50]), seq * 0.1, image, seq)
+    assert sorted(seq for _, _, _, seq in track.best_crops()) == [1, 3]
+
+
+def test_class_vote():
+    track = tracker.Track("cam", detection([0, 0, 10, 10]), 0.0, max_crops=1)
+    image = frame()
+    for class_id in (1, 2, 2):
+        track.add(detection([0, 0, 10, 10], class_id=class_id), 0.0, image, 0)
+    assert track.class_id == 2
+
+
+def test_multi_camera_tracker_keeps_cameras_apart():
+    tracks = tracker.MultiCameraTracker(min_hits=1, max_age_seconds=0.5)
+    image = frame()
+    tracks.update("a", 0.0, [detection([0, 0, 100, 100])], image, 1)
+    tracks.update("b", 0.0, [detection([0, 0, 100, 100])], image, 1)
+    assert sorted(tracks.cameras) == ["a", "b"]
+    finished = tracks.expire(1.0)
+    assert sorted(track.camera_id for track in finished) == ["a", "b"]
+
+
+def test_fuse_reads_votes_per_character():
+    reads = [("CSQU3054383", 1.0), ("CSQU3O54383", 0.8), ("C5QU3054383", 0.7), ("CSQU305438", 2.0)]
+    # The 10-character read carries the most weight alone, but 11 characters win overall.
+    assert tracker.fuse_reads(reads) == "CSQU3054383"
+    assert tracker.fuse_reads([("csqu 305", 1.0)]) == "CSQU305"
+    assert tracker.fuse_reads([("", 1.0), ("  ", 1.0)]) == ""
@@ -0,0 +1,145 @@
+# tests/test_validator.py
+import random
+import string
+
+import pytest
+
+from common.service_loader import load_service
+
+validator = load_service("result_validation_service", "validator")["validator"]
+
+
+def test_check_digit():
+    assert validator.calculate_check_digit("CSQU305438") == 3
+    assert validator.calculate_check_digit("MSKU123456") == 5
+    assert validator.validate_container_number("CSQU3054383")
+    assert not validator.validate_container_number("CSQU3054384")
+    assert not validator.validate_container_number("CSQX3054383")  # category must be U, J or Z
+
+
+@pytest.mark.parametrize("read, substitutions", [
+    ("CSQU3O54383", ((5, "O", "0"),)),
+    ("C5QU3054383", ((1, "5", "S"),)),
+    ("CSQU30543B3", ((9, "B", "8"),)),
+    ("MSKU123456S", ((10, "S", "5"),)),  # a letter where the check digit belongs
+    ("CSQV3054383", ((3, "V", "U"),)),  # not a category identifier
+])
+def test_layout_forced_confusions_are_corrected(read, substitutions):
+    best = validator.correct_container_number(read)[0]
+    assert validator.validate_container_number(best.code)
+    assert best.substitutions == substitutions
+    assert 0 < best.cost <= validator.DEFAULT_MAX_COST and 0 < best.score < 1
+
+
+def test_valid_read_is_ranked_first_at_no_cost():
+    candidates = validator.correct_container_number("csqu 305 438 3")
+    assert candidates == [validator.Candidate("CSQU3054383", 0.0, 1.0, ())]
+
+
+@pytest.mark.parametrize("read", ["CSQU3054384", "CSQU3054388", "CSQU3064383", "MSKU1234566"])
+def test_wrong_check_digit_without_ambiguity_is_rejected(read):
+    assert validator.correct_container_number(read) == []
+    results = {"text": read}
+    assert not validator.validate_results(results, validator.default_registry())
+    assert results["container_number"] is None and not results["corrected"]
+
+
+def test_random_digit_errors_are_not_fixed():
+    rng = random.Random(0)
+    rejected = 0
+    for _ in range(2000):
+        code = "".join(rng.choice(string.ascii_uppercase) for _ in range(3)) + rng.choice("UJZ")
+        code += "".join(rng.choice(string.digits) for _ in range(6))
+        code += str(validator.calculate_check_digit(code))
+        i = rng.randrange(4, 11)
+        read = code[:i] + rng.choice(string.digits.replace(code[i], "")) + code[i + 1:]
+        if validator.validate_container_number(read):
+            continue  # check values 0 and 10 share the digit 0
+        assert validator.correct_container_number(read) == [], read
+        rejected += 1
+    assert rejected > 1500
+
+
+def test_ambiguous_correction_is_not_accepted():
+    # B could be 3 or 6 at the same cost; both pass the check digit
+    results = {"text": "CSQU488B650"}
+    assert not validator.validate_results(results, validator.default_registry(), max_cost=1.0)
+    assert results["container_number"] is None
+    assert [c["code"] for c in results["candidates"]] == ["CSQU4883650", "CSQU4886650"]
+
+
+def test_unreachable_reads_have_no_candidates():
+    assert validator.correct_container_number("ABC") == []
+    assert validator.correct_container_number("CSQU3054383 22G1") == []  # size/type code not split off
+    assert validator.correct_container_number("CSQU3O54383", max_cost=0.1) == []
+    # No known confusion turns X into a category identifier
+    assert validator.correct_container_number("XXXX0000000") == []
+
+
+def test_validate_results_corrects_in_place():
+    results = {"text": "CSQU3O54383 22G1"}
+    assert validator.validate_results(results, validator.default_registry())
+    assert results["container_number"] == "CSQU3054383" and results["corrected"]
+    assert results["iso_type"] == "22G1"
+    assert results["candidates"] == [{"code": "CSQU3054383", "score": 0.8187, "cost": 0.2}]
+
+
+def test_raw_valid_read_is_not_flagged_corrected():
+    results = {"text": "CSQU3054383"}
+    assert validator.validate_results(results, validator.default_registry())
+    assert results["container_number"] == "CSQU3054383" and not results["corrected"]
+
+
+def test_validate_results_rejects_an_unknown_size_type():
+    results = {"text": "CSQU3054383 99ZZ"}
+    assert not validator.validate_results(results, validator.default_registry())
+    assert results["container_number"] == "CSQU3054383"
+
+
+def _random_read(rng):
+    alphabet = string.ascii_uppercase + string.digits + string.ascii_lowercase + " -"
+    code = "".join(rng.choice("ABCMSU") for _ in range(3)) + rng.choice("UJZX")
+    code += "".join(rng.choice(string.digits) for _ in range(6))
+    code += str(validator.calculate_check_digit(code)) if rng.random() < 0.5 else rng.choice(string.digits)
+    roll = rng.random()
+    if roll < 0.2:
+        code = code.lower()
+    elif roll < 0.3:
+        code = code[:rng.randrange(11)]  # too short
+    elif roll < 0.4:
+        code += rng.choice(alphabet)  # too long unless it was a separator
+    elif roll < 0.5:
+        code = code[:4] + " " + code[4:]
+    return code
+
+
+def test_validate_batch_matches_scalar_validation():
+    rng = random.Random(1)
+    registry = validator.default_registry()
+    reads = ["", "CSQU3054383", "csqu3054383", "CSQU 305438 3", "CSQU305438", "CSQU30543833"]
+    reads += [_random_read(rng) for _ in range(2000)]
+    iso_types = [rng.choice(["22G1", "22g1", "45R1", "99ZZ", "22G", "", None]) for _ in reads]
+
+    expected = [validator.validate_container_number(validator.normalize(read)) for read in reads]
+    assert validator.validate_batch(reads).tolist() == expected
+    assert 0 < sum(expected) < len(reads)
+
+    expected = [valid and (not iso_type or validator.validate_iso_type(iso_type, registry))
+                for valid, iso_type in zip(expected, iso_types)]
+    assert validator.validate_batch(reads, iso_types, registry).tolist() == expected
+    assert validator.validate_batch([]).shape == (0,)
+
+
+def test_size_type_prefix_lookup():
+    registry = validator.default_registry()
+    assert "22G1" in registry and "99ZZ" not in registry
+    assert validator.validate_iso_type("22g1", registry) and not validator.validate_iso_type("99ZZ", registry)
+
+    for prefix in ["2", "22", "22G", "45R"]:
+        matches = registry.with_prefix(prefix)
+        assert matches and list(matches) == sorted(code for code in registry.codes if code.startswith(prefix))
+    assert registry.with_prefix("22g") == registry.with_prefix("22G")
+    assert registry.with_prefix("") == tuple(sorted(registry.codes))
+    assert registry.with_prefix("22G1") == ("22G1",)
+    assert registry.with_prefix("22 G1") == ("22G1",)  # separators are dropped
+    assert registry.with_prefix("99") == () and registry.with_prefix("99ZZ") == ()
@@ -0,0 +1,88 @@
+# tests/test_video_decoder.py
+import cv2
+import numpy as np
+import pytest
+
+from common.service_loader import load_service
+
+video_decoder = load_service("camera_stream_service", "video_decoder")["video_decoder"]
+
+FPS = 20
+FRAMES = 30
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    """A 1.5 s, 20 fps clip whose frame index is encoded in its brightness."""
+    path = str(tmp_path_factory.mktemp("video") / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (64, 48))
+    for i in range(FRAMES):
+        writer.write(np.full((48, 64, 3), i * 8, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def read_all(decoder):
+    frames = []
+    while True:
+        ok, frame = decoder.read()
+        if not ok:
+            return frames
+        frames.append(frame)
+
+
+def frame_indices(frames):
+    return [round(frame.mean() / 8) for frame in frames]
+
+
+def test_reads_every_frame_of_a_file(clip):
+    decoder = video_decoder.VideoDecoder(clip)
+    assert decoder.isOpened() and decoder.get(cv2.CAP_PROP_FPS) == FPS
+    frames = read_all(decoder)
+    assert frame_indices(frames) == list(range(FRAMES))
+    assert frames[0].shape == (48, 64, 3) and frames[0].dtype == np.uint8
+    assert decoder.stats() == {"decoded": FRAMES, "returned": FRAMES}
+
+
+def test_every_nth_decodes_all_but_returns_only_selected_frames(clip):
+    decoder = video_decoder.VideoDecoder(clip, every_nth=3)
+    assert frame_indices(read_all(decoder)) == list(range(0, FRAMES, 3))
+    assert decoder.stats() == {"decoded": FRAMES, "returned": FRAMES // 3}
+
+
+def test_max_fps_selects_by_presentation_time(clip):
+    decoder = video_decoder.VideoDecoder(clip, max_fps=5)
+    assert frame_indices(read_all(decoder)) == list(range(0, FRAMES, 4))
+    # The slack keeps every frame when the target matches the stream rate
+    assert len(read_all(video_decoder.VideoDecoder(clip, max_fps=FPS))) == FRAMES
+
+
+def test_grab_skips_conversion_and_rewind_starts_over(clip):
+    decoder = video_decoder.VideoDecoder(clip, every_nth=2)
+    assert decoder.grab() and decoder.grab()
+    ok, frame = decoder.retrieve()
+    assert ok and frame_indices([frame]) == [2]
+    assert decoder.stats()["returned"] == 1
+    assert decoder.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    assert frame_indices(read_all(decoder)) == list(range(0, FRAMES, 2))
+    decoder.release()
+    assert not decoder.isOpened() and decoder.read() == (False, None)
+
+
+def test_output_size(clip):
+    decoder = video_decoder.VideoDecoder(clip, width=32)
+    assert decoder._output_size(1920, 1080) == (32, 18)
+    assert decoder._output_size(64, 48) == (32, 24)
+    assert read_all(decoder)[0].shape == (24, 32, 3)
+
+    decoder = video_decoder.VideoDecoder(clip, height=100)
+    assert decoder._output_size(1920, 1080) == (178, 100)  # 177.8 rounded to an even width
+    decoder = video_decoder.VideoDecoder(clip, width=640, height=100)
+    assert decoder._output_size(1920, 1080) == (640, 100)
+    decoder = video_decoder.VideoDecoder(clip, width=10)
+    assert decoder._output_size(1920, 10) == (10, 2)  # never below 2
+
+
+def test_unknown_skip_mode_is_rejected(clip):
+    with pytest.raises(ValueError):
+        video_decoder.VideoDecoder(clip, skip="bframes")
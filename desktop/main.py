@@ -57,14 +57,22 @@ class APIClient:
             return False  # Indicate failure
 
     @staticmethod
-    def get_ocr_results():
+    def get_ocr_results(cursor=None, **filters):
+        """Fetches one page of OCR results, newest first.
+
+        Filters: camera_id, since, until, valid, container_number, limit.
+        Returns ``{"results": [...], "next_cursor": ...}``.
+        """
+        params = {key: value for key, value in filters.items() if value is not None}
+        if cursor:
+            params["cursor"] = cursor
         try:
-            response = requests.get(f"{REST_API_URL}/ocr/results")
+            response = requests.get(f"{REST_API_URL}/ocr/results", params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             logging.error(f"Error fetching OCR results: {e}")
-            return []
+            return {"results": [], "next_cursor": None}
 
 
 class CameraStreamThread(QThread):